@@ -4,6 +4,7 @@
 import rospy
 import roslib
 import harmoni_common_lib.helper_functions as hf
+from harmoni_common_lib.behavior_payload import parse_behavior_payload
 
 # Specific Imports
 from harmoni_common_lib.constants import ActuatorNameSpace
@@ -13,7 +14,6 @@ from geometry_msgs.msg import Point
 from threading import Timer
 from collections import deque
 import json
-import ast
 import os
 
 class Face():
@@ -154,10 +154,10 @@ class Face():
         return face_expression_au, facial_expression_list
 
     def _get_facial_expression_data(self,data):
-        data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         face_expr_bool = False
         if "behavior_data" in data:
-            behavior_data = ast.literal_eval(data["behavior_data"])
+            behavior_data = data["behavior_data"]
         else:
             behavior_data = data
         facial_expression = []
@@ -178,10 +178,10 @@ class Face():
 
     def _get_aus_data(self, data):
         """ Get the validated data of the face"""
-        data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         au_bool = False
         if "behavior_data" in data:
-            behavior_data = ast.literal_eval(data["behavior_data"])
+            behavior_data = data["behavior_data"]
         else:
             behavior_data = data
         action_units_set =[]
@@ -220,6 +220,7 @@ class Face():
             face_expressions (list): array of facial expressions
         """
         face_expr_bool = False
+        data = parse_behavior_payload(data, self.name)
         face_expressions = self._get_facial_expression_data(data)
         [au_bool, aus] = self._get_aus_data(data)
         if au_bool:
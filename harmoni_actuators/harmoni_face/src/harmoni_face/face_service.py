@@ -7,6 +7,7 @@ import roslib
 from harmoni_common_lib.constants import State
 from harmoni_common_lib.service_server import HarmoniServiceServer
 from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.behavior_payload import parse_behavior_payload
 import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
@@ -18,7 +19,6 @@ from geometry_msgs.msg import Point
 from threading import Timer
 from collections import deque
 import json
-import ast
 import os
 
 class NoseService(HarmoniServiceManager):
@@ -64,12 +64,12 @@ class NoseService(HarmoniServiceManager):
             face_bool = self.face.face_sequential_request(data)
             rospy.loginfo("Completed Expression")
             self.state = State.SUCCESS
-            self.actuation_completed = True
             self.result_msg=""
+            self.actuation_completed = True
         except Exception:
             self.state = State.FAILED
-            self.actuation_completed = True
             self.result_msg=""
+            self.actuation_completed = True
         return {"response": self.state, "message": self.result_msg}
 
     def send_face_nose_request(self):
@@ -119,6 +119,8 @@ class EyesService(HarmoniServiceManager):
             message (str): result message 
         """
         self.actuation_completed = False
+        # Parsed once, for both the service and the face
+        data = parse_behavior_payload(data, self.name)
         [gaze_bool, gaze_data] = self._get_gaze_data(data)
         try:
             self.state = State.REQUEST
@@ -135,12 +137,12 @@ class EyesService(HarmoniServiceManager):
             face_bool = self.face.face_sequential_request(data)
             rospy.loginfo("Completed Expression")
             self.state = State.SUCCESS
-            self.actuation_completed = True
             self.result_msg=""
+            self.actuation_completed = True
         except Exception:
             self.state = State.FAILED
-            self.actuation_completed = True
             self.result_msg=""
+            self.actuation_completed = True
         return {"response": self.state, "message": self.result_msg}
 
     def send_face_eyes_request(self):
@@ -151,9 +153,9 @@ class EyesService(HarmoniServiceManager):
 
     def _get_gaze_data(self, data):
         """Get target gaze data"""
-        data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         if "behavior_data" in data:
-            behavior_data = ast.literal_eval(data["behavior_data"])
+            behavior_data = data["behavior_data"]
         else:
             behavior_data = data
         gaze_bool = False
@@ -214,6 +216,8 @@ class MouthService(HarmoniServiceManager):
         rospy.loginfo("Do expressions")
         self.actuation_completed = False
         self.result_msg=""
+        # Parsed once, for both the service and the face
+        data = parse_behavior_payload(data, self.name)
         [viseme_bool, visemes] = self._get_viseme_data(data)
         try:
             self.state = State.REQUEST
@@ -249,9 +253,9 @@ class MouthService(HarmoniServiceManager):
     def _get_viseme_data(self, data):
         """ Get the validated data of the face"""
         viseme_bool = False
-        data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         if "behavior_data" in data:
-            behavior_data = ast.literal_eval(data["behavior_data"])
+            behavior_data = data["behavior_data"]
         else:
             behavior_data = data
         viseme_set = []
@@ -7,6 +7,7 @@ import roslib
 from harmoni_common_lib.constants import State, ActuatorNameSpace
 from harmoni_common_lib.service_server import HarmoniServiceServer
 from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.behavior_payload import parse_behavior_payload
 import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
@@ -86,7 +87,7 @@ class GestureService(HarmoniServiceManager):
 
         Args:
             data (str): it could be a string of:
-             - object containing {"behavior_data": str} (as results of the TTS synthetization)
+             - results of the TTS synthetization (see harmoni_common_lib.behavior_payload)
              - object of: {"name": str, "timing": int}
 
         Returns:
@@ -94,12 +95,10 @@ class GestureService(HarmoniServiceManager):
         """
         self.state = State.REQUEST
         self.actuation_completed = False
-        if type(data) == str:
-            data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         try:
             rospy.loginfo(f"length of data is {len(data)}")
             if "behavior_data" in data:
-                data = ast.literal_eval(data["behavior_data"])
                 gesture_data = self._get_gesture_data(data)
             else:
                 gesture_data = data
@@ -121,14 +120,13 @@ class GestureService(HarmoniServiceManager):
         """Getting the gesture data parsing the output of TTS
 
         Args:
-            data (str): string of json {"behavior_data":str}
+            data (str): results of the TTS synthetization
 
         Returns:
             [bool]: getting the gesture done (True)
         """
-        if type(data) == str:
-            data = ast.literal_eval(data)
-        behavior_data = ast.literal_eval(data["behavior_data"])
+        data = parse_behavior_payload(data, self.name)
+        behavior_data = data["behavior_data"]
         words_data = list(filter(lambda b: b["type"] == "word", behavior_data))
         behavior_set = []
         sentence = []
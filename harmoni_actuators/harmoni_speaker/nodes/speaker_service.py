@@ -6,6 +6,7 @@ import rospy, rospkg, roslib
 from harmoni_common_lib.constants import State, ActuatorNameSpace
 from harmoni_common_lib.service_server import HarmoniServiceServer
 from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.behavior_payload import parse_behavior_payload
 import harmoni_common_lib.helper_functions as hf
 
 
@@ -15,7 +16,6 @@ import numpy as np
 
 # import wget
 import contextlib
-import ast
 import wave
 import os
 
@@ -46,7 +46,7 @@ class SpeakerService(HarmoniServiceManager):
 
         Args:
             data (str): This could be a string of:
-                            - audio data
+                            - tts result (BehaviorData payload or stringified dict)
                             - path of local wav file
                             - link of wav audio file you want to download and heard from
         """
@@ -59,7 +59,7 @@ class SpeakerService(HarmoniServiceManager):
                     data = self.file_path_to_audio_data(data)
                     duration = data["duration"]
                 else:
-                    data = ast.literal_eval(data)
+                    data = parse_behavior_payload(data, self.name)
             data = data["audio_data"]
             rospy.loginfo("Writing data for speaker")
             rospy.loginfo(f"length of data is {len(data)}")
@@ -5,8 +5,13 @@ import rospy
 import roslib
 
 from harmoni_common_lib.constants import State
-from harmoni_common_lib.service_server import HarmoniServiceServer
+from harmoni_common_lib.service_server import (
+    HarmoniServiceServer,
+    HarmoniConcurrentServiceServer,
+)
 from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.request_cache import RequestCache
+from harmoni_common_lib.behavior_payload import encode_behavior_payload
 import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
@@ -14,7 +19,7 @@ from harmoni_common_lib.constants import ActuatorNameSpace
 from botocore.exceptions import BotoCoreError, ClientError
 from contextlib import closing
 import soundfile as sf
-import numpy as np
+import io
 import boto3
 import re
 import json
@@ -27,6 +32,8 @@ class AWSTtsService(HarmoniServiceManager):
     Amazon tts service
     """
 
+    deterministic_requests = True
+
     def __init__(self, name, param):
         """Constructor method: Initialization of variables and polly parameters + setting up"""
         super().__init__(name)
@@ -199,55 +206,41 @@ class AWSTtsService(HarmoniServiceManager):
 
     def _get_audio(self, response):
         """[summary]
-        This function writes the audio file getting data from Polly
+        This function reads the audio data from Polly.
+        The audio is kept in memory so that concurrent requests do not share a file.
         Args:
             response (obj): response from amazon Polly for getting audio data
 
         Returns:
-            data: audio data
+            data (bytes): ogg audio data
         """
-        data = {}
-        data["file"] = self.outdir + "/tts.ogg"
+        data = b""
         if "AudioStream" in response:
             with closing(response["AudioStream"]) as stream:
-                output = data["file"]
-                try:
-                    with open(output, "wb") as file:
-                        file.write(stream.read())
-                except IOError as error:
-                    print(error)
+                data = stream.read()
         else:
             print("Could not stream audio")
         return data
 
-    def _get_response(self, behavior_data):
+    def _get_response(self, behavior_data, audio_data):
         """[summary]
 
         Args:
             behavior_data (json): json containing behavior data (visemes, facial expressions, and gestures) and audio data (audio_frame, and audio_data)
+            audio_data (bytes): ogg audio data from Polly
 
         Returns:
-            response (str): it is a object stringified which contained information about
+            response (str): BehaviorData payload (see harmoni_common_lib.behavior_payload) which contains
                 audio_frame (int)
-                audio_data (str): string of audio data array
-                behavior_data (str): string of behaviors
+                audio_data (bytes): wav audio data, without header
+                behavior_data (list): behaviors sorted by start time
         """
         behaviours = list(sorted(behavior_data, key=lambda i: i["start"]))
-        data, samplerate = sf.read(self.outdir + "/tts.ogg")
-        sf.write(self.outdir + "/tts.wav", data, samplerate)
-        file_handle = self.outdir + "/tts.wav"
-        data = np.fromfile(file_handle, np.uint8)[
-            self.wav_header_length :
-        ]  # Loading wav file
-        data = data.astype(np.uint8).tostring()
-        data_array = data
-        audio_frame = samplerate
-        response = {
-            "audio_frame": audio_frame,
-            "audio_data": data_array,
-            "behavior_data": str(behaviours),
-        }
-        return str(response)
+        data, samplerate = sf.read(io.BytesIO(audio_data))
+        wav_file = io.BytesIO()
+        sf.write(wav_file, data, samplerate, format="WAV")
+        data = wav_file.getvalue()[self.wav_header_length :]  # Loading wav file
+        return encode_behavior_payload(samplerate, data, behaviours)
 
     def request(self, input_text):
         """[summary]
@@ -260,7 +253,8 @@ class AWSTtsService(HarmoniServiceManager):
                 message: str
         """
         rospy.loginfo("Start the %s request" % self.name)
-        self.state = State.REQUEST
+        if not self.concurrent_goals:
+            self.state = State.REQUEST
         text = input_text
         [text, actions] = self._get_text_and_actions(text)
         try:
@@ -286,17 +280,17 @@ class AWSTtsService(HarmoniServiceManager):
                 VoiceId=self.voice,
             )
             audio_data = self._get_audio(ogg_response)
-            tts_response = self._get_response(behavior_data)
-            self.state = State.SUCCESS
-            self.response_received = True
-            self.result_msg = tts_response
+            tts_response = self._get_response(behavior_data, audio_data)
+            state, message = State.SUCCESS, tts_response
             rospy.loginfo("Request successfully completed")
         except (BotoCoreError, ClientError) as error:
             rospy.logerr("The erros is " + str(error))
-            self.state = State.FAILED
+            state, message = State.FAILED, ""
+        if not self.concurrent_goals:
+            self.state = state
+            self.result_msg = message
             self.response_received = True
-            self.result_msg = ""
-        return {"response": self.state, "message": self.result_msg}
+        return {"response": state, "message": message}
 
 
 def main():
@@ -312,8 +306,21 @@ def main():
         param = rospy.get_param(service_name + "/" + instance_id + "_param/")
 
         s = AWSTtsService(service_id, param)
+        if param.get("request_cache_size", 0) > 0:
+            cache = RequestCache(
+                service_id,
+                param["request_cache_size"],
+                param.get("request_cache_ttl", 3600),
+            )
+            cache.attach(s)
 
-        service_server = HarmoniServiceServer(service_id, s)
+        if param.get("max_concurrent_goals", 1) > 1:
+            # Serve several patterns at once instead of preempting
+            service_server = HarmoniConcurrentServiceServer(
+                service_id, s, max_workers=param["max_concurrent_goals"]
+            )
+        else:
+            service_server = HarmoniServiceServer(service_id, s)
 
         service_server.start_sending_feedback()
         rospy.spin()
@@ -4,7 +4,10 @@
 import rospy
 
 from harmoni_common_lib.constants import State, ActionType
-from harmoni_common_lib.service_server import HarmoniServiceServer
+from harmoni_common_lib.service_server import (
+    HarmoniServiceServer,
+    HarmoniConcurrentServiceServer,
+)
 from harmoni_common_lib.service_manager import HarmoniServiceManager
 
 # Specific Imports
@@ -13,6 +16,13 @@ from harmoni_common_lib.constants import ActuatorNameSpace
 from harmoni_tts.local_tts_client import TtsClient
 import soundfile as sf
 import os
+import threading
+import uuid
+from collections import deque
+
+# Files of concurrent requests kept before the oldest is removed, long after
+# the speaker played it
+CONCURRENT_FILES_KEPT = 64
 
 
 class LocalTtsService(HarmoniServiceManager):
@@ -34,6 +44,9 @@ class LocalTtsService(HarmoniServiceManager):
         self.speedup = param["speedup"]
         self.outdir = param["outdir"]
         self.sample_rate = param["sample_rate"]
+        # Concurrent requests each write to a file of their own
+        self.concurrent_files = deque()
+        self.concurrent_files_lock = threading.Lock()
 
         """Initialize the local TTS client"""
         self.tts_client = TtsClient(
@@ -66,22 +79,25 @@ class LocalTtsService(HarmoniServiceManager):
                 message: str (path to audio file)
         """
         rospy.loginfo("Start the %s request" % self.name)
-        self.state = State.REQUEST
+        if not self.concurrent_goals:
+            self.state = State.REQUEST
 
         try:
             alignment, mel_postnet_spec, stop_tokens, waveform = self.tts_client.get_audio(input_text)
             file_path = self._save_audio_to_file(waveform)
-            self.state = State.SUCCESS
+            state = State.SUCCESS
         except Exception as e:
             rospy.logerr("The error is " + str(e))
             file_path = ""
-            self.state = State.FAILED
+            state = State.FAILED
 
-        self.response_received = True
-        self.result_msg = file_path
+        if not self.concurrent_goals:
+            self.state = state
+            self.result_msg = file_path
+            self.response_received = True
         rospy.loginfo("Request successfully completed")
 
-        return {"response": self.state, "message": file_path}
+        return {"response": state, "message": file_path}
 
     def _save_audio_to_file(self, audio_data):
         """
@@ -92,7 +108,11 @@ class LocalTtsService(HarmoniServiceManager):
         Returns:
             file_path: saved audio file
         """
-        file_path = self.outdir + "/tts.wav"
+        if self.concurrent_goals:
+            file_path = self.outdir + f"/tts_{uuid.uuid4().hex}.wav"
+            self._remove_old_files(file_path)
+        else:
+            file_path = self.outdir + "/tts.wav"
         sf.write(
             file_path,
             audio_data,
@@ -101,6 +121,19 @@ class LocalTtsService(HarmoniServiceManager):
 
         return file_path
 
+    def _remove_old_files(self, file_path):
+        """Keeps the last CONCURRENT_FILES_KEPT files of concurrent requests"""
+        with self.concurrent_files_lock:
+            self.concurrent_files.append(file_path)
+            if len(self.concurrent_files) <= CONCURRENT_FILES_KEPT:
+                return
+            old_file_path = self.concurrent_files.popleft()
+        try:
+            os.remove(old_file_path)
+        except OSError as e:
+            rospy.logwarn(f"Could not remove {old_file_path}: {e}")
+        return
+
     def publish_file_path(self, file_path):
         self.speaker_action_client.send_goal(
             action_goal=ActionType.DO.value,
@@ -121,7 +154,13 @@ def main():
 
         s = LocalTtsService(service_id, param)
 
-        service_server = HarmoniServiceServer(service_id, s)
+        if param.get("max_concurrent_goals", 1) > 1:
+            # Serve several patterns at once instead of preempting
+            service_server = HarmoniConcurrentServiceServer(
+                service_id, s, max_workers=param["max_concurrent_goals"]
+            )
+        else:
+            service_server = HarmoniServiceServer(service_id, s)
 
         service_server.start_sending_feedback()
         rospy.spin()
@@ -7,6 +7,7 @@ import threading
 from harmoni_common_lib.constants import State
 from harmoni_common_lib.service_server import HarmoniServiceServer
 from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.behavior_payload import parse_behavior_payload
 import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
@@ -14,7 +15,6 @@ from harmoni_common_lib.constants import ActuatorNameSpace, DetectorNameSpace
 from std_msgs.msg import String
 import boto3
 import json
-import ast
 
 
 class WebService(HarmoniServiceManager):
@@ -147,11 +147,11 @@ class WebService(HarmoniServiceManager):
         Returns:
             web_array (list): array of items with corresponding values of "container_id" and "set_view" to display when speaking
         """
-        data = ast.literal_eval(data)
+        data = parse_behavior_payload(data, self.name)
         web_array = []
         if not isinstance(data, list):
             if "behavior_data" in data.keys():
-                behavior_data = ast.literal_eval(data["behavior_data"])
+                behavior_data = data["behavior_data"]
                 for b in behavior_data:
                     if "type" in b.keys():
                         if b["type"] == "web":
@@ -2,6 +2,9 @@
 
 import rospy
 import threading
+import heapq
+import itertools
+from concurrent import futures
 
 from actionlib_msgs.msg import GoalStatus
 from actionlib.action_client import ActionClient, CommState, get_name_of_constant
@@ -10,9 +13,11 @@ import roslib
 
 from harmoni_common_msgs.msg import harmoniGoal, harmoniAction
 from harmoni_common_lib.constants import State
+from harmoni_common_lib.metrics import get_metrics, RESULT_DELIVERY, ROUND_TRIP
 
 # Weird gcc threading workaround for ROS Kinetic. Reference: https://stackoverflow.com/a/65908383
 import sys
+import time
 
 path = sys.path
 using_kinetic = any([True for p in path if ("kinetic" in p)])
@@ -31,6 +36,78 @@ class SimpleGoalState:
 SimpleGoalState.to_string = classmethod(get_name_of_constant)
 
 
+class _DeadlineScheduler(object):
+    """Runs callbacks at a deadline from a single shared thread.
+
+    Used for the goal timeouts of send_goal_async(), so that waiting on many
+    goals does not take a thread per goal. The timeout of a goal done before
+    its deadline is cancelled, so goals with long timeouts do not pile up.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.deadlines = []  # heap of [deadline, order, callback]
+        self.cancelled = 0  # entries of the heap whose callback is None
+        self.order = itertools.count()
+        self.thread = None
+
+    def schedule(self, timeout, callback):
+        """Calls callback() in timeout seconds
+
+        Returns:
+            list: the entry of the callback, to cancel() it
+        """
+        entry = [time.time() + timeout, next(self.order), callback]
+        with self.condition:
+            heapq.heappush(self.deadlines, entry)
+            if not self.thread:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+        return entry
+
+    def cancel(self, entry):
+        """Drops a callback which has not been called yet"""
+        with self.condition:
+            if entry[2] is None:
+                return
+            entry[2] = None
+            self.cancelled += 1
+            # Cancelled entries are skipped when they reach the top of the
+            # heap, and removed at once when they are most of it
+            if self.cancelled > len(self.deadlines) // 2:
+                self.deadlines = [e for e in self.deadlines if e[2] is not None]
+                heapq.heapify(self.deadlines)
+                self.cancelled = 0
+
+    def __len__(self):
+        with self.condition:
+            return len(self.deadlines) - self.cancelled
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.deadlines:
+                    self.condition.wait()
+                entry = self.deadlines[0]
+                deadline, _, callback = entry
+                if callback is not None and deadline > time.time():
+                    self.condition.wait(deadline - time.time())
+                    continue
+                heapq.heappop(self.deadlines)
+                if callback is None:
+                    self.cancelled -= 1
+                    continue
+                entry[2] = None  # called, so cancel() leaves it
+            try:
+                callback()
+            except Exception as e:
+                rospy.logerr(f"Goal timeout callback failed: {e}")
+
+
+_goal_timeouts = _DeadlineScheduler()
+
+
 class HarmoniActionClient(object):
     """A wrapper around SimpleActionClient that is structured for HARMONI architecture.
 
@@ -54,6 +131,7 @@ class HarmoniActionClient(object):
         self.action_result = {"do_action": None, "message": None}
         self.action_feedback = {"state": None}
         self.active_cb = None
+        self.connected = False  # the server has been seen by wait_for_server
         return
 
     # @brief Sends a goal to the ActionServer, and also registers callbacks
@@ -91,17 +169,7 @@ class HarmoniActionClient(object):
         else:
             rospy.logdebug(f"Client ({self.name}) Sending Goal.")
 
-        self.stop_tracking_goal()
-        goal = harmoniGoal(
-            action_type=action_goal,
-            optional_data=optional_data,
-            condition=condition,
-        )
-
-        self.simple_state = SimpleGoalState.PENDING
-        self.goal_handler = self.action_client.send_goal(
-            goal, self._handle_transition, self._handle_feedback
-        )
+        self._send_goal(action_goal, optional_data, condition, self._handle_transition)
 
         rospy.logdebug(f"Client ({self.name}) Goal Sent")
         if wait:
@@ -114,6 +182,119 @@ class HarmoniActionClient(object):
             rospy.logdebug(f"Client ({self.name}) Not waiting for result.")
         return
 
+    def send_goal_async(
+        self,
+        action_goal,
+        optional_data="",
+        condition="",
+        time_out=60,
+    ):
+        """Sends a goal without blocking and returns a future for its result.
+
+        The future resolves with the result dict (service, do_action, message)
+        once the goal is done. Cancelling the future cancels the goal. If the goal
+        has not finished after time_out seconds it is cancelled and the future
+        fails with a concurrent.futures.TimeoutError.
+
+        Goals sent to several services can be gathered with
+        concurrent.futures.wait(), or awaited in asyncio with asyncio.wrap_future().
+        As with send_goal(), the client tracks the newest goal, but the future of
+        an older goal still resolves when that goal is done.
+
+        Args:
+            action_goal (harmoniGoal): The goal object given to the action server
+            optional_data (str, optional): Data for the goal. Defaults to "".
+            condition (str, optional): Condition for the goal. Defaults to "".
+            time_out (float, optional): Seconds before the goal is cancelled, None
+                to wait indefinitely. Defaults to 60.
+
+        Returns:
+            concurrent.futures.Future: resolves with the result dict
+        """
+        rospy.logdebug(f"Client ({self.name}) Sending goal asynchronously.")
+        future = futures.Future()
+        goal_handler = self._send_goal(
+            action_goal,
+            optional_data,
+            condition,
+            lambda gh: self._handle_transition(gh, future),
+        )
+
+        def cancel_goal_of_future(f):
+            if f.cancelled():
+                rospy.logdebug(f"Client ({self.name}) Future cancelled, canceling goal")
+                goal_handler.cancel()
+
+        future.add_done_callback(cancel_goal_of_future)
+
+        if time_out:
+
+            def goal_timed_out():
+                if future.done():
+                    return
+                rospy.logwarn(f"Client ({self.name}) Goal timed out after {time_out}s")
+                goal_handler.cancel()
+                self._resolve_future(
+                    future,
+                    exception=futures.TimeoutError(
+                        f"{self.name} goal timed out after {time_out}s"
+                    ),
+                )
+
+            timeout_entry = _goal_timeouts.schedule(time_out, goal_timed_out)
+            future.add_done_callback(lambda f: _goal_timeouts.cancel(timeout_entry))
+        return future
+
+    def _send_goal(self, action_goal, optional_data, condition, transition_cb):
+        """Sends the goal and starts tracking it"""
+        self.stop_tracking_goal()
+        goal = harmoniGoal(
+            action_type=action_goal,
+            optional_data=optional_data,
+            condition=condition,
+        )
+
+        sent_time = time.time()
+
+        def timed_transition_cb(gh):
+            if gh.get_comm_state() == CommState.DONE:
+                self._record_result_timing(gh, action_goal, sent_time)
+            transition_cb(gh)
+
+        self.simple_state = SimpleGoalState.PENDING
+        self.goal_handler = self.action_client.send_goal(
+            goal, timed_transition_cb, self._handle_feedback
+        )
+        return self.goal_handler
+
+    def _record_result_timing(self, gh, action_type, sent_time):
+        """Records the round trip of a goal and how long its result took to arrive"""
+        received_time = time.time()
+        action_type = int(action_type)
+        metrics = get_metrics()
+        metrics.record(self.name, action_type, ROUND_TRIP, received_time - sent_time)
+        latest_result = getattr(gh.comm_state_machine, "latest_result", None)
+        if latest_result is not None:
+            stamp = latest_result.header.stamp.to_sec()
+            if stamp > 0:
+                metrics.record(
+                    self.name, action_type, RESULT_DELIVERY, received_time - stamp
+                )
+        return
+
+    def _resolve_future(self, future, result=None, exception=None):
+        """Sets the outcome of a future unless it is already done or cancelled"""
+        if future.done():
+            return
+        try:
+            if exception:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+        except futures.InvalidStateError:
+            # the future was cancelled or timed out concurrently
+            pass
+
     def setup_client(
         self,
         action_type,
@@ -141,7 +322,7 @@ class HarmoniActionClient(object):
             rospy.logdebug(
                 f"action_client waiting for {action_type} server to connect."
             )
-            self.action_client.wait_for_server()
+            self.connected = self.action_client.wait_for_server()
 
         self.result_cb_fnc = result_cb_fnc
         self.feedback_cb_fnc = feedback_cb_fnc
@@ -155,7 +336,26 @@ class HarmoniActionClient(object):
         # timeout is interpreted as an infinite timeout.
         #
         # @return True if the server connected in the allocated time. False on timeout
-        return self.action_client.wait_for_server(timeout)
+        if self.action_client.wait_for_server(timeout):
+            self.connected = True
+        return self.connected
+
+    def ensure_connected(self, timeout=rospy.Duration()):
+        """Waits for the server if it has not connected yet
+
+        Lets a client set up with wait=False connect when it is first used.
+
+        Args:
+            timeout (rospy.Duration, optional): Max time to wait. Defaults to
+                an infinite timeout.
+
+        Returns:
+            bool: True if the server is connected
+        """
+        if not self.connected:
+            rospy.loginfo(f"Client ({self.name}) Waiting for the server to connect")
+            self.wait_for_server(timeout)
+        return self.connected
 
     def send_goal_and_wait(
         self, goal, execute_timeout=rospy.Duration(), preempt_timeout=rospy.Duration()
@@ -294,9 +494,16 @@ class HarmoniActionClient(object):
         # Note that this does not cancel the goal, it simply stops looking for status info about this goal.
         self.goal_handler = None
 
-    def _handle_transition(self, gh):
+    def _handle_transition(self, gh, future=None):
         comm_state = gh.get_comm_state()
 
+        if self.goal_handler is not None and gh != self.goal_handler:
+            # A goal sent before the tracked one (e.g. by another pattern sharing
+            # the client): only its future follows it
+            if future and comm_state == CommState.DONE:
+                self._resolve_future(future, self._get_result_dict(gh))
+            return
+
         error_msg = "Received comm state %s when in simple state %s with SimpleActionClient in NS %s" % (
             CommState.to_string(comm_state),
             SimpleGoalState.to_string(self.simple_state),
@@ -329,6 +536,17 @@ class HarmoniActionClient(object):
                     self.done_condition.notifyAll()
             elif self.simple_state == SimpleGoalState.DONE:
                 rospy.logerr("SimpleActionClient received DONE twice")
+            if future:
+                self._resolve_future(future, self._get_result_dict(gh))
+
+    def _get_result_dict(self, gh):
+        """Returns the result of a goal as the dict given to futures"""
+        result = gh.get_result()
+        return {
+            "service": self.name,
+            "do_action": result.do_action if result else False,
+            "message": result.message if result else "",
+        }
 
     def _handle_feedback(self, gh, feedback):
         if not self.goal_handler:
@@ -367,3 +585,41 @@ class HarmoniActionClient(object):
         if self.result_cb_fnc:
             self.result_cb_fnc(self.action_result)
         return
+
+
+def connect_clients(clients, timeout=None):
+    """Waits for the servers of several clients at once
+
+    Startup then takes as long as the slowest server, instead of the sum of
+    their times.
+
+    Args:
+        clients (dict): HarmoniActionClients (set up with setup_client) by name
+        timeout (float, optional): seconds to wait for all the servers, None to
+            wait until they all connect. Defaults to None.
+
+    Returns:
+        dict: seconds each server took to connect by name, None for the servers
+            which did not connect in time
+    """
+    start = time.time()
+    timings = {}
+
+    def connect(name, client):
+        if client.wait_for_server(rospy.Duration(timeout or 0)):
+            timings[name] = time.time() - start
+
+    threads = [
+        threading.Thread(
+            target=connect, args=(name, client), name=f"connect_{name}", daemon=True
+        )
+        for name, client in clients.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        if timeout is None:
+            thread.join()
+        else:
+            thread.join(max(0.0, start + timeout - time.time()))
+    return {name: timings.get(name) for name in clients}
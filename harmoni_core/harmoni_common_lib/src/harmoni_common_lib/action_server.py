@@ -2,7 +2,9 @@
 
 import rospy
 import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from actionlib_msgs.msg import GoalStatus
 
@@ -12,6 +14,7 @@ import roslib
 
 # import actionlib
 from harmoni_common_msgs.msg import harmoniAction, harmoniFeedback, harmoniResult
+from harmoni_common_lib.metrics import get_metrics, QUEUE_WAIT
 
 
 # I don't know why this was included in the simple action server
@@ -20,6 +23,18 @@ def nop_cb(goal_handle):
     pass
 
 
+# @brief Records how long a goal waited between being sent and accepted
+# @return The time the goal was accepted
+def record_accepted(name, goal_handle):
+    accepted_time = time.time()
+    stamp = goal_handle.get_goal_id().stamp.to_sec()
+    if stamp > 0:
+        get_metrics().record(
+            name, goal_handle.get_goal().action_type, QUEUE_WAIT, accepted_time - stamp
+        )
+    return accepted_time
+
+
 # @class HarmoniActionServer
 # @brief The HarmoniActionServer is a modification of the SimpleActionServer
 # implements a singe goal policy on top of the ActionServer class. The
@@ -69,6 +84,8 @@ class HarmoniActionServer(object):
         if self.execute_callback:
             self.execute_thread = threading.Thread(None, self.executeLoop)
             self.execute_thread.start()
+            # the execute loop has no timeout, so it must be woken on shutdown
+            rospy.on_shutdown(self.wake_execute_loop)
         else:
             self.execute_thread = None
 
@@ -81,6 +98,7 @@ class HarmoniActionServer(object):
             auto_start,
         )
         self.action_goal = None
+        self.goal_accepted_time = None
         self._feedback = harmoniFeedback()
         self._result = harmoniResult()
         self.start()
@@ -89,6 +107,7 @@ class HarmoniActionServer(object):
         if hasattr(self, "execute_callback") and self.execute_callback:
             with self.terminate_mutex:
                 self.need_to_terminate = True
+            self.wake_execute_loop()
 
             assert self.execute_thread
             self.execute_thread.join()
@@ -135,6 +154,7 @@ class HarmoniActionServer(object):
             self.current_goal.set_accepted(
                 "This goal has been accepted by the simple action server"
             )
+            self.goal_accepted_time = record_accepted(self.name, self.current_goal)
 
             return self.current_goal.get_goal()
 
@@ -291,11 +311,24 @@ class HarmoniActionServer(object):
                 rospy.logdebug("Setting preempt request bit for the next goal to TRUE")
                 self.new_goal_preempt_request = True
 
+    # @brief Wakes the execute loop so it can check for shutdown/termination
+    def wake_execute_loop(self):
+        with self.execute_condition:
+            self.execute_condition.notify_all()
+
+    # @brief True when the execute loop has something to do
+    def _execute_loop_ready(self):
+        return self.new_goal or self.need_to_terminate or rospy.is_shutdown()
+
     # @brief Called from a separate thread to call blocking execute calls
+    # The loop only sleeps while there is no goal waiting. It is woken by
+    # internal_goal_callback, so a goal received while the previous goal was
+    # executing is accepted as soon as the execute callback returns.
     def executeLoop(self):
-        loop_duration = rospy.Duration.from_sec(0.1)
-
         while not rospy.is_shutdown():
+            with self.execute_condition:
+                self.execute_condition.wait_for(self._execute_loop_ready)
+
             with self.terminate_mutex:
                 if self.need_to_terminate:
                     break
@@ -347,5 +380,195 @@ class HarmoniActionServer(object):
                         None, "Exception in execute callback: %s" % str(ex)
                     )
 
-            with self.execute_condition:
-                self.execute_condition.wait(loop_duration.to_sec())
+
+# @class HarmoniGoal
+# @brief Tracks a single goal of the HarmoniConcurrentActionServer. Each goal
+# has its own preempt request, feedback and result, so terminal states can be
+# set on one goal without touching the others being served.
+class HarmoniGoal(object):
+    # @brief Constructor for a HarmoniGoal
+    # @param server The HarmoniConcurrentActionServer serving the goal
+    # @param goal_handle The ServerGoalHandle received by the ActionServer
+    def __init__(self, server, goal_handle):
+        self.server = server
+        self.goal_handle = goal_handle
+        self.goal = goal_handle.get_goal()
+        self.id = goal_handle.get_goal_id().id
+        self.preempt_request = False
+        self.accepted_time = None
+        self._feedback = harmoniFeedback()
+
+    # @brief Allows polling implementations to query about preempt requests
+    # @return True if a preempt is requested for this goal, false otherwise
+    def is_preempt_requested(self):
+        return self.preempt_request
+
+    # @brief Allows polling implementations to query about the status of the goal
+    # @return True if the goal is active, false otherwise
+    def is_active(self):
+        status = self.goal_handle.get_goal_status().status
+        return status == GoalStatus.ACTIVE or status == GoalStatus.PREEMPTING
+
+    # @brief Publishes the state of the service as feedback for this goal
+    def publish_feedback(self, state):
+        self._feedback.state = state
+        self.goal_handle.publish_feedback(self._feedback)
+
+    # @brief Sets the status of the goal to succeeded
+    # @param  result An optional result to send back to the client of the goal
+    def set_succeeded(self, result=None, text=""):
+        with self.server.action_server.lock, self.server.lock:
+            if not result:
+                result = self.server.get_default_result()
+            self.goal_handle.set_succeeded(result, text)
+
+    # @brief Sets the status of the goal to aborted
+    # @param  result An optional result to send back to the client of the goal
+    def set_aborted(self, result=None, text=""):
+        with self.server.action_server.lock, self.server.lock:
+            if not result:
+                result = self.server.get_default_result()
+            self.goal_handle.set_aborted(result, text)
+
+    # @brief Sets the status of the goal to preempted
+    # @param  result An optional result to send back to the client of the goal
+    def set_preempted(self, result=None, text=""):
+        with self.server.action_server.lock, self.server.lock:
+            if not result:
+                result = self.server.get_default_result()
+            self.goal_handle.set_canceled(result, text)
+
+
+# @class HarmoniConcurrentActionServer
+# @brief The HarmoniConcurrentActionServer is an opt-in alternative to the
+# HarmoniActionServer for services that can serve several clients at once
+# (e.g. stateless requests to a cloud service). Instead of a single goal
+# policy, every goal is tracked with its own HarmoniGoal and executed on a
+# bounded pool of worker threads. New goals never preempt the goals already
+# being served; a cancel only preempts the goal it was sent for. Goals received
+# while every worker is busy wait in a bounded queue, and are rejected once the
+# queue is full.
+class HarmoniConcurrentActionServer(object):
+    # @brief Constructor for a HarmoniConcurrentActionServer
+    # @param name A name for the action server
+    # @param execute_cb Callback that gets called in a worker thread with the
+    # HarmoniGoal to execute. It should set a terminal status on the goal.
+    # @param preempt_cb Optional callback that gets called with the HarmoniGoal
+    # that a client asked to cancel.
+    # @param max_workers The number of goals that can be executed at once
+    # @param max_pending_goals The number of goals that can wait for a worker
+    # before new goals are rejected
+    # @param auto_start A boolean value that tells the ActionServer wheteher or not to start
+    # publishing as soon as it comes up.
+    def __init__(
+        self,
+        name,
+        execute_cb,
+        preempt_cb=None,
+        max_workers=4,
+        max_pending_goals=8,
+        auto_start=False,
+    ):
+        self.name = name
+        self.execute_callback = execute_cb
+        self.preempt_callback = preempt_cb
+        self.max_workers = max_workers
+        self.max_pending_goals = max_pending_goals
+
+        # as with the HarmoniActionServer, self.lock must always be locked
+        # after the action server lock
+        self.lock = threading.RLock()
+        self.goals = {}  # goal id -> HarmoniGoal, for goals queued or running
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        self.action_server = ActionServer(
+            name,
+            harmoniAction,
+            self.internal_goal_callback,
+            self.internal_preempt_callback,
+            auto_start,
+        )
+        self.start()
+
+    def __del__(self):
+        if hasattr(self, "executor"):
+            self.executor.shutdown(wait=False)
+
+    # @brief Explicitly start the action server, used it auto_start is set to false
+    def start(self):
+        self.action_server.start()
+
+    def get_default_result(self):
+        return self.action_server.ActionResultType()
+
+    # @brief Publishes the state of the service as feedback for every active goal
+    def publish_feedback(self, state):
+        with self.lock:
+            goals = list(self.goals.values())
+        for goal in goals:
+            if goal.is_active():
+                goal.publish_feedback(state)
+
+    # @brief Callback for when the ActionServer receives a new goal. The goal is
+    # queued for a worker, or rejected if the server is saturated.
+    def internal_goal_callback(self, goal_handle):
+        with self.lock:
+            if len(self.goals) >= self.max_workers + self.max_pending_goals:
+                rospy.logwarn(
+                    f"(Server {self.name}) Rejecting goal, {len(self.goals)} goals already in progress"
+                )
+                goal_handle.set_rejected(
+                    None, "This goal was rejected because the server is saturated"
+                )
+                return
+            goal = HarmoniGoal(self, goal_handle)
+            self.goals[goal.id] = goal
+            rospy.logdebug(f"(Server {self.name}) Queued goal {goal.id}")
+            self.executor.submit(self._execute_goal, goal)
+
+    # @brief Callback for when the ActionServer receives a cancel for a goal. Only
+    # that goal is preempted.
+    def internal_preempt_callback(self, goal_handle):
+        with self.lock:
+            goal = self.goals.get(goal_handle.get_goal_id().id)
+            if not goal:
+                return
+            rospy.logdebug(f"(Server {self.name}) Preempt requested for goal {goal.id}")
+            goal.preempt_request = True
+            if goal.is_active():
+                goal.set_preempted(None, "This goal was canceled by the client")
+            if self.preempt_callback:
+                self.preempt_callback(goal)
+
+    # @brief Called from a worker thread to run the blocking execute callback
+    def _execute_goal(self, goal):
+        try:
+            with self.action_server.lock, self.lock:
+                if goal.is_preempt_requested():
+                    goal.goal_handle.set_canceled(
+                        None, "This goal was canceled before it was started"
+                    )
+                    return
+                goal.goal_handle.set_accepted(
+                    "This goal has been accepted by the concurrent action server"
+                )
+                goal.accepted_time = record_accepted(self.name, goal.goal_handle)
+            self.execute_callback(goal)
+            if goal.is_active():
+                rospy.logwarn(
+                    "Your executeCallback did not set the goal to a terminal status.  "
+                    + "For now, the ActionServer will set this goal to aborted"
+                )
+                goal.set_aborted(None, "No terminal state was set.")
+        except Exception as ex:
+            rospy.logerr(
+                "Exception in your execute callback: %s\n%s",
+                str(ex),
+                traceback.format_exc(),
+            )
+            if goal.is_active():
+                goal.set_aborted(None, "Exception in execute callback: %s" % str(ex))
+        finally:
+            with self.lock:
+                self.goals.pop(goal.id, None)
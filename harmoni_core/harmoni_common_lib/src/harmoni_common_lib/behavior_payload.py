@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import ast
+import base64
+import io
+from harmoni_common_msgs.msg import Behavior, BehaviorData
+
+PAYLOAD_PREFIX = "BehaviorData:"
+
+_warned_services = set()  # services warned of tts results read as literals
+
+
+def encode_behavior_payload(audio_frame, audio_data, behavior_data):
+    """Packs the audio and behaviors of a tts result into a string.
+
+    The result of a harmoni action is a string, so the BehaviorData message is
+    serialized to its ROS wire format and base64 encoded. The audio then takes
+    ~1.33x its size, where the repr of a bytes object takes up to 4x.
+
+    Args:
+        audio_frame (int): sample rate of the audio
+        audio_data (bytes): raw wav samples, without header
+        behavior_data (list): behaviors as dicts with start, type and the
+            optional id, value, character and args
+
+    Returns:
+        str: payload to be read with parse_behavior_payload
+    """
+    msg = BehaviorData(
+        audio_frame=audio_frame,
+        audio_data=audio_data,
+        behavior_data=[
+            Behavior(
+                start=b["start"],
+                type=b["type"],
+                id=b.get("id", ""),
+                value=b.get("value", ""),
+                character=b.get("character", 0.0),
+                args=[str(arg) for arg in b.get("args", [])],
+            )
+            for b in behavior_data
+        ],
+    )
+    buff = io.BytesIO()
+    msg.serialize(buff)
+    return PAYLOAD_PREFIX + base64.b64encode(buff.getbuffer()).decode("ascii")
+
+
+def _behavior_to_dict(behavior):
+    """Returns a behavior with the same keys the tts used to send"""
+    data = {"start": behavior.start, "type": behavior.type}
+    if behavior.type == "word":
+        data["character"] = behavior.character
+        data["value"] = behavior.value
+    else:
+        data["id"] = behavior.id
+    if behavior.type in ["action", "web"]:
+        data["args"] = list(behavior.args)
+    return data
+
+
+def parse_behavior_payload(data, service=None):
+    """Reads the data passed on from a tts result (or a pattern script).
+
+    Payloads from encode_behavior_payload are deserialized directly, and the
+    audio is returned as the bytes of the message without any conversion.
+    Other strings are evaluated as python literals, as the behaviors written
+    in pattern scripts are, along with a stringified behavior_data field. A
+    tts result read this way, e.g. from an older tts node, is much slower to
+    read, which is logged once per service.
+
+    Args:
+        data (str): payload, or stringified dict/list
+        service (str, optional): name of the service reading the data, for
+            the warning. Defaults to None.
+
+    Returns:
+        dict: audio_frame, audio_data (bytes) and behavior_data (list) for tts
+            results, otherwise the evaluated literal
+    """
+    if not isinstance(data, str):
+        return data
+    if data.startswith(PAYLOAD_PREFIX):
+        msg = BehaviorData()
+        msg.deserialize(base64.b64decode(data[len(PAYLOAD_PREFIX) :]))
+        return {
+            "audio_frame": msg.audio_frame,
+            "audio_data": msg.audio_data,
+            "behavior_data": [_behavior_to_dict(b) for b in msg.behavior_data],
+        }
+    data = ast.literal_eval(data)
+    if isinstance(data, dict) and "audio_data" in data:
+        if service not in _warned_services:
+            _warned_services.add(service)
+            rospy.logwarn(
+                f"{service or 'A service'} got a tts result that is not a "
+                f"{PAYLOAD_PREFIX} payload, reading it as a python literal"
+            )
+    if isinstance(data, dict) and isinstance(data.get("behavior_data"), str):
+        data["behavior_data"] = ast.literal_eval(data["behavior_data"])
+    return data
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import os
+import threading
+import yaml
+from harmoni_common_lib.constants import Resources
+
+CONFIG_FILE = os.path.join("harmoni_decision", "config", "configuration.yaml")
+
+
+def get_config_path():
+    """Returns the path of the configuration.yaml of harmoni_decision
+
+    The file is looked up next to this package in the source tree
+    (harmoni_core), then through rospkg.
+    """
+    harmoni_core = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../..")
+    path = os.path.normpath(os.path.join(harmoni_core, CONFIG_FILE))
+    if not os.path.exists(path):
+        import rospkg
+
+        path = os.path.join(
+            rospkg.RosPack().get_path("harmoni_decision"),
+            "config",
+            "configuration.yaml",
+        )
+    return path
+
+
+class ConfigRegistry(object):
+    """Indexed view of the configuration file listing the children of each repo.
+
+    The file is loaded once and indexed by repo, child and service id, so
+    lookups do not parse the yaml again. It is reloaded when its modification
+    time changes.
+    """
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str, optional): configuration file. Defaults to the one of
+                harmoni_decision.
+        """
+        self.path = path or get_config_path()
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.repos = {}  # repo -> children
+        self.child_repo = {}  # child -> repo
+        self.child_ids = {}  # child -> instance ids
+        self.service_ids = {}  # (child, resources) -> fully qualified service ids
+        self.repo_services = {}  # repo -> (repo_child names, children)
+        self.service_child = {}  # service id -> (child, instance id)
+        self._refresh()
+        return
+
+    def _refresh(self):
+        """Reloads the indices if the file changed since it was last read"""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self.mtime:
+            return
+        with self.lock:
+            if mtime != self.mtime:
+                with open(self.path) as file:
+                    self._index(yaml.load(file, Loader=yaml.FullLoader) or {})
+                self.mtime = mtime
+        return
+
+    def _index(self, config):
+        """Builds the indices of a loaded configuration"""
+        repos = {}
+        child_repo = {}
+        child_ids = {}
+        service_ids = {}
+        repo_services = {}
+        service_child = {}
+        resources = {enum.name: enum.value for enum in list(Resources)}
+        for repo, children in config.items():
+            children = children or {}
+            repos[repo] = list(children)
+            repo_services[repo] = (
+                [repo + "_" + child for child in children],
+                list(children),
+            )
+            for child, ids in children.items():
+                ids = [str(id_child) for id_child in ids or []]
+                child_repo[child] = repo
+                child_ids[child] = ids
+                service_ids[(child, False)] = [child + "_" + i for i in ids]
+                if child in resources:
+                    service_ids[(child, True)] = [
+                        child + "_" + r + "_" + i for i in ids for r in resources[child]
+                    ]
+                else:
+                    service_ids[(child, True)] = service_ids[(child, False)]
+                for i in ids:
+                    service_child[child + "_" + i] = (child, i)
+                    for r in resources.get(child, []):
+                        service_child[child + "_" + r + "_" + i] = (child, i)
+        self.repos = repos
+        self.child_repo = child_repo
+        self.child_ids = child_ids
+        self.service_ids = service_ids
+        self.repo_services = repo_services
+        self.service_child = service_child
+        return
+
+    def get_repos(self):
+        """Returns the repos in the configuration"""
+        self._refresh()
+        return list(self.repos)
+
+    def get_children(self, repo):
+        """Returns the children of a repo"""
+        self._refresh()
+        return list(self.repos.get(repo, []))
+
+    def get_repo(self, child):
+        """Returns the repo of a child, None if it is not configured"""
+        self._refresh()
+        return self.child_repo.get(child)
+
+    def get_ids(self, child):
+        """Returns the instance ids of a child"""
+        self._refresh()
+        return list(self.child_ids.get(child, []))
+
+    def get_service_ids(self, child, resources=True):
+        """Returns the fully qualified service ids of a child
+
+        Args:
+            child (str): name of the child (e.g. tts)
+            resources (bool, optional): expand the resources of the child
+                (e.g. face_eyes_default). Defaults to True.
+        """
+        self._refresh()
+        return list(self.service_ids.get((child, resources), []))
+
+    def get_service_child(self, service):
+        """Returns the child and the instance id of a service id
+
+        E.g. ("face", "default") for face_mouth_default, whose node reads its
+        params from face/default_param. None if the service is not configured.
+        """
+        self._refresh()
+        return self.service_child.get(service)
+
+    def get_configured_services(self):
+        """Returns the fully qualified ids of all the configured services"""
+        self._refresh()
+        services = set()
+        for (child, resources), service_ids in self.service_ids.items():
+            if resources:
+                services.update(service_ids)
+        return services
+
+    def get_repo_services(self, repo):
+        """Returns the repo_child names and the children of a repo"""
+        self._refresh()
+        repo_services, children = self.repo_services.get(repo, ([], []))
+        return (list(repo_services), list(children))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Returns the registry of the process, loading it on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ConfigRegistry()
+    return _registry
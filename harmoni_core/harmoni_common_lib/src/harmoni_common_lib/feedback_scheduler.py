@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import threading
+import time
+from harmoni_common_lib.constants import State
+
+
+class FeedbackScheduler(object):
+    """Publishes the feedback of the service servers of a process on one thread.
+
+    Feedback is published as soon as the state of a service changes, and every
+    heartbeat seconds (if set) while it does not, so that clients joining late
+    also learn the state. Servers are added with add_server(), which returns
+    immediately, so a node can host any number of servers.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.heartbeats = {}  # server -> heartbeat period (seconds) or None
+        self.next_heartbeat = {}  # server -> time of the next heartbeat
+        self.changed = set()  # servers whose state changed
+        self.thread = None
+        return
+
+    def add_server(self, server, heartbeat=None):
+        """Starts publishing the feedback of a server
+
+        Args:
+            server (HarmoniServiceServer): server whose service_manager state is
+                published with publish_feedback()
+            heartbeat (float, optional): seconds between feedback when the state
+                does not change, None to only publish changes. Defaults to None.
+        """
+        with self.condition:
+            self.heartbeats[server] = heartbeat
+            self.next_heartbeat[server] = None
+            self.changed.add(server)  # publish the current state
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self._publish_loop, name="harmoni_feedback", daemon=True
+                )
+                self.thread.start()
+                rospy.on_shutdown(self.wake)
+            self.condition.notify()
+        if hasattr(server.service_manager, "add_state_listener"):
+            server.service_manager.add_state_listener(
+                lambda service: self.state_changed(server)
+            )
+        return
+
+    def remove_server(self, server):
+        """Stops publishing the feedback of a server"""
+        with self.condition:
+            self.heartbeats.pop(server, None)
+            self.next_heartbeat.pop(server, None)
+            self.changed.discard(server)
+        return
+
+    def state_changed(self, server):
+        """Schedules the feedback of a server to be published now"""
+        with self.condition:
+            if server in self.heartbeats:
+                self.changed.add(server)
+                self.condition.notify()
+        return
+
+    def wake(self):
+        """Wakes the publishing thread, e.g. to exit on shutdown"""
+        with self.condition:
+            self.condition.notify_all()
+        return
+
+    def _time_to_heartbeat(self, now):
+        """Returns the seconds until the next heartbeat is due, None if none is"""
+        due = [t for t in self.next_heartbeat.values() if t is not None]
+        return max(0.0, min(due) - now) if due else None
+
+    def _publish_loop(self):
+        while not rospy.is_shutdown():
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.changed or rospy.is_shutdown(),
+                    self._time_to_heartbeat(time.monotonic()),
+                )
+                now = time.monotonic()
+                servers = set(self.changed)
+                self.changed.clear()
+                for server, next_heartbeat in self.next_heartbeat.items():
+                    if next_heartbeat is not None and now >= next_heartbeat:
+                        servers.add(server)
+                for server in servers:
+                    if self.heartbeats[server]:
+                        self.next_heartbeat[server] = now + self.heartbeats[server]
+            for server in servers:
+                self._publish(server)
+        return
+
+    def _publish(self, server):
+        state = server.service_manager.state
+        if state is None or state == State.INIT:
+            return
+        try:
+            server.publish_feedback(state)
+        except Exception as e:
+            rospy.logwarn(f"{server.name} could not publish feedback: {e}")
+        return
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_feedback_scheduler():
+    """Returns the feedback scheduler of the process"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = FeedbackScheduler()
+    return _scheduler
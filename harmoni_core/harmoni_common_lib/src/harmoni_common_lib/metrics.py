@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import bisect
+import json
+import math
+import threading
+import time
+from std_msgs.msg import String
+from harmoni_common_lib.constants import ActionType
+
+# Upper bounds of the histogram buckets (seconds): 1 ms to ~65 s
+BUCKETS = [0.001 * 2**i for i in range(17)]
+
+# Timings recorded for each goal
+QUEUE_WAIT = "queue_wait"  # server: goal sent by the client -> goal accepted
+EXECUTION = "execution"  # server: goal accepted -> result sent
+RESULT_DELIVERY = "result_delivery"  # client: result sent -> result received
+ROUND_TRIP = "round_trip"  # client: goal sent -> result received
+
+
+def nearest_rank(ordered, p):
+    """Returns the p-th percentile of sorted values by the nearest-rank method
+
+    The percentile is the smallest value with at least p % of the values at or
+    below it, as for the buckets of Histogram.percentile.
+
+    Args:
+        ordered (list): values, sorted
+        p (float): percentile, between 0 and 100
+    """
+    return ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+
+
+class Histogram(object):
+    """Latency histogram with fixed, exponentially growing buckets.
+
+    Recording a value is a bisect on the bucket bounds, so it can be left on
+    for every goal.
+    """
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is unbounded
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Returns the upper bound of the bucket holding the p-th percentile
+
+        Args:
+            p (float): percentile, between 0 and 100
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "max": self.max,
+        }
+
+
+class GoalMetrics(object):
+    """Timings of the goals of a process, per (service, action_type) and metric.
+
+    The action clients and servers record into the process-wide instance (see
+    get_metrics()). The histograms can be read in process with get_histogram()
+    and snapshot(), and a snapshot is published as a json string on
+    /harmoni/metrics every publish_period seconds while new values come in.
+
+    Queue wait and result delivery are measured against the stamps set by the
+    other side, so they assume the clocks of the machines agree.
+    """
+
+    def __init__(self, publish_period=1.0):
+        """
+        Args:
+            publish_period (float, optional): seconds between snapshots
+                published on /harmoni/metrics, None to not publish. Defaults to 1.
+        """
+        self.publish_period = publish_period
+        self.lock = threading.Lock()
+        self.histograms = {}  # (service, action_type, metric) -> Histogram
+        self.updated = False
+        self.publisher = None
+        self.thread = None
+        return
+
+    def record(self, service, action_type, metric, seconds):
+        """Records the duration of one goal
+
+        Args:
+            service (str): name of the service (e.g. tts_default)
+            action_type (int): ActionType of the goal, or a label (e.g. "loop")
+            metric (str): one of QUEUE_WAIT, EXECUTION, RESULT_DELIVERY, ROUND_TRIP
+            seconds (float): the duration
+        """
+        key = (service, action_type, metric)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.record(max(0.0, seconds))
+            self.updated = True
+            if self.thread is None and self.publish_period:
+                self.thread = threading.Thread(
+                    target=self._publish_loop, name="harmoni_metrics", daemon=True
+                )
+                self.thread.start()
+        return
+
+    def get_histogram(self, service, action_type, metric):
+        """Returns the histogram of a metric, None if nothing was recorded"""
+        with self.lock:
+            return self.histograms.get((service, action_type, metric))
+
+    def snapshot(self):
+        """Returns the summary of every histogram as a list of dicts"""
+        with self.lock:
+            items = [(key, h.to_dict()) for key, h in self.histograms.items()]
+        snapshot = []
+        for (service, action_type, metric), summary in items:
+            try:
+                action_type = ActionType(action_type).name
+            except ValueError:
+                pass
+            summary.update(service=service, action_type=action_type, metric=metric)
+            snapshot.append(summary)
+        return snapshot
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+        return
+
+    def _publish_loop(self):
+        self.publisher = rospy.Publisher("/harmoni/metrics", String, queue_size=10)
+        while not rospy.is_shutdown():
+            time.sleep(self.publish_period)
+            with self.lock:
+                updated = self.updated
+                self.updated = False
+            if updated:
+                self.publisher.publish(json.dumps(self.snapshot()))
+        return
+
+
+_metrics = GoalMetrics()
+
+
+def get_metrics():
+    """Returns the goal metrics of the process"""
+    return _metrics
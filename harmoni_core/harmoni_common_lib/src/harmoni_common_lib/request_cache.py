@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import json
+import threading
+import time
+from collections import OrderedDict
+from std_msgs.msg import String
+from harmoni_common_lib.constants import State
+
+
+class RequestCache(object):
+    """Memoizes the results of a service's request() calls.
+
+    Patterns often make the same request over and over (e.g. the same trigger
+    sent to the tts on every loop), and each one is a full round trip to a cloud
+    service. The cache stores successful results keyed on (service, optional_data)
+    and replays them without calling the service.
+
+    Entries are evicted least recently used first once max_size is reached, and
+    expire ttl seconds after they were stored. Only services that declare
+    deterministic_requests are cached, since replaying the result of e.g. a
+    dialogue bot would ignore the state of the conversation.
+
+    Hit/miss counters are published as a json string on /harmoni/cache/<name>
+    each time the cache is used.
+    """
+
+    def __init__(self, name, max_size=32, ttl=3600, publish_stats=True):
+        """
+        Args:
+            name (str): name of the cached service, used for the stats topic
+            max_size (int, optional): max number of results kept. Defaults to 32.
+            ttl (float, optional): seconds a result stays valid, None to never
+                expire. Defaults to 3600.
+            publish_stats (bool, optional): publish the counters. Defaults to True.
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (time stored, result)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self.stats_pub = None
+        if publish_stats:
+            self.stats_pub = rospy.Publisher(
+                "/harmoni/cache/" + name, String, queue_size=10
+            )
+        return
+
+    def get(self, key):
+        """Returns the cached result for key, or None on a miss"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and self.ttl is not None and time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+        self.publish_stats()
+        return entry[1] if entry else None
+
+    def put(self, key, result):
+        """Stores a result, evicting the least recently used one if full"""
+        with self.lock:
+            self.entries[key] = (time.time(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        return
+
+    def get_stats(self):
+        """Returns a copy of the counters along with the current size"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = len(self.entries)
+        return stats
+
+    def publish_stats(self):
+        if self.stats_pub:
+            self.stats_pub.publish(json.dumps(self.get_stats()))
+        return
+
+    def attach(self, service_manager):
+        """Wraps the request() of a service manager with the cache.
+
+        Successful results are cached. On a hit the service's state, result_msg
+        and response_received are set as the service itself would have.
+
+        Args:
+            service_manager (HarmoniServiceManager): the service to cache
+
+        Returns:
+            bool: False if the service is not deterministic and was left uncached
+        """
+        if not getattr(service_manager, "deterministic_requests", False):
+            rospy.logwarn(
+                f"{service_manager.name} requests are not deterministic, not caching them"
+            )
+            return False
+
+        request = service_manager.request
+
+        def cached_request(optional_data):
+            key = (service_manager.name, optional_data)
+            result = self.get(key)
+            if result is None:
+                result = request(optional_data)
+                if isinstance(result, dict) and result.get("response") == State.SUCCESS:
+                    self.put(key, result)
+                return result
+            rospy.loginfo(f"{service_manager.name} request served from cache")
+            if not service_manager.concurrent_goals:
+                service_manager.state = State.SUCCESS
+                service_manager.result_msg = result["message"]
+                service_manager.response_received = True
+            return dict(result)
+
+        service_manager.request = cached_request
+        rospy.loginfo(
+            f"Caching {service_manager.name} requests (size {self.max_size}, ttl {self.ttl})"
+        )
+        return True
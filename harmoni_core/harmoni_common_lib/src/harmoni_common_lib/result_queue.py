@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import threading
+import time
+from collections import deque
+
+
+class ResultQueue(object):
+    """Results (or detections) of a service, tagged with the time received.
+
+    Items are dicts {"time": time received, "data": data}. Threads waiting for
+    a result with get_new() are woken as soon as one is put, instead of
+    polling the queue.
+
+    The queue can be bounded, e.g. for a detector which publishes all along:
+    the oldest items are dropped once it holds maxlen items, and items older
+    than max_age seconds expire. Both are counted (see get_stats()).
+    """
+
+    def __init__(self, maxlen=None, max_age=None):
+        """
+        Args:
+            maxlen (int, optional): items kept, None for no limit. Defaults to None.
+            max_age (float, optional): seconds an item is kept, None for no
+                limit. Defaults to None.
+        """
+        self.condition = threading.Condition()
+        self.items = deque()
+        self.maxlen = maxlen
+        self.max_age = max_age
+        self.dropped = 0  # items removed to keep maxlen
+        self.expired = 0  # items removed for being older than max_age
+        self.closed = False
+        return
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return f"ResultQueue({list(self.items)})"
+
+    def put(self, data, timestamp=None):
+        """Adds a result and wakes the threads waiting for one
+
+        Args:
+            data (str): the result
+            timestamp (float, optional): time the result was received.
+                Defaults to now.
+        """
+        item = {"time": time.time() if timestamp is None else timestamp, "data": data}
+        with self.condition:
+            self._expire()
+            self.items.append(item)
+            if self.maxlen is not None and len(self.items) > self.maxlen:
+                self.items.popleft()
+                self.dropped += 1
+            self.condition.notify_all()
+        return
+
+    def _expire(self):
+        """Removes the items older than max_age; called with the condition held"""
+        if self.max_age is None:
+            return
+        oldest = time.time() - self.max_age
+        while self.items and self.items[0]["time"] < oldest:
+            self.items.popleft()
+            self.expired += 1
+
+    def pop(self):
+        """Returns the oldest result without waiting, None if there is none"""
+        with self.condition:
+            self._expire()
+            return self.items.popleft() if self.items else None
+
+    def latest_after(self, since):
+        """Returns the newest item received at or after since, None if there is none
+
+        The item is left in the queue.
+        """
+        with self.condition:
+            self._expire()
+            if self.items and self.items[-1]["time"] >= since:
+                return self.items[-1]
+            return None
+
+    def all_since(self, since):
+        """Returns the items received at or after since, oldest first
+
+        The items are left in the queue.
+        """
+        with self.condition:
+            self._expire()
+            return [item for item in self.items if item["time"] >= since]
+
+    def drain(self):
+        """Removes and returns all the items, oldest first"""
+        with self.condition:
+            self._expire()
+            items = list(self.items)
+            self.items.clear()
+            return items
+
+    def get_stats(self):
+        """Returns the number of items held, dropped and expired"""
+        with self.condition:
+            self._expire()
+            return {
+                "size": len(self.items),
+                "dropped": self.dropped,
+                "expired": self.expired,
+            }
+
+    def get_new(self, since, timeout=None, stop=None):
+        """Waits for a result received at or after a given time
+
+        Older results are dropped from the queue.
+
+        Args:
+            since (float): time (time.time()) from which results are new
+            timeout (float, optional): seconds to wait, None to wait until a
+                result comes or the queue is closed. Defaults to None.
+            stop (func, optional): returns True to stop waiting, checked each
+                time the waiting threads are woken (see wake()). Defaults to None.
+
+        Returns:
+            dict: the first new result, None on timeout, if the queue is closed
+                or if stop() is True
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while True:
+                self._expire()
+                while self.items:
+                    item = self.items.popleft()
+                    if item["time"] >= since:
+                        return item
+                if self.closed or (stop and stop()):
+                    return None
+                if deadline is None:
+                    self.condition.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self.condition.wait(remaining)
+
+    def wake(self):
+        """Wakes the waiting threads so that they check their stop condition"""
+        with self.condition:
+            self.condition.notify_all()
+        return
+
+    def close(self):
+        """Wakes the waiting threads, e.g. on shutdown; get_new() stops waiting"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        return
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import functools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from std_msgs.msg import String
+
+
+class _Lane(object):
+    """A thread pool with a bound on the tasks it holds, and its counters"""
+
+    def __init__(self, name, max_workers, max_pending):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self.slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "rejected": 0,
+            "queued": 0,
+            "running": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "wait_time_max": 0.0,
+            "run_time_total": 0.0,
+            "run_time_max": 0.0,
+        }
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        completed = stats["completed"]
+        stats["run_time_mean"] = (
+            stats["run_time_total"] / completed if completed else 0.0
+        )
+        return stats
+
+
+class ServiceExecutor(object):
+    """Runs the calls a service server makes to its service manager.
+
+    Calls to start() go through a single worker, as do calls to stop() and
+    pause(), each in the order they were received. The two lanes are apart
+    because start() may block for as long as the service runs: a stop or pause
+    runs alongside a start already going, and cancels the starts not begun yet.
+    A start waits for the stop or pause received before it, so an ON received
+    after an OFF is never undone by it. Calls to do() and request() go to a
+    pool of max_workers threads.
+
+    Each lane holds a bounded number of tasks, running or waiting. Once it is full,
+    submit() waits up to timeout seconds for a task to finish (back-pressure),
+    then rejects the call by returning None.
+
+    Queue depth and run time are counted per lane. They are published as a
+    json string on /harmoni/executor/<name> after each task.
+    """
+
+    def __init__(
+        self,
+        name,
+        max_workers=2,
+        max_pending=2,
+        max_pending_control=8,
+        publish_stats=True,
+    ):
+        """
+        Args:
+            name (str): name of the service server, used for the threads and topic
+            max_workers (int, optional): do/request calls run at once. Defaults to 2.
+            max_pending (int, optional): do/request calls waiting for a worker.
+                Defaults to 2.
+            max_pending_control (int, optional): start calls, and stop/pause
+                calls, waiting for the previous one. Defaults to 8.
+            publish_stats (bool, optional): publish the counters. Defaults to True.
+        """
+        self.name = name
+        self.starts = _Lane(name + "_start", 1, max_pending_control)
+        self.control = _Lane(name + "_control", 1, max_pending_control)
+        self.control_lock = threading.Lock()
+        self.control_count = 0  # stop/pause calls submitted, cancelling starts
+        self.last_control = None  # future of the last stop/pause call
+        self.actions = _Lane(name + "_action", max_workers, max_pending)
+        self.stats_pub = None
+        if publish_stats:
+            self.stats_pub = rospy.Publisher(
+                "/harmoni/executor/" + name, String, queue_size=10
+            )
+        return
+
+    def submit_start(self, fn, *args, timeout=None):
+        """Runs start once the stop/pause calls submitted before it are done
+
+        The start is skipped, and its future returns None, if a stop or pause
+        is submitted before it begins.
+
+        Returns:
+            Future: the future of the call, None if it was rejected
+        """
+        with self.control_lock:
+            count = self.control_count
+            previous = self.last_control
+
+        @functools.wraps(fn)
+        def start(*args):
+            if previous is not None:
+                wait([previous])
+            with self.control_lock:
+                cancelled = count != self.control_count
+            if cancelled:
+                with self.starts.lock:
+                    self.starts.stats["cancelled"] += 1
+                rospy.loginfo(f"({self.name}) Skipping {fn.__name__}, it was stopped")
+                return None
+            return fn(*args)
+
+        return self._submit(self.starts, start, args, timeout)
+
+    def submit_control(self, fn, *args, timeout=None):
+        """Runs stop or pause in the order they are submitted, even while a start runs
+
+        Returns:
+            Future: the future of the call, None if it was rejected
+        """
+        with self.control_lock:
+            future = self._submit(self.control, fn, args, timeout)
+            if future is not None:
+                self.control_count += 1
+                self.last_control = future
+        return future
+
+    def submit(self, fn, *args, timeout=0):
+        """Runs a do or request call on a worker
+
+        Args:
+            fn (func): the call to make
+            timeout (float, optional): seconds to wait for room when the lane
+                is full, None to wait indefinitely. Defaults to 0.
+
+        Returns:
+            Future: the future of the call, None if it was rejected
+        """
+        return self._submit(self.actions, fn, args, timeout)
+
+    def _submit(self, lane, fn, args, timeout):
+        if timeout == 0:
+            acquired = lane.slots.acquire(False)
+        else:
+            acquired = lane.slots.acquire(True, timeout)
+        if not acquired:
+            with lane.lock:
+                lane.stats["rejected"] += 1
+            rospy.logwarn(f"({self.name}) Rejecting {fn.__name__}, executor is full")
+            return None
+        with lane.lock:
+            lane.stats["submitted"] += 1
+            lane.stats["queued"] += 1
+        return lane.executor.submit(self._run, lane, fn, args, time.time())
+
+    def _run(self, lane, fn, args, submit_time):
+        start = time.time()
+        with lane.lock:
+            lane.stats["queued"] -= 1
+            lane.stats["running"] += 1
+            lane.stats["wait_time_max"] = max(
+                lane.stats["wait_time_max"], start - submit_time
+            )
+        try:
+            return fn(*args)
+        except Exception as e:
+            rospy.logerr(f"({self.name}) {fn.__name__} failed: {e}")
+            raise
+        finally:
+            run_time = time.time() - start
+            with lane.lock:
+                lane.stats["running"] -= 1
+                lane.stats["completed"] += 1
+                lane.stats["run_time_total"] += run_time
+                lane.stats["run_time_max"] = max(lane.stats["run_time_max"], run_time)
+            lane.slots.release()
+            self.publish_stats()
+
+    def get_stats(self):
+        """Returns a copy of the counters of each lane"""
+        return {
+            "start": self.starts.get_stats(),
+            "control": self.control.get_stats(),
+            "actions": self.actions.get_stats(),
+        }
+
+    def publish_stats(self):
+        if self.stats_pub:
+            self.stats_pub.publish(json.dumps(self.get_stats()))
+        return
+
+    def shutdown(self, wait=False):
+        """Stops accepting calls; running calls are left to finish"""
+        self.starts.executor.shutdown(wait=wait)
+        self.control.executor.shutdown(wait=wait)
+        self.actions.executor.shutdown(wait=wait)
+        return
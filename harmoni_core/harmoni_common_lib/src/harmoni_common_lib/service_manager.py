@@ -3,8 +3,10 @@
 # Importing the libraries
 import rospy
 import roslib
-from collections import deque, defaultdict
+from collections import defaultdict
 from harmoni_common_lib.action_client import HarmoniActionClient
+from harmoni_common_lib.result_queue import ResultQueue
+import threading
 import warnings
 
 
@@ -20,6 +22,15 @@ class HarmoniServiceManager(object):
 
     """
 
+    # Set to True in services whose request() always gives the same result for
+    # the same optional_data, so that results can be cached (see RequestCache)
+    deterministic_requests = False
+
+    # Set by HarmoniConcurrentServiceServer, which takes the result of each goal
+    # from the dict returned by request() or do(). The goals run at once, so the
+    # service keeps their state in locals instead of state and result_msg.
+    concurrent_goals = False
+
     def __init__(self, name):
         """The service setup will instantiate the publishers, subscribers,
         class variables and clients.
@@ -32,7 +43,83 @@ class HarmoniServiceManager(object):
         self.name = name
         self.service_clients = defaultdict(HarmoniActionClient)
         self.configured_services = []  # available services
-        self.client_results = defaultdict(deque)  # store state of the service
+        self.client_results = defaultdict(ResultQueue)  # store state of the service
+        self._completion_condition = threading.Condition()
+
+    @property
+    def state(self):
+        """State of the service (see harmoni_common_lib.constants.State)"""
+        return getattr(self, "_state", None)
+
+    @state.setter
+    def state(self, value):
+        changed = value != getattr(self, "_state", None)
+        self._state = value
+        if changed:
+            for listener in list(getattr(self, "_state_listeners", [])):
+                listener(self)
+
+    def add_state_listener(self, listener):
+        """Calls listener(service) each time the state of the service changes
+
+        Args:
+            listener (func): called from the thread which set the state, so it
+                should return quickly
+        """
+        if not hasattr(self, "_state_listeners"):
+            self._state_listeners = []
+        self._state_listeners.append(listener)
+        return
+
+    @property
+    def actuation_completed(self):
+        """True once the last do() has finished, successfully or not"""
+        return getattr(self, "_actuation_completed", False)
+
+    @actuation_completed.setter
+    def actuation_completed(self, value):
+        self._actuation_completed = value
+        if value:
+            self.notify_completion()
+
+    @property
+    def response_received(self):
+        """True once the last request() has finished, successfully or not"""
+        return getattr(self, "_response_received", False)
+
+    @response_received.setter
+    def response_received(self, value):
+        self._response_received = value
+        if value:
+            self.notify_completion()
+
+    def notify_completion(self):
+        """Wakes any server waiting on this service in wait_for_completion().
+
+        Called by the service server when do() or request() returns, and
+        when actuation_completed or response_received is set to True, but can
+        also be used to wake waiters for other reasons (e.g. a preemption).
+        """
+        condition = getattr(self, "_completion_condition", None)
+        if condition is None:
+            return
+        with condition:
+            condition.notify_all()
+        return
+
+    def wait_for_completion(self, predicate, timeout=None):
+        """Blocks until predicate() is true or the timeout expires
+
+        Args:
+            predicate (func): No-parameter function checked each time the service
+                signals through notify_completion().
+            timeout (float, optional): Max time to block (seconds). Defaults to None (no timeout).
+
+        Returns:
+            bool: the last value of predicate()
+        """
+        with self._completion_condition:
+            return self._completion_condition.wait_for(predicate, timeout)
 
     def test(self):
         """Tests the setup has successfully completed and the unit is ready to
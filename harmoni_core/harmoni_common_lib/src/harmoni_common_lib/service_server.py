@@ -4,8 +4,33 @@
 import rospy
 import roslib
 from harmoni_common_lib.constants import State, ActionType
-from harmoni_common_lib.action_server import HarmoniActionServer
-import threading
+from harmoni_common_msgs.msg import harmoniResult
+from harmoni_common_lib.action_server import (
+    HarmoniActionServer,
+    HarmoniConcurrentActionServer,
+)
+from harmoni_common_lib.feedback_scheduler import get_feedback_scheduler
+from harmoni_common_lib.service_executor import ServiceExecutor
+from harmoni_common_lib.metrics import get_metrics, EXECUTION
+import time
+
+
+def submit_control(executor, fn):
+    """Submits a stop or pause without waiting for room on the control lane
+
+    The calls come from the action server callbacks, which must not block
+    behind a stop or pause that does not return.
+
+    Returns:
+        Future: the future of the call, None if it was rejected
+    """
+    future = executor.submit_control(fn, timeout=0)
+    if future is None:
+        rospy.logwarn(
+            f"(Server {executor.name}) {fn.__name__} rejected, the previous "
+            "stop or pause calls are still pending"
+        )
+    return future
 
 
 class HarmoniServiceServer(HarmoniActionServer, object):
@@ -21,17 +46,24 @@ class HarmoniServiceServer(HarmoniActionServer, object):
     get_preemption_status
     """
 
-    def __init__(self, name, service_manager, premption_rate=10):
+    def __init__(
+        self, name, service_manager, premption_rate=10, max_workers=2, max_pending=2
+    ):
         """Initialize the service and test that the service manager has been set up
 
         Args:
             name (str): name of the service, used for logging/debugging
             service_manager (HarmoniServiceManager): provides the functionality of the service
+            max_workers (int, optional): do/request calls run at once, including
+                those still running after their goal was preempted. Defaults to 2.
+            max_pending (int, optional): do/request calls waiting for a worker
+                before goals are rejected. Defaults to 2.
         """
 
         self.name = name
         self.service_manager = service_manager
         self.premption_rate = premption_rate
+        self.executor = ServiceExecutor(name, max_workers, max_pending)
 
         if self.service_manager.test():
             rospy.loginfo(f"Service Server {self.name} has been successfully set up")
@@ -40,28 +72,23 @@ class HarmoniServiceServer(HarmoniActionServer, object):
         super().__init__(
             name, self._execute_goal_received_callback, self._preempt_callback
         )
+        # Make sure no goal is left waiting on the service once the node goes down
+        rospy.on_shutdown(self._wake_service_waiters)
 
         return
 
     def start_sending_feedback(self, rate=0.2):
-        """Provides feedback at a constant rate on the status of the server
-            FIXME: this is a blocking function, so it probably needs to be threaded.
+        """Provides feedback on the status of the server each time it changes
+
+        The feedback is published from the process-wide FeedbackScheduler, so this
+        returns immediately and can be called for each server of a node.
+
         Args:
-            rate (float, optional): Rate feedback on state is sent (hz). Defaults to .2.
+            rate (float, optional): Rate feedback on state is repeated while it does
+                not change (hz), None to only send changes. Defaults to .2.
         """
-        r = rospy.Rate(rate)
-        rospy.loginfo(f"{self.name} Service Server sending feedback at {rate}/sec")
-        while not rospy.is_shutdown():
-            if self.service_manager.state != State.FAILED:
-                if self.service_manager.state != State.INIT:
-                    self.publish_feedback(self.service_manager.state)
-                r.sleep()
-            else:
-                # if state has failed the node should be restarted
-                """FIXME: in general it is unlikely we can detect an unrecoverable
-                node failure in low level code (e.g. segfault), so the failure state should be more of
-                an indicator of wrong input or opportunity to retry than of node restart"""
-                break
+        rospy.loginfo(f"{self.name} Service Server sending feedback on state changes")
+        get_feedback_scheduler().add_server(self, 1.0 / rate if rate else None)
         return
 
     def send_result(self, do_action, message):
@@ -69,6 +96,13 @@ class HarmoniServiceServer(HarmoniActionServer, object):
         self._result.do_action = do_action
         self._result.message = message
         self.set_succeeded(self._result)
+        if self.goal_accepted_time:
+            get_metrics().record(
+                self.name,
+                self.action_goal,
+                EXECUTION,
+                time.time() - self.goal_accepted_time,
+            )
         rospy.loginfo(
             f"(Server) sending result {do_action} to actiontype {self.action_goal}"
         )
@@ -86,7 +120,83 @@ class HarmoniServiceServer(HarmoniActionServer, object):
         """Used to signal a cancel/pause to the currently running service so
         that a new goal can be received.
         """
-        self.service_manager.pause()
+        # The goal thread is woken even if the pause is rejected
+        submit_control(self.executor, self.service_manager.pause)
+        self._wake_service_waiters()
+
+    def _wake_service_waiters(self):
+        """Wakes the goal thread if it is blocked waiting on the service"""
+        if hasattr(self.service_manager, "notify_completion"):
+            self.service_manager.notify_completion()
+
+    def _signals_completion(self):
+        """Whether the goal thread can be woken by the service
+
+        The goal thread waits on the completion condition of
+        HarmoniServiceManager, notified when the do() or request() call
+        returns. Services which skip its __init__ have no condition, and are
+        polled.
+        """
+        return (
+            getattr(self.service_manager, "_completion_condition", None) is not None
+        )
+
+    def _wait_for_service(self, future, completed):
+        """Blocks until the do() or request() call completes, monitoring for preemption
+
+        For services built on HarmoniServiceManager, the goal thread is woken
+        once the call returns, so the result is sent as soon as it is known.
+        Services that do not signal (see _signals_completion()) are polled at
+        the premption_rate until the call returns or their completion flag is
+        set.
+
+        Args:
+            future (Future): the do() or request() call, on the executor
+            completed (func): No-parameter function that is true once a polled
+                service is done, e.g. its actuation_completed flag
+
+        Returns:
+            bool: True if the goal was preempted while waiting
+        """
+        preempted = False
+        if not self._signals_completion():
+            pr = rospy.Rate(self.premption_rate)
+            while not completed() and not future.done():
+                if self.get_preemption_status():
+                    preempted = True
+                pr.sleep()
+            return preempted
+
+        while not future.done() and not rospy.is_shutdown():
+            self.service_manager.wait_for_completion(
+                lambda: future.done()
+                or rospy.is_shutdown()
+                or (not preempted and self.is_preempt_requested())
+            )
+            if not preempted and self.get_preemption_status():
+                preempted = True
+        return preempted
+
+    def _get_response(self, future):
+        """Returns the state and the message of a do() or request() call
+
+        They are taken from the dict returned by the call, as in the
+        HarmoniConcurrentServiceServer. A call which is still running (a polled
+        service which set its flag, or a shutdown) or which returned no dict
+        is answered with the state and result_msg of the service.
+        """
+        state = self.service_manager.state
+        message = getattr(self.service_manager, "result_msg", "")
+        if future.done():
+            try:
+                response = future.result()
+            except Exception as e:
+                rospy.logerr(f"(Server {self.name}) The service failed: {e}")
+                return State.FAILED, ""
+            if isinstance(response, dict):
+                state = response.get("response", state)
+                message = response.get("message", message)
+        return state, message or ""
 
     def _execute_goal_received_callback(self, goal):
         """Turns action goals into calls to the service manager. Is passed to the
@@ -95,29 +205,21 @@ class HarmoniServiceServer(HarmoniActionServer, object):
         Args:
             goal (HarmoniAction):
         """
-        pr = rospy.Rate(self.premption_rate)
-
-        # Create a thread
-        # t = threading.Thread(target=self.handle_step, args=(optional_data))
+        # Calls to the service manager run on the executor: start and stop/pause
+        # in the order they were received, stop/pause even while a start blocks,
+        # do/request on a bounded pool of workers
 
         if goal.action_type == ActionType.ON:
             rospy.loginfo(f"(Server {self.name}) Received goal. Starting")
-            t = threading.Thread(target=self.service_manager.start)
-            t.start()
-
-            # self.service_manager.start()
+            self.executor.submit_start(self.service_manager.start)
 
         elif goal.action_type == ActionType.PAUSE:
             rospy.loginfo(f"(Server {self.name}) Received goal. Pausing")
-
-            t = threading.Thread(target=self.service_manager.pause)
-            t.start()
-            # self.service_manager.pause()
+            submit_control(self.executor, self.service_manager.pause)
 
         elif goal.action_type == ActionType.OFF:
             rospy.loginfo(f"(Server {self.name}) Received goal. Stopping")
-            t = threading.Thread(target=self.service_manager.stop)
-            t.start()
+            submit_control(self.executor, self.service_manager.stop)
             # self.service_manager.stop()
             # self.service_manager.reset_init()
             # TODO: implement reset init
@@ -131,31 +233,24 @@ class HarmoniServiceServer(HarmoniActionServer, object):
             self.service_manager.actuation_completed = False
             preempted = False
 
-            # self.service_manager.do(goal.optional_data)
-            t = threading.Thread(
-                target=self.service_manager.do, args=(goal.optional_data,)
-            )
-            t.start()
+            future = self.executor.submit(self.service_manager.do, goal.optional_data)
+            if future is None:
+                self.send_result(do_action=False, message="")
+                return
+            future.add_done_callback(lambda f: self._wake_service_waiters())
 
-            while not self.service_manager.actuation_completed:
-                if self.get_preemption_status():
-                    preempted = True
-                pr.sleep()
+            preempted = self._wait_for_service(
+                future, lambda: self.service_manager.actuation_completed
+            )
 
             # Once an action has completed or been preempted, we need to let
             # the client know
-            if not hasattr(self.service_manager, "result_msg"):
-                self.service_manager.result_msg = ""
+            state, message = self._get_response(future)
+            if preempted or state == State.FAILED:
+                self.send_result(do_action=False, message=message)
 
-            if preempted or self.service_manager.state == State.FAILED:
-                self.send_result(
-                    do_action=False, message=self.service_manager.result_msg
-                )
-
-            elif self.service_manager.state == State.SUCCESS:
-                self.send_result(
-                    do_action=True, message=self.service_manager.result_msg
-                )
+            elif state == State.SUCCESS:
+                self.send_result(do_action=True, message=message)
 
             # To make sure we are ready for the next action, when we have completed
             # the prior action we should reset the initialization
@@ -172,30 +267,140 @@ class HarmoniServiceServer(HarmoniActionServer, object):
             self.service_manager.response_received = False
             preempted = False
 
-            # self.service_manager.request(goal.optional_data)
-            t = threading.Thread(
-                target=self.service_manager.request, args=(goal.optional_data,)
+            future = self.executor.submit(
+                self.service_manager.request, goal.optional_data
             )
-            t.start()
-
-            while not self.service_manager.response_received:
-                if self.get_preemption_status():
-                    preempted = True
-                pr.sleep()
+            if future is None:
+                self.send_result(do_action=False, message="")
+                return
+            future.add_done_callback(lambda f: self._wake_service_waiters())
 
-            if not hasattr(self.service_manager, "result_msg"):
-                self.service_manager.result_msg = ""
+            preempted = self._wait_for_service(
+                future, lambda: self.service_manager.response_received
+            )
 
-            if preempted or self.service_manager.state == State.FAILED:
-                self.send_result(
-                    do_action=False, message=self.service_manager.result_msg
-                )
+            state, message = self._get_response(future)
+            if preempted or state == State.FAILED:
+                self.send_result(do_action=False, message=message)
 
-            elif self.service_manager.state == State.SUCCESS:
-                self.send_result(
-                    do_action=True, message=self.service_manager.result_msg
-                )
+            elif state == State.SUCCESS:
+                self.send_result(do_action=True, message=message)
 
             self.service_manager.reset_init()
 
         return
+
+
+class HarmoniConcurrentServiceServer(HarmoniConcurrentActionServer, object):
+    """
+    An opt-in service server for services whose request() and do() can be called
+    by several clients at once, such as stateless requests to a cloud service.
+
+    Goals are executed on a bounded pool of workers and each goal keeps its own
+    result, so several patterns can share one service without preempting each
+    other. The result of each goal is taken from the dict returned by the
+    service manager's request() or do() call rather than from the shared
+    result_msg attribute. Cancelling a goal only preempts that goal; its result
+    is dropped when the service returns.
+    """
+
+    def __init__(self, name, service_manager, max_workers=4, max_pending_goals=8):
+        """Initialize the service and test that the service manager has been set up
+
+        Args:
+            name (str): name of the service, used for logging/debugging
+            service_manager (HarmoniServiceManager): provides the functionality of the service
+            max_workers (int, optional): goals served at once. Defaults to 4.
+            max_pending_goals (int, optional): goals waiting for a worker before
+                new goals are rejected. Defaults to 8.
+        """
+        self.name = name
+        self.service_manager = service_manager
+        self.service_manager.concurrent_goals = True
+        # Goals already run on the pool of the action server, the executor
+        # orders the start and stop/pause calls
+        self.control_executor = ServiceExecutor(name, max_workers=1, max_pending=0)
+
+        if self.service_manager.test():
+            rospy.loginfo(f"Service Server {self.name} has been successfully set up")
+        else:
+            rospy.logwarn(f"Service Server {self.name} has not been started")
+        super().__init__(
+            name,
+            self._execute_goal_received_callback,
+            self._preempt_callback,
+            max_workers=max_workers,
+            max_pending_goals=max_pending_goals,
+        )
+        return
+
+    start_sending_feedback = HarmoniServiceServer.start_sending_feedback
+
+    def send_result(self, goal, do_action, message):
+        """Send the result of a single goal and set it to succeeded"""
+        result = harmoniResult(
+            action_type=goal.goal.action_type, do_action=do_action, message=message
+        )
+        goal.set_succeeded(result)
+        if goal.accepted_time:
+            get_metrics().record(
+                self.name,
+                goal.goal.action_type,
+                EXECUTION,
+                time.time() - goal.accepted_time,
+            )
+        rospy.loginfo(
+            f"(Server) sending result {do_action} to actiontype {goal.goal.action_type} for goal {goal.id}"
+        )
+        return
+
+    def _preempt_callback(self, goal):
+        """The goal has already been preempted by the server. Other goals are still
+        being served, so the service itself is not paused.
+        """
+        rospy.loginfo(f"(Server {self.name}) Goal {goal.id} preempted")
+
+    def _execute_goal_received_callback(self, goal):
+        """Turns a single action goal into a call to the service manager. Runs in
+        one of the server's worker threads.
+
+        Args:
+            goal (HarmoniGoal): the goal tracked by the concurrent action server
+        """
+        action_type = goal.goal.action_type
+        if action_type == ActionType.REQUEST:
+            rospy.loginfo(f"(Server {self.name}) Received goal {goal.id}. Requesting")
+            response = self.service_manager.request(goal.goal.optional_data)
+        elif action_type == ActionType.DO:
+            rospy.loginfo(f"(Server {self.name}) Received goal {goal.id}. Doing")
+            response = self.service_manager.do(goal.goal.optional_data)
+        else:
+            # Long running actions are shared by every client, so they are
+            # started as in the HarmoniServiceServer and the goal completes
+            # once they have been dispatched
+            rospy.loginfo(
+                f"(Server {self.name}) Received goal {goal.id}. {ActionType(action_type).name}"
+            )
+            if action_type == ActionType.ON:
+                self.control_executor.submit_start(self.service_manager.start)
+            elif action_type == ActionType.PAUSE:
+                submit_control(self.control_executor, self.service_manager.pause)
+            else:
+                submit_control(self.control_executor, self.service_manager.stop)
+            self.send_result(goal, do_action=True, message="")
+            return
+
+        if not goal.is_active():
+            rospy.loginfo(
+                f"(Server {self.name}) Dropping result of preempted goal {goal.id}"
+            )
+            return
+
+        if isinstance(response, dict):
+            state = response.get("response")
+            message = response.get("message") or ""
+        else:
+            state = self.service_manager.state
+            message = getattr(self.service_manager, "result_msg", "")
+        self.send_result(goal, do_action=state == State.SUCCESS, message=message)
+        return
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import rospy
+import socket
+import struct
+import sys
+import threading
+import time
+import uuid
+from multiprocessing.shared_memory import SharedMemory
+
+# Header: magic, slots, slot size, closed, sequence of the last chunk, token
+HEADER = struct.Struct("<4sIIIQ16s")
+HEADER_SIZE = 64
+CLOSED_OFFSET = 12
+LAST_SEQ_OFFSET = 16
+SLOT_HEADER = struct.Struct("<QI")  # sequence of the chunk, length
+SLOT_HEADER_SIZE = 16
+MAGIC = b"HAU1"
+SAMPLE_WIDTHS = {"int16": 2, "float32": 4}  # bytes of a sample of each format
+DEFAULT_POLL_INTERVAL = 0.005  # for a ring whose audio format is not advertised
+
+_created = set()  # names of the rings created by this process
+
+
+def _attach_segment(name):
+    """Opens a segment without the resource tracker unlinking it at exit
+
+    Before Python 3.13 attached segments are tracked as if they were created,
+    so a subscriber exiting would destroy the ring of the publisher.
+    """
+    if sys.version_info >= (3, 13):
+        return SharedMemory(name, track=False)
+    shm = SharedMemory(name)
+    if name not in _created:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class AudioRing(object):
+    """A ring buffer of audio chunks in shared memory, one writer and many readers
+
+    Chunks are numbered from 1. The writer puts chunk n in slot n % slots, and
+    readers follow the sequence at their own pace: a reader more than a ring
+    behind loses the chunks overwritten, which read() reports. Chunks are read
+    without a copy, as read-only views of the shared memory, which the writer
+    may overwrite once they are a ring old (see is_current()).
+    """
+
+    def __init__(self, shm, slots, slot_size, token, owner):
+        self.shm = shm
+        self.slots = slots
+        self.slot_size = slot_size
+        self.token = token
+        self.owner = owner
+        self.last_seq = 0  # last chunk written, for the writer
+        return
+
+    @classmethod
+    def create(cls, name, slot_size, slots=64):
+        """Creates a ring, replacing the ring left by a writer which died
+
+        Args:
+            name (str): name of the shared memory segment
+            slot_size (int): bytes of the largest chunk
+            slots (int, optional): chunks held. Defaults to 64.
+        """
+        size = HEADER_SIZE + slots * (SLOT_HEADER_SIZE + slot_size)
+        try:
+            shm = SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            stale = SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = SharedMemory(name, create=True, size=size)
+        _created.add(name)
+        token = uuid.uuid4().hex[:16]
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_size, 0, 0, token.encode())
+        return cls(shm, slots, slot_size, token, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """Attaches to the ring of a writer
+
+        Raises:
+            FileNotFoundError: if there is no ring of that name
+            ValueError: if the segment is not a ring
+        """
+        shm = _attach_segment(name)
+        magic, slots, slot_size, _, _, token = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC:
+            shm.close()
+            raise ValueError(f"{name} is not an audio ring")
+        return cls(shm, slots, slot_size, token.decode(), owner=False)
+
+    @property
+    def closed(self):
+        return bool(HEADER.unpack_from(self.shm.buf, 0)[3])
+
+    def get_last_seq(self):
+        """Returns the sequence number of the last chunk written"""
+        return struct.unpack_from("<Q", self.shm.buf, LAST_SEQ_OFFSET)[0]
+
+    def _slot_offset(self, seq):
+        return HEADER_SIZE + (seq % self.slots) * (SLOT_HEADER_SIZE + self.slot_size)
+
+    def write(self, data):
+        """Writes a chunk to the next slot
+
+        Raises:
+            ValueError: if the chunk is larger than a slot
+
+        Returns:
+            int: the sequence number of the chunk
+        """
+        length = len(data)
+        if length > self.slot_size:
+            raise ValueError(f"Chunk of {length} bytes, slots hold {self.slot_size}")
+        seq = self.last_seq + 1
+        offset = self._slot_offset(seq)
+        # The slot is invalid while it is written, for the readers of its old chunk
+        SLOT_HEADER.pack_into(self.shm.buf, offset, 0, 0)
+        start = offset + SLOT_HEADER_SIZE
+        self.shm.buf[start : start + length] = data
+        SLOT_HEADER.pack_into(self.shm.buf, offset, seq, length)
+        struct.pack_into("<Q", self.shm.buf, LAST_SEQ_OFFSET, seq)
+        self.last_seq = seq
+        return seq
+
+    def read(self, seq):
+        """Reads a chunk without copying it
+
+        Args:
+            seq (int): sequence number of the chunk wanted
+
+        Returns:
+            tuple: the sequence number of the chunk read (later than seq if
+                seq was overwritten), a read-only memoryview of the chunk and
+                the number of chunks lost; (seq, None, 0) if it is not written yet
+        """
+        last_seq = self.get_last_seq()
+        if last_seq < seq:
+            return seq, None, 0
+        # The slot after the last one may be being written
+        oldest = max(1, last_seq - self.slots + 2)
+        lost = max(0, oldest - seq)
+        seq = max(seq, oldest)
+        offset = self._slot_offset(seq)
+        slot_seq, length = SLOT_HEADER.unpack_from(self.shm.buf, offset)
+        if slot_seq != seq:
+            return seq + 1, None, lost + 1
+        start = offset + SLOT_HEADER_SIZE
+        return seq, self.shm.buf[start : start + length].toreadonly(), lost
+
+    def is_current(self, seq):
+        """Returns whether a chunk read is still in its slot, i.e. its view is valid"""
+        return SLOT_HEADER.unpack_from(self.shm.buf, self._slot_offset(seq))[0] == seq
+
+    def close(self):
+        """Detaches from the ring; the writer also marks it closed and removes it"""
+        if self.owner:
+            struct.pack_into("<I", self.shm.buf, CLOSED_OFFSET, 1)
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views still held by the callbacks keep the mapping alive
+            pass
+        if self.owner:
+            self.shm.unlink()
+            _created.discard(self.shm.name)
+        return
+
+
+def set_audio_format(
+    topic, rate, channels=1, sample_format="int16", layout="interleaved"
+):
+    """Advertises the format of the audio of a topic, with the param <topic>/format"""
+    rospy.set_param(
+        topic + "/format",
+        {
+            "rate": rate,
+            "channels": channels,
+            "sample_format": sample_format,
+            "layout": layout,
+        },
+    )
+    return
+
+
+def check_audio_format(topic, rate, channels=1, sample_format="int16"):
+    """Warns when the audio of a topic is not in the format a subscriber expects
+
+    Returns:
+        bool: False if the format advertised differs, True if it is the same
+            or is not advertised
+    """
+    advertised = rospy.get_param(topic + "/format", None)
+    if not advertised:
+        return True
+    expected = {"rate": rate, "channels": channels, "sample_format": sample_format}
+    if all(advertised.get(key) == value for key, value in expected.items()):
+        return True
+    rospy.logwarn(
+        f"The audio of {topic} is {advertised}, expected {expected}: subscribe to "
+        "a topic of the normalized_outputs of the microphone instead"
+    )
+    return False
+
+
+def get_ring_name(topic):
+    """Returns the name of the shared memory segment of a topic"""
+    return "harmoni" + topic.replace("/", "_")
+
+
+class SharedAudioPublisher(object):
+    """Publishes audio on a topic and in a shared memory ring
+
+    Subscribers on the same host read the chunks from the ring (see
+    SharedAudioSubscriber), so a chunk is written once for all of them instead
+    of being serialized and sent to each one. The topic is still published
+    for the remote subscribers; rospy does not serialize a message published
+    to no subscriber.
+
+    The ring is advertised with the param <topic>/shared_memory.
+    """
+
+    def __init__(self, topic, msg_type, slot_size, slots=64, queue_size=1):
+        """
+        Args:
+            topic (str): topic of the audio
+            msg_type (class): message of the topic, with a data field (AudioData)
+            slot_size (int): bytes of the largest chunk
+            slots (int, optional): chunks held in the ring. Defaults to 64.
+            queue_size (int, optional): queue of the topic. Defaults to 1.
+        """
+        self.topic = topic
+        self.publisher = rospy.Publisher(topic, msg_type, queue_size=queue_size)
+        self.ring = AudioRing.create(get_ring_name(topic), slot_size, slots)
+        self.lock = threading.Lock()
+        rospy.set_param(
+            topic + "/shared_memory",
+            {
+                "name": get_ring_name(topic),
+                "host": socket.gethostname(),
+                "token": self.ring.token,
+            },
+        )
+        rospy.on_shutdown(self.close)
+        return
+
+    def publish(self, msg):
+        with self.lock:
+            if self.ring is not None:
+                self.ring.write(msg.data)
+        self.publisher.publish(msg)
+        return
+
+    def get_num_connections(self):
+        return self.publisher.get_num_connections()
+
+    def close(self):
+        """Removes the ring; the subscribers go back to the topic"""
+        with self.lock:
+            if self.ring is None:
+                return
+            self.ring.close()
+            self.ring = None
+        try:
+            rospy.delete_param(self.topic + "/shared_memory")
+        except Exception:
+            pass
+        return
+
+
+class SharedAudioSubscriber(object):
+    """Subscribes to audio from a shared memory ring, or from the topic
+
+    Takes the arguments of rospy.Subscriber. While the publisher of the topic
+    advertises a ring on this host (see SharedAudioPublisher), the chunks are
+    copied from it and called back on a thread of the subscriber. Otherwise
+    the topic is subscribed to. The ring is looked for again every reconnect
+    seconds, so the publisher may start after the subscriber, or restart.
+
+    The chunks are copied because the writer never waits for the readers: a
+    view of the ring may be overwritten while a callback uses it. A chunk is
+    called back only if its slot still holds it after the copy, so callbacks
+    only get whole chunks; the chunks overwritten are counted as lost. The
+    copy is one memcpy of a chunk, instead of the serialization and socket
+    transfer of the topic for each subscriber.
+
+    The callbacks are never run at once: while the subscriber switches from
+    the topic to the ring, the messages of the topic still in its queue are
+    dropped, and counted as lost too.
+    """
+
+    def __init__(
+        self,
+        topic,
+        msg_type,
+        callback,
+        callback_args=None,
+        queue_size=None,
+        shared_memory=True,
+        poll_interval=None,
+        reconnect=1.0,
+    ):
+        """
+        Args:
+            shared_memory (bool, optional): read from the ring when there is
+                one. Defaults to True.
+            poll_interval (float, optional): seconds between checks for a new
+                chunk in the ring. Defaults to half the duration of the largest
+                chunk, from the format of the topic (see set_audio_format).
+            reconnect (float, optional): seconds between checks for a new ring.
+                Defaults to 1.0.
+        """
+        self.topic = topic
+        self.msg_type = msg_type
+        self.callback = callback
+        self.callback_args = callback_args
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self.reconnect = reconnect
+        self.ring = None
+        self.subscriber = None
+        self.received = 0
+        self.lost = 0  # chunks overwritten before they were copied, or dropped
+        self.closed = threading.Event()
+        # Held while calling back, counting the chunks and switching to the ring
+        self.callback_lock = threading.Lock()
+        self._subscribe_topic()
+        if shared_memory:
+            threading.Thread(target=self._read_ring, daemon=True).start()
+        return
+
+    @property
+    def transport(self):
+        return "shared_memory" if self.ring else "topic"
+
+    def get_stats(self):
+        """Returns the transport and the chunks received and lost from the ring"""
+        return {
+            "transport": self.transport,
+            "received": self.received,
+            "lost": self.lost,
+        }
+
+    def _subscribe_topic(self):
+        if self.subscriber is None:
+            self.subscriber = rospy.Subscriber(
+                self.topic,
+                self.msg_type,
+                self._topic_callback,
+                queue_size=self.queue_size,
+            )
+        return
+
+    def _topic_callback(self, msg):
+        with self.callback_lock:
+            if self.ring is not None:
+                self.lost += 1  # queued before the switch to the ring
+                return
+            self._call_back(msg)
+        return
+
+    def _call_back(self, msg):
+        if self.callback_args is None:
+            self.callback(msg)
+        else:
+            self.callback(msg, self.callback_args)
+        return
+
+    def _attach(self):
+        """Attaches to the ring advertised on this host, if any"""
+        try:
+            advertised = rospy.get_param(self.topic + "/shared_memory")
+            if advertised["host"] != socket.gethostname():
+                return None
+            ring = AudioRing.attach(advertised["name"])
+        except (KeyError, FileNotFoundError, ValueError):
+            return None
+        if ring.token != advertised["token"] or ring.closed:
+            ring.close()
+            return None
+        return ring
+
+    def _get_poll_interval(self, ring):
+        """Returns the seconds between checks for a new chunk in a ring"""
+        if self.poll_interval:
+            return self.poll_interval
+        audio_format = rospy.get_param(self.topic + "/format", None)
+        try:
+            bytes_per_second = (
+                audio_format["rate"]
+                * audio_format["channels"]
+                * SAMPLE_WIDTHS[audio_format["sample_format"]]
+            )
+        except (TypeError, KeyError):
+            return DEFAULT_POLL_INTERVAL
+        return ring.slot_size / bytes_per_second / 2
+
+    def _is_advertised(self):
+        """Returns whether the ring attached is still the one advertised"""
+        try:
+            advertised = rospy.get_param(self.topic + "/shared_memory")
+        except KeyError:
+            return False
+        return advertised["token"] == self.ring.token and not self.ring.closed
+
+    def _detach(self):
+        """Goes back to the topic once the ring is no longer advertised
+
+        The topic is subscribed before the ring is dropped, so that the
+        subscriber reports the topic transport only once it receives from it.
+        The messages of the topic wait on the callback lock meanwhile.
+        """
+        with self.callback_lock:
+            if not self.closed.is_set():
+                self._subscribe_topic()
+            ring, self.ring = self.ring, None
+        ring.close()
+        return
+
+    def _read_ring(self):
+        while not self.closed.is_set() and not rospy.is_shutdown():
+            if self.ring is None:
+                ring = self._attach()
+                if ring is None:
+                    self.closed.wait(self.reconnect)
+                    continue
+                poll_interval = self._get_poll_interval(ring)
+                # Follow the ring from its next chunk, without the topic
+                with self.callback_lock:
+                    self.ring = ring
+                    seq = ring.get_last_seq() + 1
+                    self.subscriber.unregister()
+                    self.subscriber = None
+                last_check = time.time()
+            seq, data, lost = self.ring.read(seq)
+            if data is None:
+                if lost:
+                    with self.callback_lock:
+                        self.lost += lost
+                if time.time() - last_check > self.reconnect:
+                    last_check = time.time()
+                    if not self._is_advertised():
+                        self._detach()
+                        continue
+                self.closed.wait(poll_interval)
+                continue
+            chunk = bytes(data)
+            data.release()
+            # The chunk is whole if the writer did not overwrite it meanwhile
+            current = self.ring.is_current(seq)
+            with self.callback_lock:
+                self.lost += lost
+                if current:
+                    self._call_back(self.msg_type(data=chunk))
+                    self.received += 1
+                else:
+                    self.lost += 1
+            seq += 1
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+        return
+
+    def unregister(self):
+        self.closed.set()
+        if self.subscriber:
+            self.subscriber.unregister()
+            self.subscriber = None
+        return
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the tts result payload read by speaker, face, gesture and web.
+
+A synthetic utterance (16 bit audio with words, visemes and actions timed
+against it) is encoded as the tts result, and each encoding is compared on
+the bytes it puts on the wire and the time a consumer takes to parse it:
+
+- stringified dict: str() of a dict with the audio as a bytes repr, read with
+  ast.literal_eval, as the tts used to send
+- BehaviorData: the payload of harmoni_common_lib.behavior_payload
+
+Requires the harmoni_common_msgs messages to be built (no roscore is needed):
+
+    python3 benchmark_behavior_payload.py --seconds 5 --repeat 20
+"""
+
+import argparse
+import ast
+import os
+import statistics
+import time
+
+from harmoni_common_lib.behavior_payload import (
+    encode_behavior_payload,
+    parse_behavior_payload,
+)
+
+SAMPLE_RATE = 22050
+VISEMES = ["BILABIAL", "DENTAL_ALVEOLAR", "OPEN_FRONT_VOWEL", "MID_CENTRAL_VOWEL"]
+
+
+def make_utterance(seconds):
+    """Returns the audio and behaviors of a tts result lasting seconds"""
+    audio_data = os.urandom(int(seconds * SAMPLE_RATE) * 2)
+    behavior_data = []
+    for i in range(int(seconds / 0.3)):
+        behavior_data.append(
+            {"character": i * 0.006, "type": "word", "start": i * 0.3, "value": "word"}
+        )
+    for i in range(int(seconds / 0.08)):
+        behavior_data.append(
+            {"start": i * 0.08, "type": "viseme", "id": VISEMES[i % len(VISEMES)]}
+        )
+    behavior_data.append(
+        {"start": 0.31, "type": "action", "args": [], "id": "happy_face"}
+    )
+    behavior_data.sort(key=lambda b: b["start"])
+    return audio_data, behavior_data
+
+
+def legacy_encode(audio_data, behavior_data):
+    return str(
+        {
+            "audio_frame": SAMPLE_RATE,
+            "audio_data": audio_data,
+            "behavior_data": str(behavior_data),
+        }
+    )
+
+
+def legacy_parse(data):
+    data = ast.literal_eval(data)
+    data["behavior_data"] = ast.literal_eval(data["behavior_data"])
+    return data
+
+
+def measure(encode, parse, audio_data, behavior_data, repeat):
+    """Returns the wire size (bytes) and parse times (seconds) of an encoding"""
+    payload = encode(audio_data, behavior_data)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parsed = parse(payload)
+        times.append(time.perf_counter() - start)
+    assert parsed["audio_data"] == audio_data
+    assert len(parsed["behavior_data"]) == len(behavior_data)
+    return len(payload.encode("utf-8")), times
+
+
+def report(label, size, audio_size, times):
+    ms = [t * 1000 for t in times]
+    print(
+        f"{label:<18} {size:>10} bytes ({size / audio_size:4.2f}x audio)"
+        f"  parse mean {statistics.mean(ms):8.2f} ms  max {max(ms):8.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    audio_data, behavior_data = make_utterance(args.seconds)
+    print(
+        f"Utterance of {args.seconds} s: {len(audio_data)} bytes of audio,"
+        f" {len(behavior_data)} behaviors"
+    )
+    encodings = [
+        ("stringified dict", legacy_encode, legacy_parse),
+        (
+            "BehaviorData",
+            lambda audio, behaviors: encode_behavior_payload(
+                SAMPLE_RATE, audio, behaviors
+            ),
+            parse_behavior_payload,
+        ),
+    ]
+    for label, encode, parse in encodings:
+        size, times = measure(encode, parse, audio_data, behavior_data, args.repeat)
+        report(label, size, len(audio_data), times)
+
+
+if __name__ == "__main__":
+    main()
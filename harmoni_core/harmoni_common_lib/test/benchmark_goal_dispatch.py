@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark of goal-accept latency in the HarmoniActionServer.
+
+A client sends goals back-to-back, as SequentialPattern.do_steps does, and the
+time from send_goal() until the server's execute callback starts is measured.
+The execute loop is compared with the previous implementation, which waited on
+a 0.1 s condition timeout between goals.
+
+The benchmark runs against the in-process ROS stand-in, so no roscore is needed:
+
+    python3 benchmark_goal_dispatch.py --goals 50
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ros_stand_in
+
+ros_stand_in.install(log_level="ERROR")
+
+import rospy
+from harmoni_common_lib.action_client import HarmoniActionClient
+from harmoni_common_lib.action_server import HarmoniActionServer
+from harmoni_common_lib.constants import ActionType
+from harmoni_common_lib.metrics import nearest_rank
+
+
+class PollingActionServer(HarmoniActionServer):
+    """The execute loop as it was before goals were dispatched on notification"""
+
+    def executeLoop(self):
+        loop_duration = rospy.Duration.from_sec(0.1)
+
+        while not rospy.is_shutdown():
+            with self.terminate_mutex:
+                if self.need_to_terminate:
+                    break
+
+            if self.is_new_goal_available():
+                goal = self.accept_new_goal()
+                try:
+                    self.execute_callback(goal)
+                    if self.is_active():
+                        self.set_aborted(None, "No terminal state was set.")
+                except Exception as ex:
+                    traceback.print_exc()
+                    self.set_aborted(None, str(ex))
+
+            with self.execute_condition:
+                self.execute_condition.wait(loop_duration.to_sec())
+
+
+def measure(server_class, name, goals, work_after_result):
+    """Returns the goal-accept latencies (seconds) for a server class"""
+    sent = {}
+    latencies = []
+
+    def execute(goal):
+        latencies.append(time.time() - sent["time"])
+        server.set_succeeded()
+        # Servers keep working after the result is sent (e.g. reset_init)
+        time.sleep(work_after_result)
+
+    server = server_class(name, execute)
+    client = HarmoniActionClient(name)
+    client.setup_client(name, wait=True)
+
+    for _ in range(goals):
+        sent["time"] = time.time()
+        client.send_goal(action_goal=ActionType.DO, optional_data="", wait=True)
+    return latencies
+
+
+def report(label, latencies):
+    ms = sorted(latency * 1000 for latency in latencies)
+    print(
+        f"{label:<22} mean {statistics.mean(ms):7.2f} ms"
+        f"  p50 {nearest_rank(ms, 50):7.2f} ms  p95 {nearest_rank(ms, 95):7.2f} ms"
+        f"  max {ms[-1]:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--goals", type=int, default=50)
+    parser.add_argument(
+        "--work-after-result",
+        type=float,
+        default=0.002,
+        help="seconds the execute callback keeps running after sending the result",
+    )
+    args = parser.parse_args()
+
+    print(
+        f"Goal-accept latency over {args.goals} back-to-back goals"
+        " (nearest-rank percentiles)"
+    )
+    report(
+        "polling (0.1 s wait)",
+        measure(PollingActionServer, "polling", args.goals, args.work_after_result),
+    )
+    report(
+        "notification dispatch",
+        measure(HarmoniActionServer, "notified", args.goals, args.work_after_result),
+    )
+    rospy.signal_shutdown("benchmark done")
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+
+"""In-process stand-in for the parts of ROS used by harmoni_common_lib.
+
+Benchmarks and load tests use this module in place of a roscore. Topics and
+action goals are delivered by dispatcher threads inside the process (one per
+subscriber, action server and action client, as rospy does with its
+subscription threads), so the HARMONI servers, clients and service managers
+run unmodified but without a ROS master or network in the loop.
+
+rospkg finds the packages in the source tree. Call install() before importing
+anything from harmoni_common_lib. Tests run by pytest along with the rostests
+install it in setUpModule and call uninstall() in tearDownModule, so that the
+stand-in is only seen by their own module.
+"""
+
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+import types
+from collections import defaultdict
+
+######################################################
+# rospy
+######################################################
+
+
+class ROSInterruptException(Exception):
+    pass
+
+
+class Duration(object):
+    """Float based replacement for rospy.Duration and rospy.Time"""
+
+    def __init__(self, secs=0, nsecs=0):
+        self.secs = secs + nsecs * 1e-9
+
+    @classmethod
+    def from_sec(cls, secs):
+        return cls(secs)
+
+    @classmethod
+    def now(cls):
+        return cls(time.time())
+
+    def to_sec(self):
+        return self.secs
+
+    def __add__(self, other):
+        return Duration(self.secs + other.secs)
+
+    def __sub__(self, other):
+        return Duration(self.secs - other.secs)
+
+    def __lt__(self, other):
+        return self.secs < other.secs
+
+    def __le__(self, other):
+        return self.secs <= other.secs
+
+    def __gt__(self, other):
+        return self.secs > other.secs
+
+    def __ge__(self, other):
+        return self.secs >= other.secs
+
+    def __eq__(self, other):
+        return isinstance(other, Duration) and self.secs == other.secs
+
+    def __hash__(self):
+        return hash(self.secs)
+
+
+class Rate(object):
+    def __init__(self, hz):
+        self.period = 1.0 / hz
+        self.last = time.time()
+
+    def sleep(self):
+        remaining = self.last + self.period - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.last = time.time()
+
+
+class _Dispatcher(object):
+    """Delivers calls in order on a dedicated thread"""
+
+    def __init__(self, name):
+        self.calls = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, fnc, *args):
+        self.calls.put((fnc, args))
+
+    def _run(self):
+        while True:
+            fnc, args = self.calls.get()
+            try:
+                fnc(*args)
+            except Exception as e:
+                _log("ERROR", f"Exception in dispatched callback: {e}")
+
+
+_shutdown = threading.Event()
+_shutdown_hooks = []
+_params = {}
+_subscribers = defaultdict(list)
+_topics_lock = threading.Lock()
+_log_level = {"DEBUG": 0, "INFO": 1, "WARN": 2, "ERROR": 3}
+log_threshold = "WARN"
+
+
+def _log(level, msg, *args):
+    if _log_level[level] >= _log_level[log_threshold]:
+        if args:
+            msg = msg % args
+        print(f"[{level}] {msg}")
+
+
+def is_shutdown():
+    return _shutdown.is_set()
+
+
+def on_shutdown(hook):
+    _shutdown_hooks.append(hook)
+
+
+def signal_shutdown(reason=""):
+    _shutdown.set()
+    for hook in _shutdown_hooks:
+        hook()
+
+
+def init_node(name, *args, **kwargs):
+    return
+
+
+def get_param(name, default=KeyError):
+    if name in _params:
+        return _params[name]
+    if default is KeyError:
+        raise KeyError(name)
+    return default
+
+
+def set_param(name, value):
+    _params[name] = value
+
+
+def resolve_name(name):
+    return name
+
+
+def get_rostime():
+    return Duration(time.time())
+
+
+def sleep(duration):
+    if isinstance(duration, Duration):
+        duration = duration.to_sec()
+    time.sleep(duration)
+
+
+class Publisher(object):
+    def __init__(self, topic, msg_type, queue_size=None, **kwargs):
+        self.name = topic
+        self.msg_type = msg_type
+
+    def publish(self, *args, **kwargs):
+        if len(args) == 1 and not kwargs:
+            msg = args[0]
+        else:
+            msg = self.msg_type(*args, **kwargs)
+        with _topics_lock:
+            subscribers = list(_subscribers[self.name])
+        for sub in subscribers:
+            sub.dispatcher.put(sub.deliver, msg)
+
+    def get_num_connections(self):
+        with _topics_lock:
+            return len(_subscribers[self.name])
+
+    def unregister(self):
+        return
+
+
+class Subscriber(object):
+    def __init__(
+        self, topic, msg_type, callback=None, callback_args=None, queue_size=None
+    ):
+        self.name = topic
+        self.callback = callback
+        self.callback_args = callback_args
+        self.dispatcher = _Dispatcher(f"sub:{topic}")
+        with _topics_lock:
+            _subscribers[topic].append(self)
+
+    def deliver(self, msg):
+        if self.callback_args is None:
+            self.callback(msg)
+        else:
+            self.callback(msg, self.callback_args)
+
+    def unregister(self):
+        with _topics_lock:
+            if self in _subscribers[self.name]:
+                _subscribers[self.name].remove(self)
+
+
+######################################################
+# actionlib_msgs
+######################################################
+
+
+class GoalStatus(object):
+    PENDING = 0
+    ACTIVE = 1
+    PREEMPTED = 2
+    SUCCEEDED = 3
+    ABORTED = 4
+    REJECTED = 5
+    PREEMPTING = 6
+    RECALLING = 7
+    RECALLED = 8
+    LOST = 9
+
+    def __init__(self, status=PENDING, text=""):
+        self.status = status
+        self.text = text
+
+
+class CommState(object):
+    WAITING_FOR_GOAL_ACK = 0
+    PENDING = 1
+    ACTIVE = 2
+    WAITING_FOR_RESULT = 3
+    WAITING_FOR_CANCEL_ACK = 4
+    RECALLING = 5
+    PREEMPTING = 6
+    DONE = 7
+    LOST = 8
+
+
+def get_name_of_constant(C, n):
+    for k, v in C.__dict__.items():
+        if isinstance(v, int) and v == n:
+            return k
+    return "NO_SUCH_STATE_%d" % n
+
+
+CommState.to_string = classmethod(get_name_of_constant)
+
+_TERMINAL = [
+    GoalStatus.PREEMPTED,
+    GoalStatus.SUCCEEDED,
+    GoalStatus.ABORTED,
+    GoalStatus.REJECTED,
+    GoalStatus.RECALLED,
+]
+_COMM_STATE = {
+    GoalStatus.PENDING: CommState.PENDING,
+    GoalStatus.ACTIVE: CommState.ACTIVE,
+    GoalStatus.PREEMPTING: CommState.PREEMPTING,
+    GoalStatus.RECALLING: CommState.RECALLING,
+}
+
+
+######################################################
+# actionlib
+######################################################
+
+_action_servers = {}
+_servers_changed = threading.Condition()
+_goal_ids = itertools.count()
+
+
+class _GoalID(object):
+    def __init__(self):
+        self.id = f"stand_in_goal_{next(_goal_ids)}"
+        self.stamp = Duration(time.time())
+
+
+class ServerGoalHandle(object):
+    def __init__(self, goal=None, action_server=None, client_handle=None):
+        self.goal = goal
+        self.action_server = action_server
+        self.client_handle = client_handle
+        self.goal_id = client_handle.goal_id if client_handle else None
+        self.status = GoalStatus(GoalStatus.PENDING)
+
+    def get_goal(self):
+        return self.goal
+
+    def get_goal_id(self):
+        return self.goal_id
+
+    def get_goal_status(self):
+        return self.status
+
+    def _set_status(self, allowed, status, result=None, text=""):
+        with self.action_server.lock:
+            if self.status.status not in allowed:
+                _log("ERROR", f"Invalid transition from {self.status.status}")
+                return False
+            self.status = GoalStatus(status, text)
+            if status in _TERMINAL and result is None:
+                result = self.action_server.ActionResultType()
+            self.client_handle._update(self.status.status, result, Duration.now())
+            return True
+
+    def set_accepted(self, text=""):
+        self._set_status(
+            [GoalStatus.PENDING, GoalStatus.RECALLING], GoalStatus.ACTIVE, text=text
+        )
+
+    def set_canceled(self, result=None, text=""):
+        if self.status.status in [GoalStatus.PENDING, GoalStatus.RECALLING]:
+            self._set_status(
+                [GoalStatus.PENDING, GoalStatus.RECALLING],
+                GoalStatus.RECALLED,
+                result,
+                text,
+            )
+        else:
+            self._set_status(
+                [GoalStatus.ACTIVE, GoalStatus.PREEMPTING],
+                GoalStatus.PREEMPTED,
+                result,
+                text,
+            )
+
+    def set_rejected(self, result=None, text=""):
+        self._set_status(
+            [GoalStatus.PENDING, GoalStatus.RECALLING],
+            GoalStatus.REJECTED,
+            result,
+            text,
+        )
+
+    def set_aborted(self, result=None, text=""):
+        self._set_status(
+            [GoalStatus.ACTIVE, GoalStatus.PREEMPTING],
+            GoalStatus.ABORTED,
+            result,
+            text,
+        )
+
+    def set_succeeded(self, result=None, text=""):
+        self._set_status(
+            [GoalStatus.ACTIVE, GoalStatus.PREEMPTING],
+            GoalStatus.SUCCEEDED,
+            result,
+            text,
+        )
+
+    def set_cancel_requested(self):
+        with self.action_server.lock:
+            if self.status.status == GoalStatus.PENDING:
+                self.status = GoalStatus(GoalStatus.RECALLING)
+            elif self.status.status == GoalStatus.ACTIVE:
+                self.status = GoalStatus(GoalStatus.PREEMPTING)
+            else:
+                return False
+            self.client_handle._update(self.status.status)
+            return True
+
+    def publish_feedback(self, feedback):
+        self.client_handle._feedback(feedback)
+
+    def __eq__(self, other):
+        if not isinstance(other, ServerGoalHandle):
+            return False
+        return self.goal_id is other.goal_id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return id(self.goal_id)
+
+
+class ActionServer(object):
+    def __init__(self, ns, ActionSpec, goal_cb, cancel_cb=None, auto_start=True):
+        self.ns = ns
+        self.goal_callback = goal_cb
+        self.cancel_callback = cancel_cb
+        self.lock = threading.RLock()
+        self.dispatcher = _Dispatcher(f"action_server:{ns}")
+        self.ActionResultType = getattr(ActionSpec, "ActionResultType", object)
+        if auto_start:
+            self.start()
+
+    def start(self):
+        with _servers_changed:
+            _action_servers[self.ns] = self
+            _servers_changed.notify_all()
+
+    def _receive_goal(self, handle):
+        with self.lock:
+            self.goal_callback(handle)
+
+    def _receive_cancel(self, handle):
+        with self.lock:
+            if handle.set_cancel_requested() and self.cancel_callback:
+                self.cancel_callback(handle)
+
+
+class _ActionGoal(object):
+    def __init__(self, goal_id):
+        self.goal_id = goal_id
+
+
+class _Header(object):
+    def __init__(self, stamp):
+        self.stamp = stamp
+
+
+class _ActionResult(object):
+    def __init__(self, result, stamp):
+        self.header = _Header(stamp)
+        self.result = result
+
+
+class _CommStateMachine(object):
+    def __init__(self, goal_id):
+        self.action_goal = _ActionGoal(goal_id)
+        self.latest_result = None
+
+
+class ClientGoalHandle(object):
+    def __init__(self, client, goal, transition_cb, feedback_cb):
+        self.client = client
+        self.goal_id = _GoalID()
+        self.comm_state_machine = _CommStateMachine(self.goal_id)
+        self.transition_cb = transition_cb
+        self.feedback_cb = feedback_cb
+        self.comm_state = CommState.WAITING_FOR_GOAL_ACK
+        self.status = GoalStatus.PENDING
+        self.result = None
+        self.server_handle = None
+
+    def _update(self, status, result=None, stamp=None):
+        # Called by the server, delivered on the client's thread
+        self.client.dispatcher.put(self._deliver_update, status, result, stamp)
+
+    def _deliver_update(self, status, result, stamp):
+        if self.comm_state == CommState.DONE:
+            return
+        self.status = status
+        if status in _TERMINAL:
+            self.result = result
+            self.comm_state_machine.latest_result = _ActionResult(result, stamp)
+            self.comm_state = CommState.DONE
+        else:
+            self.comm_state = _COMM_STATE[status]
+        if self.transition_cb:
+            self.transition_cb(self)
+
+    def _feedback(self, feedback):
+        self.client.dispatcher.put(self._deliver_feedback, feedback)
+
+    def _deliver_feedback(self, feedback):
+        if self.feedback_cb and self.comm_state != CommState.DONE:
+            self.feedback_cb(self, feedback)
+
+    def get_comm_state(self):
+        return self.comm_state
+
+    def get_goal_status(self):
+        return self.status
+
+    def get_goal_status_text(self):
+        return ""
+
+    def get_result(self):
+        return self.result
+
+    def cancel(self):
+        server = self.server_handle.action_server
+        server.dispatcher.put(server._receive_cancel, self.server_handle)
+
+    def __eq__(self, other):
+        return isinstance(other, ClientGoalHandle) and self.goal_id is other.goal_id
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return id(self.goal_id)
+
+
+class ActionClient(object):
+    def __init__(self, ns, ActionSpec):
+        self.ns = ns
+        self.dispatcher = _Dispatcher(f"action_client:{ns}")
+        self.handles = []
+
+    def wait_for_server(self, timeout=Duration()):
+        deadline = None
+        if timeout.to_sec() > 0:
+            deadline = time.time() + timeout.to_sec()
+        with _servers_changed:
+            while self.ns not in _action_servers:
+                if deadline is None:
+                    _servers_changed.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    _servers_changed.wait(remaining)
+        return True
+
+    def send_goal(self, goal, transition_cb=None, feedback_cb=None):
+        self.wait_for_server()
+        server = _action_servers[self.ns]
+        handle = ClientGoalHandle(self, goal, transition_cb, feedback_cb)
+        handle.server_handle = ServerGoalHandle(goal, server, handle)
+        self.handles.append(handle)
+        server.dispatcher.put(server._receive_goal, handle.server_handle)
+        return handle
+
+    def cancel_all_goals(self):
+        for handle in self.handles:
+            if handle.comm_state != CommState.DONE:
+                handle.cancel()
+
+    def cancel_goals_at_and_before_time(self, t):
+        for handle in self.handles:
+            if handle.comm_state != CommState.DONE and handle.goal_id.stamp <= t:
+                handle.cancel()
+
+
+######################################################
+# messages
+######################################################
+
+
+class _Msg(object):
+    """Plain message with keyword fields and defaults"""
+
+    _fields = {}
+
+    def __init__(self, *args, **kwargs):
+        for field, default in self._fields.items():
+            setattr(self, field, default() if callable(default) else default)
+        for field, value in zip(self._fields, args):
+            setattr(self, field, value)
+        for field, value in kwargs.items():
+            setattr(self, field, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{f}={getattr(self, f)!r}" for f in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+def _msg(name, **fields):
+    return type(name, (_Msg,), {"_fields": fields})
+
+
+harmoniGoal = _msg("harmoniGoal", action_type=0, optional_data="", condition="")
+harmoniResult = _msg("harmoniResult", action_type=0, do_action=False, message="")
+harmoniFeedback = _msg("harmoniFeedback", action_type=0, state=0)
+harmoniAction = _msg("harmoniAction")
+harmoniAction.ActionResultType = harmoniResult
+String = _msg("String", data="")
+Bool = _msg("Bool", data=False)
+AudioData = _msg("AudioData", data=bytes)
+
+
+######################################################
+# rospkg
+######################################################
+
+
+class RosPack(object):
+    """Finds the packages in the source tree of HARMONI, instead of the ROS path"""
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+
+    def get_path(self, name):
+        for directory, subdirectories, files in os.walk(self.root):
+            if os.path.basename(directory) == name and "package.xml" in files:
+                return directory
+            subdirectories[:] = [d for d in subdirectories if not d.startswith(".")]
+        raise ResourceNotFound(name)
+
+
+class ResourceNotFound(Exception):
+    pass
+
+
+######################################################
+# install
+######################################################
+
+
+_saved_modules = None
+_saved_path = None
+_installed = []  # names of the stand-in modules
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    _installed.append(name)
+    return module
+
+
+def install(log_level="WARN"):
+    """Register the stand-in modules and put harmoni_common_lib on the path.
+
+    Args:
+        log_level (str, optional): lowest rospy log level printed. Defaults to "WARN".
+    """
+    global log_threshold, _saved_modules, _saved_path
+    log_threshold = log_level
+    if _saved_modules is None:
+        _saved_modules = dict(sys.modules)
+        _saved_path = list(sys.path)
+    logs = {
+        "logdebug": lambda msg, *a: _log("DEBUG", msg, *a),
+        "loginfo": lambda msg, *a: _log("INFO", msg, *a),
+        "logwarn": lambda msg, *a: _log("WARN", msg, *a),
+        "logerr": lambda msg, *a: _log("ERROR", msg, *a),
+    }
+    _module(
+        "rospy",
+        ROSInterruptException=ROSInterruptException,
+        ServiceException=Exception,
+        Duration=Duration,
+        Time=Duration,
+        Rate=Rate,
+        Publisher=Publisher,
+        Subscriber=Subscriber,
+        is_shutdown=is_shutdown,
+        on_shutdown=on_shutdown,
+        signal_shutdown=signal_shutdown,
+        init_node=init_node,
+        get_param=get_param,
+        set_param=set_param,
+        resolve_name=resolve_name,
+        get_rostime=get_rostime,
+        sleep=sleep,
+        INFO=1,
+        DEBUG=0,
+        **logs,
+    )
+    _module("roslib")
+    _module("actionlib", ActionServer=ActionServer, ActionClient=ActionClient)
+    _module("actionlib.server_goal_handle", ServerGoalHandle=ServerGoalHandle)
+    _module(
+        "actionlib.action_client",
+        ActionClient=ActionClient,
+        CommState=CommState,
+        get_name_of_constant=get_name_of_constant,
+    )
+    _module("actionlib_msgs")
+    _module("actionlib_msgs.msg", GoalStatus=GoalStatus)
+    _module("harmoni_common_msgs")
+    _module(
+        "harmoni_common_msgs.msg",
+        harmoniGoal=harmoniGoal,
+        harmoniResult=harmoniResult,
+        harmoniFeedback=harmoniFeedback,
+        harmoniAction=harmoniAction,
+    )
+    _module("std_msgs")
+    _module("std_msgs.msg", String=String, Bool=Bool)
+    _module("audio_common_msgs")
+    _module("audio_common_msgs.msg", AudioData=AudioData)
+    _module("rospkg", RosPack=RosPack, ResourceNotFound=ResourceNotFound)
+
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    if src not in sys.path:
+        sys.path.insert(0, src)
+    return
+
+
+def uninstall():
+    """Restore the modules and the path of before install()
+
+    The stand-in modules are removed, with the modules of HARMONI imported
+    since install() (e.g. harmoni_common_lib), which hold on to them.
+    """
+    global _saved_modules, _saved_path
+    if _saved_modules is None:
+        return
+    for name, module in list(sys.modules.items()):
+        if name in _saved_modules:
+            continue
+        path = getattr(module, "__file__", None)
+        in_tree = path and os.path.abspath(path).startswith(RosPack.root + os.sep)
+        if name in _installed or in_tree:
+            del sys.modules[name]
+            # Nor can they be found as attributes of the packages kept
+            parent, _, child = name.rpartition(".")
+            if getattr(_saved_modules.get(parent), child, None) is module:
+                delattr(_saved_modules[parent], child)
+    sys.modules.update(_saved_modules)
+    sys.path[:] = _saved_path
+    _saved_modules = None
+    _saved_path = None
+    del _installed[:]
+    return
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+import unittest
+import uuid
+from concurrent import futures
+
+PKG = "harmoni_common_lib"
+
+# The goals go through the in-process ROS stand-in, without a roscore
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ros_stand_in
+
+
+def setUpModule():
+    global rospy, HarmoniActionClient, _goal_timeouts
+    global HarmoniActionServer, HarmoniConcurrentActionServer, harmoniResult
+    global ActionType
+    ros_stand_in.install(log_level="ERROR")
+
+    import rospy
+    from harmoni_common_lib.action_client import HarmoniActionClient, _goal_timeouts
+    from harmoni_common_lib.action_server import (
+        HarmoniActionServer,
+        HarmoniConcurrentActionServer,
+    )
+    from harmoni_common_lib.constants import ActionType
+    from harmoni_common_msgs.msg import harmoniResult
+
+
+def tearDownModule():
+    ros_stand_in.uninstall()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSendGoalAsync(unittest.TestCase):
+    """send_goal_async() against an action server of the process"""
+
+    def setUp(self):
+        self.name = f"async_test_{uuid.uuid4().hex[:8]}"
+        self.preempted = threading.Event()
+
+    def tearDown(self):
+        # Ends the execute loop of the server, as when it is deleted
+        if isinstance(self.server, HarmoniActionServer):
+            with self.server.terminate_mutex:
+                self.server.need_to_terminate = True
+            self.server.wake_execute_loop()
+        else:
+            self.server.executor.shutdown(wait=False)
+
+    def _serve(self, execute, concurrent=False):
+        if concurrent:
+            self.server = HarmoniConcurrentActionServer(self.name, execute)
+        else:
+            self.server = HarmoniActionServer(self.name, execute)
+        self.client = HarmoniActionClient(self.name)
+        self.client.setup_client(self.name, wait=True)
+
+    def _wait_for_preempt(self, goal):
+        """Runs a goal until it is preempted"""
+        while not goal.is_preempt_requested() and not rospy.is_shutdown():
+            time.sleep(0.01)
+        self.preempted.set()
+        if goal.is_active():
+            goal.set_preempted()
+
+    def test_future_resolves_with_the_result(self):
+        def execute(goal):
+            self.server.set_succeeded(
+                harmoniResult(do_action=True, message=goal.optional_data.upper())
+            )
+
+        self._serve(execute)
+        future = self.client.send_goal_async(ActionType.REQUEST, optional_data="hi")
+        self.assertEqual(
+            future.result(timeout=5),
+            {"service": self.name, "do_action": True, "message": "HI"},
+        )
+
+    def test_time_out_cancels_the_goal(self):
+        self._serve(lambda goal: self._wait_for_preempt(self.server))
+        future = self.client.send_goal_async(ActionType.DO, time_out=0.2)
+        with self.assertRaises(futures.TimeoutError):
+            future.result(timeout=5)
+        self.assertTrue(self.preempted.wait(5))
+
+    def test_cancelling_the_future_cancels_the_goal(self):
+        running = threading.Event()
+
+        def execute(goal):
+            running.set()
+            self._wait_for_preempt(self.server)
+
+        self._serve(execute)
+        future = self.client.send_goal_async(ActionType.DO)
+        self.assertTrue(running.wait(5))
+        self.assertTrue(future.cancel())
+        self.assertTrue(self.preempted.wait(5))
+        # The timeout of the goal is dropped with its future
+        self.assertTrue(wait_for(lambda: len(_goal_timeouts) == 0))
+
+    def test_overlapping_goals_each_resolve(self):
+        def execute(goal):
+            delay, message = goal.goal.optional_data.split(":")
+            time.sleep(float(delay))
+            goal.set_succeeded(harmoniResult(do_action=True, message=message))
+
+        self._serve(execute, concurrent=True)
+        older = self.client.send_goal_async(ActionType.REQUEST, optional_data="0.3:a")
+        newer = self.client.send_goal_async(ActionType.REQUEST, optional_data="0.1:b")
+        # The client tracks the newer goal, and the older one resolves after it
+        self.assertEqual(newer.result(timeout=5)["message"], "b")
+        self.assertFalse(older.done())
+        self.assertEqual(older.result(timeout=5)["message"], "a")
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_action_client", TestSendGoalAsync)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import unittest
+from unittest import mock
+
+PKG = "harmoni_common_lib"
+
+try:
+    from harmoni_common_lib.behavior_payload import (
+        encode_behavior_payload,
+        parse_behavior_payload,
+    )
+
+    HAVE_MSGS = True
+except ImportError:
+    # The Behavior messages of harmoni_common_msgs are not generated
+    HAVE_MSGS = False
+
+BEHAVIORS = [
+    {"character": 0.0, "type": "word", "start": 0.05, "value": "Hello"},
+    {"start": 0.06, "type": "viseme", "id": "VELAR_GLOTTAL"},
+    {"start": 0.35, "type": "action", "args": [], "id": "happy_face"},
+    {"start": 0.36, "type": "web", "args": ["container_1", "img.png"], "id": "web"},
+]
+
+
+@unittest.skipUnless(HAVE_MSGS, "harmoni_common_msgs is not generated")
+class TestBehaviorPayload(unittest.TestCase):
+    def test_round_trip(self):
+        audio_data = bytes(range(256)) * 4
+        payload = encode_behavior_payload(22050, audio_data, BEHAVIORS)
+        self.assertIsInstance(payload, str)
+        data = parse_behavior_payload(payload)
+        self.assertEqual(data["audio_frame"], 22050)
+        self.assertEqual(bytes(data["audio_data"]), audio_data)
+        self.assertEqual(data["behavior_data"], BEHAVIORS)
+
+    def test_stringified_dict_is_still_read(self):
+        data = {
+            "audio_frame": 22050,
+            "audio_data": b"\x00\x01",
+            "behavior_data": str(BEHAVIORS),
+        }
+        parsed = parse_behavior_payload(str(data))
+        self.assertEqual(parsed["audio_data"], b"\x00\x01")
+        self.assertEqual(parsed["behavior_data"], BEHAVIORS)
+
+    def test_tts_result_read_as_literal_is_warned_once(self):
+        data = str({"audio_frame": 22050, "audio_data": b"", "behavior_data": "[]"})
+        with mock.patch("harmoni_common_lib.behavior_payload.rospy.logwarn") as warn:
+            parse_behavior_payload(data, "speaker_warned")
+            parse_behavior_payload(data, "speaker_warned")
+            parse_behavior_payload(str(BEHAVIORS), "face_warned")
+            self.assertEqual(warn.call_count, 1)
+            parse_behavior_payload(data, "face_warned")
+            self.assertEqual(warn.call_count, 2)
+
+    def test_behaviors_from_pattern_script(self):
+        behaviors = [
+            {"start": 1, "type": "action", "id": "target", "point": [1, 5, 10]}
+        ]
+        self.assertEqual(parse_behavior_payload(str(behaviors)), behaviors)
+        # Already parsed data is passed through
+        self.assertIs(parse_behavior_payload(behaviors), behaviors)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_behavior_payload", TestBehaviorPayload)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+import unittest
+import uuid
+
+PKG = "harmoni_common_lib"
+
+# The goals go through the in-process ROS stand-in, without a roscore
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ros_stand_in
+
+
+def setUpModule():
+    global GoalStatus, HarmoniActionClient, HarmoniConcurrentActionServer
+    global ActionType, harmoniResult
+    ros_stand_in.install(log_level="ERROR")
+
+    from actionlib_msgs.msg import GoalStatus
+    from harmoni_common_lib.action_client import HarmoniActionClient
+    from harmoni_common_lib.action_server import HarmoniConcurrentActionServer
+    from harmoni_common_lib.constants import ActionType
+    from harmoni_common_msgs.msg import harmoniResult
+
+
+def tearDownModule():
+    ros_stand_in.uninstall()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestConcurrentActionServer(unittest.TestCase):
+    def setUp(self):
+        self.name = f"concurrent_test_{uuid.uuid4().hex[:8]}"
+        self.release = threading.Event()
+        self.running = set()
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.release.set()
+        self.server.executor.shutdown(wait=False)
+
+    def _serve(self, max_workers, max_pending_goals):
+        self.server = HarmoniConcurrentActionServer(
+            self.name,
+            self._execute,
+            max_workers=max_workers,
+            max_pending_goals=max_pending_goals,
+        )
+        self.client = HarmoniActionClient(self.name)
+        self.client.setup_client(self.name, wait=True)
+
+    def _execute(self, goal):
+        """Runs a goal until it is released or preempted"""
+        data = goal.goal.optional_data
+        with self.lock:
+            self.running.add(data)
+        while not self.release.is_set() and not goal.is_preempt_requested():
+            time.sleep(0.01)
+        with self.lock:
+            self.running.discard(data)
+        if goal.is_active():
+            goal.set_succeeded(harmoniResult(do_action=True, message=data))
+
+    def _send(self, data):
+        return self.client.send_goal_async(ActionType.REQUEST, optional_data=data)
+
+    def test_goals_beyond_the_queue_are_rejected(self):
+        self._serve(max_workers=1, max_pending_goals=1)
+        running = self._send("running")
+        self.assertTrue(wait_for(lambda: "running" in self.running))
+        queued = self._send("queued")
+        self.assertTrue(wait_for(lambda: len(self.server.goals) == 2))
+        rejected = self._send("rejected")
+        self.assertFalse(rejected.result(timeout=5)["do_action"])
+        self.assertEqual(
+            self.client.goal_handler.get_goal_status(), GoalStatus.REJECTED
+        )
+        self.assertFalse(running.done() or queued.done())
+
+        self.release.set()
+        self.assertEqual(running.result(timeout=5)["message"], "running")
+        self.assertEqual(queued.result(timeout=5)["message"], "queued")
+        self.assertTrue(wait_for(lambda: not self.server.goals))
+
+    def test_cancel_preempts_only_its_goal(self):
+        self._serve(max_workers=2, max_pending_goals=0)
+        first = self._send("first")
+        second = self._send("second")
+        self.assertTrue(wait_for(lambda: self.running == {"first", "second"}))
+        self.assertTrue(first.cancel())
+        self.assertTrue(wait_for(lambda: self.running == {"second"}))
+        self.assertFalse(second.done())
+
+        self.release.set()
+        self.assertEqual(second.result(timeout=5)["message"], "second")
+
+    def test_deleting_the_server_shuts_its_workers_down(self):
+        self._serve(max_workers=1, max_pending_goals=1)
+        self.server.__del__()
+        with self.assertRaises(RuntimeError):
+            self.server.executor.submit(self._execute, None)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_concurrent_action_server", TestConcurrentActionServer)
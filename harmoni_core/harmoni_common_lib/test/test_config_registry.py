@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+import unittest, os, tempfile
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.config_registry import ConfigRegistry
+
+CONFIG = """
+harmoni:
+  tts: ["default"]
+  face_detect: ["default"]
+hardware:
+  face: ["default", "second"]
+  speaker: ["default"]
+"""
+
+
+class TestConfigRegistry(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".yaml")
+        with os.fdopen(fd, "w") as file:
+            file.write(CONFIG)
+        self.registry = ConfigRegistry(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_indices(self):
+        self.assertEqual(self.registry.get_repos(), ["harmoni", "hardware"])
+        self.assertEqual(self.registry.get_repo("speaker"), "hardware")
+        self.assertEqual(self.registry.get_ids("face"), ["default", "second"])
+        self.assertEqual(
+            self.registry.get_repo_services("harmoni"),
+            (["harmoni_tts", "harmoni_face_detect"], ["tts", "face_detect"]),
+        )
+        self.assertEqual(
+            self.registry.get_service_ids("face_detect"), ["face_detect_default"]
+        )
+        self.assertEqual(self.registry.get_service_ids("missing"), [])
+
+    def test_resources_are_expanded(self):
+        self.assertEqual(
+            self.registry.get_service_ids("face")[:3],
+            ["face_eyes_default", "face_mouth_default", "face_nose_default"],
+        )
+        self.assertEqual(
+            self.registry.get_service_ids("face", resources=False),
+            ["face_default", "face_second"],
+        )
+        services = self.registry.get_configured_services()
+        self.assertIn("face_mouth_second", services)
+        self.assertIn("tts_default", services)
+        self.assertNotIn("face_default", services)
+
+    def test_service_child(self):
+        self.assertEqual(
+            self.registry.get_service_child("face_mouth_second"), ("face", "second")
+        )
+        self.assertEqual(
+            self.registry.get_service_child("face_detect_default"),
+            ("face_detect", "default"),
+        )
+        self.assertEqual(
+            self.registry.get_service_child("face_default"), ("face", "default")
+        )
+        self.assertIsNone(self.registry.get_service_child("missing_default"))
+
+    def test_reloaded_when_file_changes(self):
+        with open(self.path, "a") as file:
+            file.write("  microphone: ['default']\n")
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        self.assertEqual(self.registry.get_repo("microphone"), "hardware")
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_config_registry", TestConfigRegistry)
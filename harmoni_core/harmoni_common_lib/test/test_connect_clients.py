@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import time
+import unittest
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.action_client import connect_clients
+
+
+class FakeClient(object):
+    """Client whose server takes connect_time seconds to come up"""
+
+    def __init__(self, connect_time):
+        self.connect_time = connect_time
+
+    def wait_for_server(self, timeout):
+        timeout = timeout.to_sec()
+        if timeout and timeout < self.connect_time:
+            time.sleep(timeout)
+            return False
+        time.sleep(self.connect_time)
+        return True
+
+
+class TestConnectClients(unittest.TestCase):
+    def test_servers_are_waited_for_in_parallel(self):
+        clients = {name: FakeClient(0.1) for name in ["tts", "speaker", "face", "bot"]}
+        start = time.time()
+        timings = connect_clients(clients)
+        self.assertLess(time.time() - start, 0.3)
+        self.assertEqual(set(timings), set(clients))
+        for timing in timings.values():
+            self.assertGreaterEqual(timing, 0.1)
+
+    def test_deadline(self):
+        clients = {"tts": FakeClient(0.05), "bot": FakeClient(5)}
+        start = time.time()
+        timings = connect_clients(clients, timeout=0.2)
+        self.assertLess(time.time() - start, 1)
+        self.assertIsNotNone(timings["tts"])
+        self.assertIsNone(timings["bot"])
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_connect_clients", TestConnectClients)
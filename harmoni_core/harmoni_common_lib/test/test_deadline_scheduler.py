@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+
+import threading
+import unittest
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.action_client import _DeadlineScheduler
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def test_callback_runs_at_deadline(self):
+        scheduler = _DeadlineScheduler()
+        called = threading.Event()
+        scheduler.schedule(0.05, called.set)
+        self.assertTrue(called.wait(1))
+        self.assertEqual(len(scheduler), 0)
+
+    def test_cancelled_entries_are_removed(self):
+        scheduler = _DeadlineScheduler()
+        called = []
+        entries = [scheduler.schedule(60, lambda: called.append(i)) for i in range(10)]
+        for entry in entries:
+            scheduler.cancel(entry)
+        self.assertEqual(len(scheduler), 0)
+        self.assertEqual(len(scheduler.deadlines), 0)
+        # A callback already cancelled or called is left alone
+        scheduler.cancel(entries[0])
+        self.assertEqual(scheduler.cancelled, 0)
+        self.assertEqual(called, [])
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_deadline_scheduler", TestDeadlineScheduler)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import unittest, time
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.constants import State
+from harmoni_common_lib.feedback_scheduler import FeedbackScheduler
+from harmoni_common_lib.service_manager import HarmoniServiceManager
+
+
+class RecordingServer(object):
+    """Stands in for a service server, recording the feedback it publishes"""
+
+    def __init__(self, name):
+        self.name = name
+        self.service_manager = HarmoniServiceManager(name)
+        self.service_manager.state = State.INIT
+        self.feedback = []
+
+    def publish_feedback(self, state):
+        self.feedback.append(state)
+
+    def wait_for_feedback(self, count, timeout=1.0):
+        end = time.time() + timeout
+        while len(self.feedback) < count and time.time() < end:
+            time.sleep(0.005)
+        return self.feedback
+
+
+class TestFeedbackScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = FeedbackScheduler()
+
+    def test_state_changes_are_published(self):
+        server = RecordingServer("speaker_test")
+        self.scheduler.add_server(server)
+        for state in [State.START, State.REQUEST, State.SUCCESS]:
+            server.service_manager.state = state
+            server.wait_for_feedback(len(server.feedback) + 1)
+        self.assertEqual(server.feedback, [State.START, State.REQUEST, State.SUCCESS])
+
+    def test_all_servers_of_a_node_publish(self):
+        servers = [RecordingServer(f"face_{r}_test") for r in ["eyes", "mouth", "nose"]]
+        for server in servers:
+            self.scheduler.add_server(server, heartbeat=1)
+        for server in servers:
+            server.service_manager.state = State.REQUEST
+        for server in servers:
+            self.assertEqual(server.wait_for_feedback(1), [State.REQUEST])
+
+    def test_heartbeat_repeats_the_state(self):
+        server = RecordingServer("tts_test")
+        server.service_manager.state = State.SUCCESS
+        self.scheduler.add_server(server, heartbeat=0.02)
+        self.assertEqual(server.wait_for_feedback(3)[:3], [State.SUCCESS] * 3)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_feedback_scheduler", TestFeedbackScheduler)
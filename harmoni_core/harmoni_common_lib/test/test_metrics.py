@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import unittest
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.constants import ActionType
+from harmoni_common_lib.metrics import GoalMetrics, Histogram, EXECUTION, nearest_rank
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for value in [0.0005] * 90 + [0.1] * 10:
+            histogram.record(value)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean(), 0.01045)
+        self.assertEqual(histogram.percentile(50), 0.001)
+        self.assertEqual(histogram.percentile(95), 0.128)
+        self.assertEqual(histogram.max, 0.1)
+
+    def test_values_beyond_the_last_bucket(self):
+        histogram = Histogram()
+        histogram.record(1000.0)
+        self.assertEqual(histogram.percentile(99), 1000.0)
+
+    def test_nearest_rank(self):
+        self.assertEqual(nearest_rank([0.2, 0.4], 50), 0.2)
+        self.assertEqual(nearest_rank([0.2, 0.4], 51), 0.4)
+        ordered = list(range(1, 101))
+        self.assertEqual(nearest_rank(ordered, 99), 99)
+        self.assertEqual(nearest_rank(ordered[:50], 99), 50)
+        self.assertEqual(nearest_rank(ordered, 0), 1)
+
+    def test_goals_are_recorded_per_service_and_action(self):
+        metrics = GoalMetrics(publish_period=None)
+        metrics.record("tts_default", ActionType.REQUEST, EXECUTION, 0.5)
+        metrics.record("tts_default", ActionType.REQUEST, EXECUTION, 1.5)
+        metrics.record("speaker_default", ActionType.DO, EXECUTION, 2.0)
+        histogram = metrics.get_histogram("tts_default", ActionType.REQUEST, EXECUTION)
+        self.assertEqual((histogram.count, histogram.mean()), (2, 1.0))
+        summary = [s for s in metrics.snapshot() if s["service"] == "speaker_default"]
+        self.assertEqual(summary[0]["action_type"], "DO")
+        self.assertEqual(summary[0]["count"], 1)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_metrics", TestMetrics)
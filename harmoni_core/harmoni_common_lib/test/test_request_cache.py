@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import unittest, time
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.constants import State
+from harmoni_common_lib.request_cache import RequestCache
+from harmoni_common_lib.service_manager import HarmoniServiceManager
+
+
+class CountingService(HarmoniServiceManager):
+    deterministic_requests = True
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.calls = 0
+
+    def request(self, data):
+        self.calls += 1
+        self.state = State.SUCCESS
+        self.result_msg = data.upper()
+        self.response_received = True
+        return {"response": self.state, "message": self.result_msg}
+
+
+class TestRequestCache(unittest.TestCase):
+    def setUp(self):
+        self.service = CountingService("tts_test")
+
+    def test_repeated_request_is_cached(self):
+        cache = RequestCache("tts_test", max_size=2, publish_stats=False)
+        self.assertTrue(cache.attach(self.service))
+        first = self.service.request("hello")
+        second = self.service.request("hello")
+        self.assertEqual(first, second)
+        self.assertEqual(self.service.calls, 1)
+        self.assertTrue(self.service.response_received)
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = RequestCache("tts_test", max_size=2, publish_stats=False)
+        cache.attach(self.service)
+        for data in ["a", "b", "a", "c", "a", "b"]:
+            self.service.request(data)
+        # "b" was evicted by "c", "a" was kept since it was used more recently
+        self.assertEqual(self.service.calls, 4)
+        self.assertEqual(cache.get_stats()["evictions"], 2)
+
+    def test_expired_result_is_requested_again(self):
+        cache = RequestCache("tts_test", ttl=0.01, publish_stats=False)
+        cache.attach(self.service)
+        self.service.request("hello")
+        time.sleep(0.02)
+        self.service.request("hello")
+        self.assertEqual(self.service.calls, 2)
+        self.assertEqual(cache.get_stats()["expired"], 1)
+
+    def test_non_deterministic_service_is_not_cached(self):
+        self.service.deterministic_requests = False
+        cache = RequestCache("bot_test", publish_stats=False)
+        self.assertFalse(cache.attach(self.service))
+        self.service.request("hello")
+        self.service.request("hello")
+        self.assertEqual(self.service.calls, 2)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_request_cache", TestRequestCache)
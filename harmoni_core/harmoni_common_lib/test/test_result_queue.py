@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import unittest
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.result_queue import ResultQueue
+
+
+class TestResultQueue(unittest.TestCase):
+    def test_waiter_is_woken_by_put(self):
+        results = ResultQueue()
+        since = time.time()
+        timer = threading.Timer(0.05, results.put, args=("hello",))
+        timer.start()
+        result = results.get_new(since, timeout=5)
+        self.assertEqual(result["data"], "hello")
+        # Woken when the result came, not on a polling period
+        self.assertLess(result["time"] - since, 0.5)
+        self.assertLess(time.time() - result["time"], 0.1)
+
+    def test_old_results_are_dropped(self):
+        results = ResultQueue()
+        results.put("old", timestamp=1.0)
+        results.put("older_call", timestamp=2.0)
+        results.put("new", timestamp=3.0)
+        self.assertEqual(results.get_new(2.5, timeout=0)["data"], "new")
+        self.assertEqual(len(results), 0)
+        results.put("kept", timestamp=1.0)
+        self.assertEqual(results.pop()["data"], "kept")
+        self.assertIsNone(results.pop())
+
+    def test_timeout_and_close(self):
+        results = ResultQueue()
+        start = time.time()
+        self.assertIsNone(results.get_new(start, timeout=0.05))
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        stopped = threading.Event()
+        threading.Timer(0.05, lambda: (stopped.set(), results.wake())).start()
+        self.assertIsNone(results.get_new(time.time(), stop=stopped.is_set))
+        threading.Timer(0.05, results.close).start()
+        self.assertIsNone(results.get_new(time.time()))
+
+    def test_bounded_queue_counts_dropped_and_expired(self):
+        results = ResultQueue(maxlen=3, max_age=10)
+        now = time.time()
+        results.put("expired", timestamp=now - 20)
+        for i in range(4):
+            results.put(f"utterance {i}", timestamp=now + i)
+        self.assertEqual(results.get_stats(), {"size": 3, "dropped": 1, "expired": 1})
+        self.assertEqual(results.pop()["data"], "utterance 1")
+
+    def test_queries(self):
+        results = ResultQueue()
+        for i in range(4):
+            results.put(f"utterance {i}", timestamp=float(i))
+        self.assertEqual(results.latest_after(2.0)["data"], "utterance 3")
+        self.assertIsNone(results.latest_after(4.0))
+        self.assertEqual(
+            [item["data"] for item in results.all_since(2.0)],
+            ["utterance 2", "utterance 3"],
+        )
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(results.drain()), 4)
+        self.assertEqual(len(results), 0)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_result_queue", TestResultQueue)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import unittest, threading, time
+
+PKG = "harmoni_common_lib"
+
+from harmoni_common_lib.constants import State
+from harmoni_common_lib.service_executor import ServiceExecutor
+from harmoni_common_lib.service_server import submit_control
+from harmoni_common_lib.service_manager import HarmoniServiceManager
+
+
+class BlockingService(HarmoniServiceManager):
+    """Service whose start() runs until it is stopped, as a camera does"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.running = threading.Event()
+
+    def start(self):
+        self.state = State.START
+        self.running.set()
+        while self.state == State.START:
+            time.sleep(0.01)
+
+    def pause(self):
+        self.state = State.PAUSE
+
+    def stop(self):
+        self.state = State.SUCCESS
+
+
+class TestServiceExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = ServiceExecutor(
+            "executor_test", max_workers=1, max_pending=1, publish_stats=False
+        )
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_stop_runs_while_start_blocks(self):
+        service = BlockingService("blocking_test")
+        start = self.executor.submit_start(service.start)
+        self.assertTrue(service.running.wait(1))
+        self.executor.submit_control(service.pause).result(timeout=1)
+        self.executor.submit_control(service.stop).result(timeout=1)
+        start.result(timeout=1)
+        self.assertEqual(service.state, State.SUCCESS)
+        self.assertEqual(self.executor.get_stats()["start"]["cancelled"], 0)
+
+    def test_stop_cancels_starts_not_begun(self):
+        calls = []
+        release = threading.Event()
+        self.executor.submit_start(release.wait, 1)
+        skipped = self.executor.submit_start(lambda: calls.append("start"))
+        self.executor.submit_control(lambda: calls.append("stop")).result(timeout=1)
+        # A start received after the stop runs once the stop is done
+        restarted = self.executor.submit_start(lambda: calls.append("restart"))
+        release.set()
+        self.assertIsNone(skipped.result(timeout=1))
+        restarted.result(timeout=1)
+        self.assertEqual(calls, ["stop", "restart"])
+        self.assertEqual(self.executor.get_stats()["start"]["cancelled"], 1)
+
+    def test_stuck_pause_does_not_block_the_next_cancel(self):
+        executor = ServiceExecutor(
+            "control_test", max_pending_control=1, publish_stats=False
+        )
+        release = threading.Event()
+        executor.submit_control(release.wait)
+        executor.submit_control(release.wait)
+        # A cancel of the goal while the pauses are stuck returns at once
+        start = time.time()
+        self.assertIsNone(submit_control(executor, release.wait))
+        self.assertLess(time.time() - start, 0.1)
+        self.assertEqual(executor.get_stats()["control"]["rejected"], 1)
+        release.set()
+        executor.shutdown()
+
+    def test_calls_are_rejected_when_full(self):
+        release = threading.Event()
+        running = self.executor.submit(release.wait)
+        pending = self.executor.submit(lambda: "pending")
+        self.assertIsNone(self.executor.submit(lambda: "rejected"))
+        stats = self.executor.get_stats()["actions"]
+        self.assertEqual((stats["running"], stats["queued"]), (1, 1))
+        self.assertEqual(stats["rejected"], 1)
+        release.set()
+        self.assertEqual(pending.result(timeout=1), "pending")
+        self.assertTrue(running.result(timeout=1))
+
+    def test_back_pressure_waits_for_room(self):
+        self.executor.submit(time.sleep, 0.02)
+        self.executor.submit(time.sleep, 0.02)
+        future = self.executor.submit(lambda: "done", timeout=1)
+        self.assertEqual(future.result(timeout=1), "done")
+        stats = self.executor.get_stats()["actions"]
+        self.assertEqual((stats["completed"], stats["rejected"]), (3, 0))
+        self.assertGreater(stats["run_time_max"], 0.01)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_service_executor", TestServiceExecutor)
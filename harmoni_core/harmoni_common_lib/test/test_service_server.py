@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+import unittest
+import uuid
+
+PKG = "harmoni_common_lib"
+
+# The goals go through the in-process ROS stand-in, without a roscore
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import ros_stand_in
+
+
+class SlowService(object):
+    """Service which sets its completion flag before it has its result
+
+    Mixed into a HarmoniServiceManager in setUpModule, once the stand-in is
+    installed.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.running = threading.Event()
+        self.release = threading.Event()
+        self.paused = threading.Event()
+        self.result_msg = "stale"
+        self.state = State.INIT
+
+    def do(self, data):
+        self.running.set()
+        self.actuation_completed = True
+        self.release.wait(5)
+        if self.paused.is_set():
+            return {"response": State.FAILED, "message": ""}
+        self.state = State.SUCCESS
+        self.result_msg = data.upper()
+        return {"response": self.state, "message": self.result_msg}
+
+    def pause(self):
+        self.paused.set()
+        self.release.set()
+
+
+class PolledService(object):
+    """Service which skips the __init__ of HarmoniServiceManager, so it does
+    not signal its completion, and answers with its flag before returning"""
+
+    def __init__(self, name):
+        self.name = name
+        self.release = threading.Event()
+        self.state = State.INIT
+        self.result_msg = ""
+
+    def do(self, data):
+        self.state = State.SUCCESS
+        self.result_msg = data.upper()
+        self.actuation_completed = True
+        self.release.wait(5)
+        return {"response": self.state}
+
+
+def setUpModule():
+    global State, ActionType, HarmoniActionClient, HarmoniServiceServer
+    global HarmoniSlowService, HarmoniPolledService
+    ros_stand_in.install(log_level="ERROR")
+
+    from harmoni_common_lib.action_client import HarmoniActionClient
+    from harmoni_common_lib.constants import ActionType, State
+    from harmoni_common_lib.service_manager import HarmoniServiceManager
+    from harmoni_common_lib.service_server import HarmoniServiceServer
+
+    class HarmoniSlowService(SlowService, HarmoniServiceManager):
+        pass
+
+    class HarmoniPolledService(PolledService, HarmoniServiceManager):
+        pass
+
+
+def tearDownModule():
+    ros_stand_in.uninstall()
+
+
+class TestServiceServer(unittest.TestCase):
+    def setUp(self):
+        self.name = f"service_server_test_{uuid.uuid4().hex[:8]}"
+        self.results = []
+        self.sent = threading.Event()
+
+    def tearDown(self):
+        self.service.release.set()
+        # Ends the execute loop of the server, as when it is deleted
+        with self.server.terminate_mutex:
+            self.server.need_to_terminate = True
+        self.server.wake_execute_loop()
+        self.server.executor.shutdown()
+
+    def _serve(self, service, premption_rate):
+        self.service = service
+        self.server = HarmoniServiceServer(
+            self.name, service, premption_rate=premption_rate
+        )
+        send_result = self.server.send_result
+
+        def record_result(do_action, message):
+            self.results.append((do_action, message, time.time()))
+            send_result(do_action, message)
+            self.sent.set()
+
+        self.server.send_result = record_result
+        self.client = HarmoniActionClient(self.name)
+        self.client.setup_client(self.name, wait=True)
+
+    def test_result_is_sent_once_the_call_returns(self):
+        # Polling at this rate would take up to 2 s to see the completion
+        self._serve(HarmoniSlowService(self.name), premption_rate=0.5)
+        future = self.client.send_goal_async(ActionType.DO, optional_data="hi")
+        self.assertTrue(self.service.running.wait(5))
+        # The flag set before the result does not get the stale result sent
+        time.sleep(0.2)
+        self.assertEqual(self.results, [])
+
+        released = time.time()
+        self.service.release.set()
+        self.assertEqual(future.result(timeout=5)["message"], "HI")
+        do_action, message, sent = self.results[0]
+        self.assertEqual((do_action, message), (True, "HI"))
+        self.assertLess(sent - released, 0.5)
+
+    def test_wait_is_woken_by_a_preemption(self):
+        self._serve(HarmoniSlowService(self.name), premption_rate=0.5)
+        future = self.client.send_goal_async(ActionType.DO, optional_data="hi")
+        self.assertTrue(self.service.running.wait(5))
+
+        preempted = time.time()
+        future.cancel()
+        # The server pauses the service, whose call returns at once
+        self.assertTrue(self.sent.wait(1))
+        self.assertTrue(self.service.paused.is_set())
+        do_action, _, sent = self.results[0]
+        self.assertFalse(do_action)
+        self.assertLess(sent - preempted, 0.5)
+
+    def test_service_which_does_not_signal_is_polled(self):
+        service = HarmoniPolledService(self.name)
+        self._serve(service, premption_rate=10)
+        self.assertFalse(self.server._signals_completion())
+        future = self.client.send_goal_async(ActionType.DO, optional_data="hi")
+        # The flag is polled, so the result is sent while the call still runs
+        self.assertEqual(future.result(timeout=5)["message"], "HI")
+        self.assertFalse(service.release.is_set())
+        self.assertEqual(self.results[0][:2], (True, "HI"))
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_service_server", TestServiceServer)
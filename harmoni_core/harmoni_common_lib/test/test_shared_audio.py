@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import time
+import unittest
+import uuid
+
+PKG = "harmoni_common_lib"
+
+import rospy
+from audio_common_msgs.msg import AudioData
+from harmoni_common_lib.shared_audio import (
+    AudioRing,
+    SharedAudioPublisher,
+    SharedAudioSubscriber,
+    set_audio_format,
+)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestSharedAudio(unittest.TestCase):
+    def setUp(self):
+        self.topic = f"/harmoni/sensing/microphone/test_{uuid.uuid4().hex[:8]}"
+
+    def test_ring_reads_without_copy_and_reports_overruns(self):
+        writer = AudioRing.create("harmoni_test_ring", slot_size=4, slots=4)
+        reader = AudioRing.attach("harmoni_test_ring")
+        self.assertEqual(reader.read(1), (1, None, 0))
+        writer.write(b"ab")
+        seq, view, lost = reader.read(1)
+        self.assertEqual((seq, bytes(view), lost), (1, b"ab", 0))
+        self.assertTrue(view.readonly)
+        for i in range(2, 8):
+            writer.write(bytes([i]))
+        # The writer overwrote the chunk held, and the reader is a ring behind
+        self.assertFalse(reader.is_current(1))
+        view.release()
+        seq, view, lost = reader.read(2)
+        self.assertEqual((seq, bytes(view), lost), (5, b"\x05", 3))
+        view.release()
+        with self.assertRaises(ValueError):
+            writer.write(b"too long")
+        reader.close()
+        writer.close()
+        self.assertTrue(reader.shm.buf is None)
+
+    def test_local_subscriber_reads_the_ring(self):
+        publisher = SharedAudioPublisher(self.topic, AudioData, slot_size=8)
+        received = []
+        subscriber = SharedAudioSubscriber(
+            self.topic, AudioData, lambda msg: received.append(bytes(msg.data))
+        )
+        self.assertTrue(wait_for(lambda: subscriber.transport == "shared_memory"))
+        for i in range(10):
+            publisher.publish(AudioData(data=bytes([i]) * 8))
+            time.sleep(0.01)
+        self.assertTrue(wait_for(lambda: len(received) == 10))
+        self.assertEqual(received[3], b"\x03" * 8)
+        self.assertEqual(subscriber.get_stats()["lost"], 0)
+        # A message of the topic queued before the switch is dropped
+        subscriber._topic_callback(AudioData(data=b"queued"))
+        self.assertEqual(len(received), 10)
+        self.assertEqual(subscriber.get_stats()["lost"], 1)
+
+        # Back to the topic once the publisher removed its ring
+        publisher.close()
+        self.assertTrue(wait_for(lambda: subscriber.transport == "topic"))
+        self.assertTrue(wait_for(lambda: publisher.get_num_connections() == 1))
+        publisher.publish(AudioData(data=b"remote"))
+        self.assertTrue(wait_for(lambda: received[-1] == b"remote"))
+        subscriber.unregister()
+
+    def test_ring_is_polled_every_half_chunk(self):
+        # Chunks of 20 ms of 16 kHz mono int16
+        publisher = SharedAudioPublisher(self.topic, AudioData, slot_size=640)
+        subscriber = SharedAudioSubscriber(
+            self.topic, AudioData, lambda msg: None, shared_memory=False
+        )
+        self.assertEqual(subscriber._get_poll_interval(publisher.ring), 0.005)
+        set_audio_format(self.topic, 16000)
+        self.assertAlmostEqual(subscriber._get_poll_interval(publisher.ring), 0.01)
+        subscriber.unregister()
+        publisher.close()
+
+    def test_subscriber_without_ring_uses_the_topic(self):
+        received = []
+        subscriber = SharedAudioSubscriber(
+            self.topic, AudioData, received.append, shared_memory=False
+        )
+        rospy.Publisher(self.topic, AudioData).publish(AudioData(data=b"chunk"))
+        self.assertTrue(wait_for(lambda: len(received) == 1))
+        self.assertEqual(subscriber.transport, "topic")
+        subscriber.unregister()
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_shared_audio", TestSharedAudio)
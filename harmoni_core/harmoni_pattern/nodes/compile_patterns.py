@@ -0,0 +1,9 @@
+#!/usr/bin/env python3
+
+# Compiles and lints pattern scripts, by default all of pattern_scripting/:
+#   rosrun harmoni_pattern compile_patterns.py [--no-config] [--no-cache] [paths]
+import sys
+from harmoni_pattern.pattern_compiler import main
+
+if __name__ == "__main__":
+    sys.exit(main())
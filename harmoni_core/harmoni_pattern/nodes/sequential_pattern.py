@@ -8,17 +8,41 @@ from harmoni_common_lib.constants import State
 from harmoni_common_lib.service_server import HarmoniServiceServer
 from harmoni_common_lib.service_manager import HarmoniServiceManager
 import harmoni_common_lib.helper_functions as hf
+from harmoni_common_lib.config_registry import get_registry
 
 # Specific Imports
 import rospkg
 import json
+import os
 import numpy as np
 from std_msgs.msg import String
-from harmoni_common_lib.action_client import HarmoniActionClient
-from harmoni_common_lib.constants import DetectorNameSpace, ActionType
-from collections import deque
-from time import time
+from harmoni_common_lib.action_client import HarmoniActionClient, connect_clients
+from harmoni_common_lib.result_queue import ResultQueue
+from harmoni_common_lib.constants import DetectorNameSpace, DialogueNameSpace
+from harmoni_common_lib.metrics import get_metrics
+from harmoni_pattern.pattern_compiler import (
+    PatternPlan,
+    compile_pattern,
+    get_cache_dir,
+    load_pattern,
+)
+from harmoni_pattern.pattern_graph import (
+    PatternGraph,
+    PatternStep,
+    compile_steps,
+    merge_results,
+    run_graph,
+)
+from harmoni_pattern.sessions import FairExecutor, remap_script
+from harmoni_pattern.streaming import StreamingPipeline, split_sentences
+from concurrent import futures
+from functools import partial
 import threading
+from time import time
+
+
+class PatternPaused(Exception):
+    """Raised by a step interrupted by a pause, to be run again on resume, or a stop"""
 
 
 class SequentialPattern(HarmoniServiceManager):
@@ -28,40 +52,144 @@ class SequentialPattern(HarmoniServiceManager):
     The steps provide directions for an action request to a node. Steps can consist
     of a list of steps which will be executed in parallel.
 
+    The steps of each set are compiled once into a graph (see PatternGraph):
+    each step starts as soon as the steps it follows are done and receives
+    their results, so the step after a parallel block gets the merged results
+    of the block.
+
+    A set with a 'stream_from' step id is streamed: the text returned by the
+    steps before that step (e.g. the reply of the bot) is split in sentences,
+    which go one by one through the steps from it (e.g. tts, then speaker and
+    face). Each step (or parallel block) handles its own sentence, so the
+    speaker says sentence k while the tts synthesizes sentence k+1.
+
     Set types include:
         'setup' which plays once at the start
         'sequence' which plays through once
-        'loop'  which continues indefinitely
+        'loop'  which continues indefinitely, or until it has run
+            'max_iterations' times or for 'duration' seconds if they are set
 
     Actions specify the service id (e.g. tts_default), and the following:
         'action_goal' the type of command to give to the service (e.g. DO, START, STOP, etc.)
         'resource_type' the type of server expected to provide the service
         'wait_for' the condition to wait for
         'trigger' the additional message to send to the service
+        'id' (optional) the name other steps use to refer to the step
+        'after' (optional) the ids of the steps to follow, instead of the prior step
 
     Results from services are stored in a single dictionary with the service
-    name as the key and the results in a list. Each result is tagged with the time received
-    and data recieved.
+    name as the key and the results in a ResultQueue. Each result is tagged with the time received
+    and data recieved. Steps waiting for a 'new' result are woken as soon as it
+    is received, or after the 'timeout' (seconds) of the step if it is set.
 
     Detections are gathered with individual callbacks to each detector's topic and stored with
-    the results.
+    the results. The queue of a detector keeps the last detection_buffer_size
+    detections of the last detection_max_age seconds; the detections dropped
+    or expired are counted (see get_detection_stats).
+
+    Several sessions of a pattern can run in one process (see
+    PatternSessionManager): the clients of the services they all use are
+    shared, and the result of each goal sent to a shared client is routed to
+    the session which sent it.
+
+    The pattern can be paused (see pause()) and resumed by start() where it
+    was paused, without setting up the sensors and detectors again. Its
+    position in the script, i.e. the set, the loop iteration, the seconds the
+    loop ran and the results of the steps already done in the set, is
+    checkpointed after each step. A loop with a 'duration' only runs for the
+    rest of it once resumed. If
+    it is written to disk (checkpoint_path), a pattern restarted after its node
+    was killed resumes from it too, and sets up its sensors and detectors
+    again. The checkpoint is removed when the pattern is stopped, ends or its
+    node shuts down.
 
     """
 
-    def __init__(self, name, script):
+    def __init__(
+        self,
+        name,
+        script,
+        connect_timeout=30,
+        detection_buffer_size=10,
+        detection_max_age=60,
+        shared_clients=None,
+        executor=None,
+        checkpoint_path=None,
+    ):
         super().__init__(name)
-        """Init the behavior pattern and setup the clients"""
-        self.script = script
+        """Init the behavior pattern and setup the clients
+
+        Args:
+            name (str): name of the pattern
+            script (PatternPlan or list): the compiled script (see load_pattern),
+                or the sets of the pattern script
+            connect_timeout (float, optional): seconds to wait at startup for the
+                services of the first sets, None to wait until they connect.
+                Defaults to 30.
+            detection_buffer_size (int, optional): detections kept per detector,
+                None for no limit. Defaults to 10.
+            detection_max_age (float, optional): seconds a detection is kept,
+                None for no limit. Defaults to 60.
+            shared_clients (dict, optional): service -> HarmoniActionClient
+                shared with other sessions, set up and connected by their
+                owner. Defaults to None.
+            executor (Executor, optional): runs the steps, e.g. the lane of the
+                session in a FairExecutor. Defaults to a pool of this pattern.
+            checkpoint_path (str, optional): json file the checkpoint is written
+                to and resumed from, None to keep it in memory only.
+                Defaults to None.
+        """
+        if not isinstance(script, PatternPlan):
+            script = compile_pattern(script, name)
+        self.plan = script
+        self.script = script.script
+        self.connect_timeout = connect_timeout
+        self.detection_buffer_size = detection_buffer_size
+        self.detection_max_age = detection_max_age
+        self.shared_clients = shared_clients or {}
+        self.pending_goals = set()  # futures of the goals sent to shared clients
+        self.startup_report = {}  # seconds each client took to connect
         self.end_pattern = False  # Variable for interupting the script
+        self.paused = False
         self.scripted_services = set()  # services used in this script
         self.script_set_index = 0
-
-        self.scripted_services = self._get_services(script)
+        self.loop_iteration = 0  # passes done by the loop of the current set
+        self.loop_elapsed = 0.0  # seconds the loop ran before it was resumed
+        self.loop_resumed = None  # time the loop was resumed, while it runs
+        self.step_results = {}  # step id -> result of the current pass
+        self.set_done = False  # whether the last set run was done or stopped
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_lock = threading.Lock()
+        self.keep_checkpoint = True  # False once stopped, until started again
+
+        self.scripted_services = set(self.plan.services)
+        self.graphs = [pattern_set.graph for pattern_set in self.plan.sets]
+        self.stream_queue_size = 1  # sentences waiting between streamed steps
+        self.step_executor = executor or futures.ThreadPoolExecutor(
+            max_workers=max([len(graph) for graph in self.graphs] + [1]),
+            thread_name_prefix=f"{name}_step",
+        )
         self._setup_clients()
-
-        if script[self.script_set_index]["set"] == "setup":
-            self.setup_services(script[self.script_set_index]["steps"])
+        rospy.on_shutdown(self._close_result_queues)
+        # A clean shutdown is not resumed from, only a node killed is
+        rospy.on_shutdown(self._clear_checkpoint)
+
+        checkpoint = self._load_checkpoint()
+        if checkpoint:
+            rospy.loginfo(f"Resuming {name} from its checkpoint: {checkpoint}")
+            self.script_set_index = checkpoint["set"]
+            self.loop_iteration = checkpoint["iteration"]
+            self.loop_elapsed = checkpoint.get("elapsed", 0.0)
+            self.step_results = checkpoint["results"]
+            # The sensors and detectors may have stopped with the previous run,
+            # so they are all set up again
+            for pattern_set in self.plan.sets[: self.script_set_index]:
+                if pattern_set.kind == "setup":
+                    self.setup_services(pattern_set.graph)
+        elif self.plan.sets[self.script_set_index].kind == "setup":
+            self.setup_services(self.graphs[self.script_set_index])
             self.script_set_index += 1
+            self._save_checkpoint()
 
         self.state = State.INIT
         return
@@ -71,6 +199,12 @@ class SequentialPattern(HarmoniServiceManager):
 
         Also checks that the service matches what has been specified in the
         decision configuration file.
+
+        The clients of the services used by the setup and the first set are
+        connected in parallel, for up to connect_timeout seconds. The others,
+        and those which did not connect in time, connect in the background, and
+        steps wait for their client to connect when they first use it. Shared
+        clients are connected by their owner.
         """
         list_repos = hf.get_all_repos()
         for repo in list_repos:
@@ -84,40 +218,83 @@ class SequentialPattern(HarmoniServiceManager):
             ), f"Scripted service: {service}, is not listed among configured services: {self.configured_services}"
 
         for client in self.scripted_services:
-            self.service_clients[client] = HarmoniActionClient(client)
-            self.client_results[client] = deque()
+            if client in self.shared_clients:
+                self.service_clients[client] = self.shared_clients[client]
+            else:
+                self.service_clients[client] = HarmoniActionClient(client)
+            if client in self.plan.detector_topics:
+                self.client_results[client] = ResultQueue(
+                    self.detection_buffer_size, self.detection_max_age
+                )
+            else:
+                self.client_results[client] = ResultQueue()
 
         rospy.loginfo("Clients created")
         rospy.loginfo(
             f"{self.name} Pattern requires these services: {self.scripted_services}"
         )
 
-        for name, client in self.service_clients.items():
-            client.setup_client(name, self._result_callback, self._feedback_callback)
+        own_clients = {
+            name: client
+            for name, client in self.service_clients.items()
+            if name not in self.shared_clients
+        }
+        for name, client in own_clients.items():
+            client.setup_client(
+                name, self._result_callback, self._feedback_callback, wait=False
+            )
+
+        first_services = self._get_first_services()
+        start = time()
+        self.startup_report = connect_clients(
+            {s: own_clients[s] for s in first_services if s in own_clients},
+            self.connect_timeout,
+        )
+        self._log_startup_report(time() - start)
+
+        later_clients = {
+            name: client for name, client in own_clients.items() if not client.connected
+        }
+        if later_clients:
+            rospy.loginfo(f"Connecting to {list(later_clients)} in the background")
+            threading.Thread(
+                target=connect_clients,
+                args=(later_clients,),
+                name=f"{self.name}_connect",
+                daemon=True,
+            ).start()
         rospy.loginfo("Behavior interface action clients have been set up!")
         return
 
-    def _get_services(self, script):
-        """Extract all the services used in a given script.
-
-        Args:
-            script (list of dicts): list of sets of actions that
-
-        Returns:
-            list: names of all the services
-        """
-        service_names = set()
-        for s in script:
-            steps = s["steps"]
-            for step in steps:
-
-                if isinstance(step, list):
-                    for parallel_step in step:
-                        service_names.add(next(iter(parallel_step)))
-
-                else:
-                    service_names.add(next(iter(step)))
-        return service_names
+    def _get_first_services(self):
+        """Returns the services of the setup sets and of the first other set"""
+        services = set()
+        for script_set, graph in zip(self.script, self.graphs):
+            services.update(graph.get_services())
+            if script_set["set"] != "setup":
+                break
+        return services
+
+    def _log_startup_report(self, duration):
+        """Logs how long each client took to connect, slowest first"""
+        timings = sorted(
+            self.startup_report.items(),
+            key=lambda item: float("inf") if item[1] is None else item[1],
+            reverse=True,
+        )
+        report = ", ".join(
+            f"{name}: {'not connected' if t is None else f'{t:.2f}s'}"
+            for name, t in timings
+        )
+        rospy.loginfo(f"{self.name} connected clients in {duration:.2f}s ({report})")
+        if timings and timings[0][1] is None:
+            rospy.logwarn(
+                f"{[n for n, t in timings if t is None]} did not connect in "
+                f"{self.connect_timeout}s, steps will wait for them"
+            )
+        elif timings:
+            rospy.loginfo(f"Startup was held up by {timings[0][0]}")
+        return
 
     def _result_callback(self, result):
         """ Recieve and store result with timestamp """
@@ -125,12 +302,49 @@ class SequentialPattern(HarmoniServiceManager):
         rospy.loginfo(
             f"The result callback message from {result['service']} was {len(result['message'])} long"
         )
-        self.client_results[result["service"]].append(
-            {"time": time(), "data": result["message"]}
-        )
+        self.client_results[result["service"]].put(result["message"])
         # TODO add handling of errors and continue=False
         return
 
+    def _shared_result_callback(self, future):
+        """Stores the result of a goal sent to a shared client"""
+        self.pending_goals.discard(future)
+        if future.cancelled():
+            return
+        if future.exception():
+            rospy.logwarn(f"{self.name} goal failed: {future.exception()}")
+            return
+        self._result_callback(future.result())
+        return
+
+    def _send_goal(self, service, action_type, optional_data, wait=False):
+        """Sends a goal to a service
+
+        The goals sent to a shared client get a future of their own, so their
+        result goes to this session even if another session sent a goal since.
+
+        Args:
+            service (str): Name of the service
+            action_type (int): ActionType of the goal
+            optional_data (str): data of the goal
+            wait (bool, optional): wait for the result. Defaults to False.
+        """
+        client = self.service_clients[service]
+        client.ensure_connected()
+        if service not in self.shared_clients:
+            client.send_goal(
+                action_goal=action_type, optional_data=optional_data, wait=wait
+            )
+            return
+        future = client.send_goal_async(
+            action_goal=action_type, optional_data=optional_data, time_out=None
+        )
+        self.pending_goals.add(future)
+        future.add_done_callback(self._shared_result_callback)
+        if wait:
+            futures.wait([future], timeout=60)
+        return
+
     def _feedback_callback(self, feedback):
         """ Feedback is currently just logged """
         rospy.logdebug("The feedback recieved is %s." % feedback)
@@ -142,48 +356,216 @@ class SequentialPattern(HarmoniServiceManager):
     def _detecting_callback(self, data, service_name):
         """Store data from detection to client_results dictionary"""
         data = data.data
-        self.client_results[service_name].append({"time": time(), "data": data})
+        self.client_results[service_name].put(data)
+        return
+
+    def get_detection_stats(self):
+        """Returns the detections held, dropped and expired of each detector"""
+        return {
+            service: self.client_results[service].get_stats()
+            for service in self.plan.detector_topics
+        }
+
+    def get_checkpoint(self):
+        """Returns the position of the pattern in its script
+
+        Returns:
+            dict: the pattern, the hash of its script file, the index of the
+                current set, the passes done by its loop, the seconds it ran and
+                the results of the steps done in the current pass
+        """
+        with self.checkpoint_lock:
+            return self._get_checkpoint()
+
+    def _get_checkpoint(self):
+        return {
+            "pattern": self.name,
+            "file_hash": self.plan.file_hash,
+            "set": self.script_set_index,
+            "iteration": self.loop_iteration,
+            "elapsed": self._get_loop_elapsed(),
+            "results": dict(self.step_results),
+        }
+
+    def _get_loop_elapsed(self):
+        """Returns the seconds the loop of the current set has run"""
+        if self.loop_resumed is None:
+            return self.loop_elapsed
+        return self.loop_elapsed + time() - self.loop_resumed
+
+    def _save_checkpoint(self):
+        """Writes the checkpoint to checkpoint_path, if it is set"""
+        if not self.checkpoint_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+            tmp_path = self.checkpoint_path + f".{os.getpid()}"
+            # Steps finishing at once write their checkpoints in turn, and
+            # steps finishing after a stop do not write it again
+            with self.checkpoint_lock:
+                if not self.keep_checkpoint:
+                    return
+                with open(tmp_path, "w") as write_file:
+                    json.dump(self._get_checkpoint(), write_file)
+                os.replace(tmp_path, self.checkpoint_path)
+        except (OSError, TypeError, ValueError) as e:
+            rospy.logwarn(f"Could not write the checkpoint of {self.name}: {e}")
+        return
+
+    def _load_checkpoint(self):
+        """Returns the checkpoint written by a previous run of this script
+
+        Returns:
+            dict: the checkpoint, None if there is none or if it is not one of
+                this version of the script
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        try:
+            with open(self.checkpoint_path) as read_file:
+                checkpoint = json.load(read_file)
+            valid = (
+                checkpoint["pattern"] == self.name
+                and checkpoint["file_hash"] == self.plan.file_hash
+                and 0 <= checkpoint["set"] < len(self.graphs)
+                and set(checkpoint["results"])
+                <= set(self.graphs[checkpoint["set"]].by_id)
+            )
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            rospy.logwarn(f"Could not read the checkpoint of {self.name}: {e}")
+            return None
+        if not valid:
+            rospy.logwarn(f"Ignoring the checkpoint of another script for {self.name}")
+            return None
+        return checkpoint
+
+    def _clear_checkpoint(self):
+        """Removes the checkpoint file, once the script is done or stopped"""
+        with self.checkpoint_lock:
+            self.keep_checkpoint = False
+            if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+                try:
+                    os.remove(self.checkpoint_path)
+                except OSError as e:
+                    rospy.logwarn(
+                        f"Could not remove the checkpoint of {self.name}: {e}"
+                    )
+        return
+
+    def _should_stop(self):
+        """Whether the steps left should not be started"""
+        return self.paused or self.end_pattern or rospy.is_shutdown()
+
+    def _close_result_queues(self):
+        """Wakes the steps waiting for results so they can end on shutdown"""
+        for results in self.client_results.values():
+            results.close()
         return
 
     def start(self):
-        """Iterate through steps of the script until reaching the end."""
+        """Iterate through steps of the script until reaching the end.
+
+        A paused pattern is resumed where it was paused.
+        """
+        if self.paused:
+            rospy.loginfo(f"Resuming {self.name}: {self.get_checkpoint()}")
+            self.paused = False
+        self.end_pattern = False
+        with self.checkpoint_lock:
+            self.keep_checkpoint = True
         self.state = State.START
         r = rospy.Rate(1)
-        while self.script_set_index < len(self.script) and not rospy.is_shutdown():
+        while self.script_set_index < len(self.script) and not self._should_stop():
             # If scripts were not setup in the init, they will be here
             rospy.loginfo("Running the following steps:")
             rospy.loginfo(self.script[self.script_set_index]["steps"])
-            if self.script[self.script_set_index]["set"] == "setup":
-                self.setup_services(self.script[self.script_set_index]["steps"])
-
-            elif self.script[self.script_set_index]["set"] == "sequence":
-                # self.count = -1
-                self.do_steps(self.script[self.script_set_index]["steps"])
+            pattern_set = self.plan.sets[self.script_set_index]
+            if pattern_set.kind == "setup":
+                self.setup_services(pattern_set.graph)
+                self.set_done = True
 
-            elif self.script[self.script_set_index]["set"] == "loop":
+            elif pattern_set.kind == "sequence":
                 # self.count = -1
-                self.do_steps(self.script[self.script_set_index]["steps"], looping=True)
+                self.do_steps(pattern_set.graph)
+
+            elif pattern_set.kind == "loop":
+                deadline = None
+                if pattern_set.duration:
+                    # A resumed loop runs for the rest of its duration
+                    deadline = time() + pattern_set.duration - self.loop_elapsed
+                max_iterations = pattern_set.max_iterations
+                if max_iterations and self.loop_iteration >= max_iterations:
+                    self.set_done = True  # paused after its last pass
+                else:
+                    with self.checkpoint_lock:
+                        self.loop_resumed = time()
+                    try:
+                        self.do_steps(
+                            pattern_set.graph,
+                            looping=True,
+                            max_iterations=max_iterations,
+                            deadline=deadline,
+                        )
+                    finally:
+                        with self.checkpoint_lock:
+                            self.loop_elapsed = self._get_loop_elapsed()
+                            self.loop_resumed = None
             elif self.end_pattern:
                 # for client in self.scripted_services:
                 #    self.stop(client)
                 break
-            self.script_set_index += 1
+            if not self.set_done:
+                break  # paused or shut down, the set is resumed from its checkpoint
+            with self.checkpoint_lock:
+                self.script_set_index += 1
+                self.loop_iteration = 0
+                self.loop_elapsed = 0.0
+                self.step_results = {}
+            self._save_checkpoint()
             r.sleep()
+        if self.paused:
+            self.state = State.PAUSE
+            self._save_checkpoint()  # with the time the loop ran until the pause
+            rospy.loginfo(f"{self.name} paused: {self.get_checkpoint()}")
+        elif self.script_set_index >= len(self.script):
+            self._clear_checkpoint()
         return
 
     def stop(self):
-        """Stop the Pattern Player """
+        """Stop the Pattern Player
+
+        No step is started after the stop, and the steps waiting for a detection
+        stop waiting, so that start() returns.
+        """
+        self.end_pattern = True
+        self._clear_checkpoint()
+        for results in self.client_results.values():
+            results.wake()
         try:
-            for _, client in self.service_clients.items():
-                client.cancel_goal()
+            for name, client in self.service_clients.items():
+                if name not in self.shared_clients:
+                    client.cancel_goal()
+            # Only the goals of this session are cancelled on shared clients
+            for future in list(self.pending_goals):
+                future.cancel()
             self.state = State.SUCCESS
         except Exception as E:
             self.state = State.FAILED
         return
 
     def pause(self):
-        """Pause the Behavior Pattern """
-        # TODO: implement a pause
+        """Pause the Behavior Pattern
+
+        No step is started after the pause. The goals already sent to services
+        are done and their results are kept, while the steps waiting for a
+        detection are interrupted and wait again once resumed. start() resumes
+        the pattern from its checkpoint.
+        """
+        rospy.loginfo(f"Pausing {self.name}")
+        self.paused = True
+        self.state = State.PAUSE
+        for results in self.client_results.values():
+            results.wake()
         return
 
     def setup_services(self, setup_steps):
@@ -193,138 +575,220 @@ class SequentialPattern(HarmoniServiceManager):
         is created for detectors.
 
         Args:
-            setup_steps (list of dicts): call to each sensor/detector to set up.
+            setup_steps (PatternGraph or list of dicts): call to each sensor/detector to set up.
         """
-        for d in setup_steps:
-            for service, details in d.items():
-
-                assert details["resource_type"] in [
-                    "sensor",
-                    "detector",
-                ], "Can only set up sensors or detectors"
-
-                # Send request for each sensor service to set themselves up
-                self.service_clients[service].send_goal(
-                    action_goal=ActionType[details["action_goal"]].value,
-                    optional_data="Setup",
-                    wait=details["wait_for"],
-                )
-
-                if details["resource_type"] == "detector":
-                    # Split off last part of node name to get the topic (e.g. stt_default -> stt)
-                    service_list = service.split("_")
-                    service_id = "_".join(service_list[0:-1])
-
-                    topic = f"/harmoni/detecting/{service_id}/{service_list[-1]}"
-
-                    rospy.loginfo(f"subscribing to topic: {topic}")
+        if not isinstance(setup_steps, PatternGraph):
+            setup_steps = compile_steps(setup_steps)
 
-                    rospy.Subscriber(
-                        topic,
-                        String,
-                        self._detecting_callback,
-                        callback_args=service,
-                        queue_size=1,
-                    )
+        for step in setup_steps.steps:
+            service = step.service
+            assert step.resource_type in [
+                "sensor",
+                "detector",
+            ], "Can only set up sensors or detectors"
+
+            # Send request for each sensor service to set themselves up
+            self._send_goal(
+                service, step.action_type, "Setup", wait=step.details["wait_for"]
+            )
+
+            if step.resource_type == "detector":
+                rospy.loginfo(f"subscribing to topic: {step.topic}")
+
+                rospy.Subscriber(
+                    step.topic,
+                    String,
+                    self._detecting_callback,
+                    callback_args=service,
+                    queue_size=1,
+                )
 
         return
 
-    def do_steps(self, sequence, looping=False):
+    def do_steps(self, sequence, looping=False, max_iterations=None, deadline=None):
         """Directs the services to do each of the steps scripted in the sequence
 
-        Args:
-            sequence (list of dicts): Each dict specifies a call to a service
-            looping (bool, optional): If true will loop the sequence indefinitely. Defaults to False.
-        """
-
-        passthrough_result = None
-        for cnt, step in enumerate(sequence, start=1):
-            if rospy.is_shutdown():
-                return
-            rospy.loginfo(f"------------- Starting sequence step: {cnt}-------------")
-
-            if passthrough_result:
-                rospy.loginfo(f"with prior result length ({len(passthrough_result)})")
+        Steps run as soon as the steps they follow are done (see PatternGraph).
+        A looping sequence is run again after each pass, until shutdown, the end
+        of the pattern, max_iterations passes or the deadline. The duration of
+        each pass is recorded in the metrics of the process (see get_metrics).
 
-            else:
-                rospy.loginfo("no prior result")
-
-            passthrough_result = self.handle_step(step, passthrough_result)
-
-            rospy.loginfo(f"************* End of sequence step: {cnt} *************")
+        The results of the steps are checkpointed as they are done. If the
+        pattern is paused or shut down before the end of a pass, the pass is
+        left to be resumed: the next call only runs the steps left (a streamed
+        set streams its text again).
 
-        if looping:
-            rospy.loginfo("Done with a loop!")
-            if not rospy.is_shutdown():
-                self.do_steps(sequence, looping=True)
-
-        return
+        Args:
+            sequence (PatternGraph or list of dicts): The compiled steps, or the
+                steps of the script. Each dict specifies a call to a service
+            looping (bool, optional): If true will loop the sequence indefinitely. Defaults to False.
+            max_iterations (int, optional): passes of a looping sequence. Defaults to None.
+            deadline (float, optional): time (time.time()) after which a looping
+                sequence does not start a new pass. Defaults to None.
 
-    def handle_step(self, step, optional_data=None):
-        """Handle cases for different types of steps
+        Returns:
+            str: the merged results of the last steps of the last pass
+        """
+        if not isinstance(sequence, PatternGraph):
+            sequence = compile_steps(sequence)
+
+        iteration = first_iteration = self.loop_iteration if looping else 0
+        loop_start = time()
+        self.set_done = False
+        while True:
+            iteration_start = time()
+            try:
+                if sequence.stages:
+                    result = self.stream_steps(sequence)
+                    complete = not self._should_stop()
+                else:
+                    result = run_graph(
+                        sequence,
+                        self._run_checkpointed_step,
+                        executor=self.step_executor,
+                        stop=self._should_stop,
+                        results=self.step_results,
+                    )
+                    complete = len(self.step_results) == len(sequence)
+            except PatternPaused:
+                result, complete = None, False
+            if not complete:
+                rospy.loginfo(f"Stopped with steps {list(self.step_results)} done")
+                return result
+
+            with self.checkpoint_lock:
+                self.step_results = {}
+                if looping:
+                    iteration += 1
+                    self.loop_iteration = iteration
+            if not looping:
+                self.set_done = True
+                return result
+            self._save_checkpoint()
+
+            now = time()
+            get_metrics().record(self.name, "loop", "iteration", now - iteration_start)
+            rospy.loginfo(
+                f"Done with loop {iteration} in {now - iteration_start:.2f}s "
+                f"({(iteration - first_iteration) / (now - loop_start) * 60:.1f} "
+                "loops/min)"
+            )
+            if self._should_stop():
+                break
+            if max_iterations and iteration >= max_iterations:
+                rospy.loginfo(f"Loop ran its {max_iterations} iterations")
+                self.set_done = True
+                break
+            if deadline and now >= deadline:
+                rospy.loginfo(f"Loop reached its deadline after {iteration} iterations")
+                self.set_done = True
+                break
+        return result
 
-        Handles:
-            parallel execution of list steps
-            erronious calls to sensors
-            pulling latest data from detectors
-            making requests of actuators or other services
+    def stream_steps(self, graph):
+        """Streams the text returned by the head of a graph through its stages
 
         Args:
-            step ([type]): [description]
-            optional_data ([type], optional): [description]. Defaults to None.
+            graph (PatternGraph): steps compiled with a 'stream_from' step
 
         Returns:
-            [type]: [description]
+            str: the merged results of the last stage for the last sentence
         """
-        # If it is an array, it means that is a parallel actions, so I start multiple goals
-        # In the current implementation parallel actions return values will not get passed on
-        # TODO modify to collect results and return them
-        if isinstance(step, list):
-            threads = []
-            rospy.loginfo("Running action in parallel-ish (launching multiple goals)")
-            for i, sub_action in enumerate(step, start=1):
-                t = threading.Thread(
-                    target=self.handle_step, args=(sub_action, optional_data)
-                )
-                threads.append(t)
-                t.start()
-                # result = self.handle_step(sub_action, optional_data)
-            for t in threads:
-                t.join()
-            result = None
-            return result
-
+        text = None
+        if len(graph.head):
+            text = run_graph(
+                graph.head,
+                self._run_checkpointed_step,
+                executor=self.step_executor,
+                stop=self._should_stop,
+                results=self.step_results,
+            )
+            if self._should_stop():
+                return None
+
+        # The first streamed steps are sent each sentence instead of their trigger
+        first_stage = []
+        for step in graph.stages[0]:
+            details = dict(step.details)
+            if "trigger" in details:
+                text = details.pop("trigger")
+                if "user_id" in details:
+                    text = json.loads(text)["text"]
+            first_stage.append(
+                PatternStep(step.index, step.id, step.service, details, step.after)
+            )
+        sentences = split_sentences(text or "")
+        rospy.loginfo(f"Streaming {len(sentences)} sentences from {graph.stream_from}")
+
+        pipeline = StreamingPipeline(
+            [partial(self._run_stage, first_stage)]
+            + [partial(self._run_stage, steps) for steps in graph.stages[1:]],
+            max_queue=self.stream_queue_size,
+            name=f"{self.name}_stream",
+        )
+        outputs = pipeline.run(sentences, stop=self._should_stop)
+        timing = pipeline.get_timing()
+        if timing["first_output"] is not None:
+            rospy.loginfo(
+                f"Streamed {len(outputs)} sentences, first reached the last step "
+                f"after {timing['first_output']:.2f}s, steps busy for "
+                f"{[round(t, 2) for t in timing['busy_time']]}s"
+            )
+        return outputs[-1] if outputs else None
+
+    def _run_stage(self, steps, passthrough_result):
+        """Runs the steps of a streamed stage in parallel and merges their results"""
+        submitted = [
+            (
+                step.id,
+                self.step_executor.submit(self._run_step, step, passthrough_result),
+            )
+            for step in steps
+        ]
+        return merge_results([(step_id, f.result()) for step_id, f in submitted])
+
+    def _run_checkpointed_step(self, step, passthrough_result):
+        """Runs a step and checkpoints its result"""
+        result = self._run_step(step, passthrough_result)
+        with self.checkpoint_lock:
+            self.step_results[step.id] = result
+        self._save_checkpoint()
+        return result
+
+    def _run_step(self, step, passthrough_result):
+        """Runs a compiled step with the merged results of the steps it follows"""
+        cnt = step.index + 1
+        rospy.loginfo(f"------------- Starting sequence step: {cnt}-------------")
+        if passthrough_result:
+            rospy.loginfo(f"with prior result length ({len(passthrough_result)})")
         else:
-            service = next(iter(step))
-            details = step[service]
-            rospy.loginfo(f"Step is {service} with details {details}")
-            assert details["resource_type"] in [
-                "sensor",
-                "detector",
-                "actuator",
-                "service",
-            ], "must specify resource type of each step"
+            rospy.loginfo("no prior result")
 
+        # The step was checked when compiled, so its details are not looked up again
+        if step.resource_type == "sensor":
+            rospy.logwarn("Sensor should be set up during init")
+            result = None
+        elif step.resource_type == "detector":
             self.state = State.REQUEST
+            result = self.make_detector_request(step.service, step.details)
+        else:
+            self.state = State.REQUEST
+            result = self.make_service_request(
+                step.service, step.details, passthrough_result, step.action_type
+            )
 
-            if details["resource_type"] == "sensor":
-                rospy.logwarn("Sensor should be set up during init")
-                result = None
-
-            elif details["resource_type"] == "detector":
-                return_data = self.make_detector_request(service, details)
-
-            else:
-                return_data = self.make_service_request(service, details, optional_data)
-        return return_data
+        rospy.loginfo(f"************* End of sequence step: {cnt} *************")
+        return result
 
-    def make_service_request(self, service, details, optional_data):
+    def make_service_request(self, service, details, optional_data, action_type):
         """Sends a goal to a service
 
         Args:
             service (str): Name of the service
             details (dict): goal details
             optional_data (str): can be either the prior result or the trigger from the script
+            action_type (int): ActionType of the goal, resolved when the script
+                was compiled
 
         Returns:
             str: the result of the request
@@ -335,6 +799,11 @@ class SequentialPattern(HarmoniServiceManager):
             optional_data = details["trigger"]
         elif not optional_data:
             optional_data = ""
+        elif "user_id" in details:
+            # The service is shared by sessions, which each have their own user
+            optional_data = json.dumps(
+                {"text": optional_data, "user_id": details["user_id"]}
+            )
 
         rospy.loginfo(
             f"Sending goal to {service} optional_data len {len(optional_data)}"
@@ -342,26 +811,23 @@ class SequentialPattern(HarmoniServiceManager):
 
         # The request will be made without waiting as the get_new_result function
         # can handle the waiting
-        self.service_clients[service].send_goal(
-            action_goal=ActionType[details["action_goal"]].value,
-            optional_data=optional_data,
-            wait=False,
-        )
+        self.service_clients[service].ensure_connected()
+        call_time = time()
+        self._send_goal(service, action_type, optional_data)
 
         rospy.loginfo(f"Goal sent to {service}")
 
         self.state = State.SUCCESS
 
         if details["wait_for"] == "new":
-            return_data = self.get_new_result(service)
+            return_data = self.get_new_result(
+                service, since=call_time, timeout=details.get("timeout")
+            )
 
         else:
             rospy.logwarn("Not waiting for a detector may return last result")
-            if len(self.client_results[service]) > 0:
-                return_data = self.client_results[service].popleft()["data"]
-
-            else:
-                return_data = None
+            result = self.client_results[service].pop()
+            return_data = result["data"] if result else None
 
         return return_data
 
@@ -370,49 +836,56 @@ class SequentialPattern(HarmoniServiceManager):
 
         Args:
             service (str): Name of the detector service
-            details (dict): dictionary of request details. 'wait_for' is the only relevant item
+            details (dict): dictionary of request details. 'wait_for' and 'timeout' are the relevant items
 
         Returns:
             str: the string version of the last detection
         """
         rospy.loginfo(f"Retrieving data from detector: {service}")
         if details["wait_for"] == "new":
-            return_data = self.get_new_result(service)
+            # The wait for a detection, e.g. for the user to speak, ends on
+            # pause or stop
+            return_data = self.get_new_result(
+                service,
+                timeout=details.get("timeout"),
+                stop=lambda: self.paused or self.end_pattern,
+            )
+            if return_data is None and (self.paused or self.end_pattern):
+                raise PatternPaused(f"{self.name} paused waiting for {service}")
         else:
             rospy.logwarn("Not waiting for a detector may return old result")
-            if len(self.client_results[service]) > 0:
-                return_data = self.client_results[service].popleft()["data"]
-            return_data = None
+            # Take the latest detection, the ones before it are out of date
+            detections = self.client_results[service].drain()
+            return_data = detections[-1]["data"] if detections else None
+        rospy.logdebug(f"Detections of {service}: {self.get_detection_stats()}")
         return return_data
 
-    def get_new_result(self, service):
+    def get_new_result(self, service, since=None, timeout=None, stop=None):
         """Waits for a new result for the service to be set
 
+        Results received before since are dropped.
+
         Args:
             service (str): Name of the service
+            since (float, optional): time from which results are new. Defaults to now.
+            timeout (float, optional): seconds to wait, None to wait until a
+                result comes or shutdown. Defaults to None.
+            stop (func, optional): returns True to stop waiting, checked when
+                the result queues are woken. Defaults to None.
 
         Returns:
-            str: Result data
+            str: Result data, None if no result came in time
         """
         rospy.loginfo("getting result from the service")
-        rospy.loginfo(f"Queue is {self.client_results[service]}")
         rospy.loginfo(f"Queue size is {len(self.client_results[service])}")
 
-        call_time = time()
-        result = {"time": 0, "data": "_the_queue_is_empty"}
-
-        if len(self.client_results[service]) > 0:
-            result = self.client_results[service].popleft()
-
-        r = rospy.Rate(1)
-        while result["time"] < call_time and not rospy.is_shutdown():
-            rospy.loginfo(f"got old message length ({len(result['data'])})")
-
-            if len(self.client_results[service]) > 0:
-                result = self.client_results[service].popleft()
-
-            r.sleep()
+        if since is None:
+            since = time()
+        result = self.client_results[service].get_new(since, timeout, stop)
 
+        if result is None:
+            rospy.logwarn(f"No new result from service {service}")
+            return None
         if len(result["data"]) < 500:
             rospy.loginfo(f"result is {result['data']}")
         rospy.loginfo(
@@ -421,6 +894,175 @@ class SequentialPattern(HarmoniServiceManager):
         return result["data"]
 
 
+class PatternSessionManager(HarmoniServiceManager):
+    """Runs several sessions of a pattern in one process, e.g. one per kiosk
+
+    Each session is a SequentialPattern with its own state and result queues,
+    whose script calls the services of the session (see remap_script). The
+    services used by several sessions get a single client, shared by the
+    sessions; such a service should serve concurrent goals
+    (max_concurrent_goals > 1), or the sessions preempt each other's goals.
+    The requests of each session to a shared bot carry the user id of the
+    session, so that the bot keeps a conversation per session.
+
+    The steps of all the sessions run on a pool of max_workers workers,
+    which take the queued steps of the sessions in turn (see FairExecutor).
+    A step waiting for a result holds its worker, so there should be more
+    workers than sessions.
+    """
+
+    def __init__(
+        self,
+        name,
+        script,
+        sessions,
+        max_workers=None,
+        connect_timeout=30,
+        checkpoint_dir=None,
+        **session_args,
+    ):
+        """Sets up the shared clients and the sessions
+
+        Args:
+            name (str): name of the pattern
+            script (PatternPlan or list): the compiled script, or its sets
+            sessions (dict): session id -> services of the script mapped to
+                those of the session, e.g. {"web_default": "web_kiosk1"}
+            max_workers (int, optional): steps run at once by all the sessions.
+                Defaults to the number of sessions plus the widest set.
+            connect_timeout (float, optional): seconds to wait at startup for
+                the services. Defaults to 30.
+            checkpoint_dir (str, optional): directory of the checkpoints of the
+                sessions, None to keep them in memory only. Defaults to None.
+            session_args: other arguments of each SequentialPattern
+        """
+        super().__init__(name)
+        file_hash = None
+        if isinstance(script, PatternPlan):
+            file_hash = script.file_hash
+            script = script.script
+        plans = {
+            session_id: compile_pattern(
+                remap_script(script, service_map), f"{name}_{session_id}"
+            )
+            for session_id, service_map in sessions.items()
+        }
+
+        users = {}  # service -> sessions using it
+        for session_id, plan in plans.items():
+            for service in plan.services:
+                users.setdefault(service, []).append(session_id)
+
+        # A shared bot keeps one conversation per user id, so each session
+        # talks to it under its own
+        user_ids = {session_id: {} for session_id in sessions}
+        for service, session_ids in users.items():
+            child = get_registry().get_service_child(service)
+            if len(session_ids) < 2 or not child:
+                continue
+            if child[0] != DialogueNameSpace.bot.name:
+                continue
+            user = self._get_param(service, "user_id", name)
+            for session_id in session_ids:
+                user_ids[session_id][service] = f"{user}_{session_id}"
+        for session_id, service_map in sessions.items():
+            if user_ids[session_id]:
+                plans[session_id] = compile_pattern(
+                    remap_script(script, service_map, user_ids[session_id]),
+                    f"{name}_{session_id}",
+                )
+        for plan in plans.values():
+            plan.file_hash = file_hash  # to check the checkpoints against
+        self.shared_clients = {}
+        for service, session_ids in users.items():
+            if len(session_ids) < 2:
+                continue
+            if not self._serves_concurrent_goals(service):
+                rospy.logwarn(
+                    f"{service} is shared by {session_ids} but does not serve "
+                    "concurrent goals, the sessions will preempt each other"
+                )
+            client = HarmoniActionClient(service)
+            client.setup_client(service, wait=False)
+            self.shared_clients[service] = client
+        self.startup_report = connect_clients(self.shared_clients, connect_timeout)
+        rospy.loginfo(f"{name} shares clients: {self.startup_report}")
+
+        if max_workers is None:
+            widest = max(
+                len(pattern_set.graph)
+                for plan in plans.values()
+                for pattern_set in plan.sets
+            )
+            max_workers = len(sessions) + widest
+        self.executor = FairExecutor(max_workers, name=f"{name}_sessions")
+
+        def create_session(session_id):
+            plan = plans[session_id]
+            return SequentialPattern(
+                plan.name,
+                plan,
+                connect_timeout=connect_timeout,
+                shared_clients={
+                    s: c for s, c in self.shared_clients.items() if s in plan.services
+                },
+                executor=self.executor.lane(session_id),
+                checkpoint_path=checkpoint_dir
+                and os.path.join(checkpoint_dir, f"{plan.name}.json"),
+                **session_args,
+            )
+
+        # The sessions connect their own clients and set up their sensors at once
+        with futures.ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+            created = {s: pool.submit(create_session, s) for s in sessions}
+        self.sessions = {s: f.result() for s, f in created.items()}
+        rospy.loginfo(
+            f"{name} runs {len(self.sessions)} sessions with {max_workers} workers"
+        )
+        self.state = State.INIT
+        return
+
+    def _get_param(self, service, name, default=None):
+        """Returns a param of a service, read from the namespace of its node"""
+        child = get_registry().get_service_child(service)
+        if child is None:
+            return default
+        child, instance_id = child
+        return rospy.get_param(f"{child}/{instance_id}_param/{name}", default)
+
+    def _serves_concurrent_goals(self, service):
+        """Whether the params of a service let its server serve concurrent goals"""
+        return self._get_param(service, "max_concurrent_goals", 1) > 1
+
+    def start(self):
+        """Runs all the sessions until they reach the end of the pattern"""
+        self.state = State.START
+        threads = [
+            threading.Thread(target=session.start, name=session.name, daemon=True)
+            for session in self.sessions.values()
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.state = State.SUCCESS
+        return
+
+    def pause(self):
+        """Pauses all the sessions, start() resumes them"""
+        for session in self.sessions.values():
+            session.pause()
+        self.state = State.PAUSE
+        return
+
+    def stop(self):
+        """Stops all the sessions"""
+        for session in self.sessions.values():
+            session.stop()
+        self.state = State.SUCCESS
+        return
+
+
 def main():
     """Set names, collect params, and give service to server"""
 
@@ -432,8 +1074,9 @@ def main():
     rospack = rospkg.RosPack()
     pck_path = rospack.get_path("harmoni_pattern")
     pattern_script_path = pck_path + f"/pattern_scripting/{pattern_to_use}.json"
-    with open(pattern_script_path, "r") as read_file:
-        script = json.load(read_file)
+    # The plan is compiled and checked against the configuration once per
+    # version of the script, then loaded from the cache
+    script = load_pattern(pattern_script_path, get_registry().get_configured_services())
 
     try:
         rospy.init_node(pattern_to_use, log_level=rospy.INFO)
@@ -441,7 +1084,34 @@ def main():
         # multiple_choice/default_param/[all your params]
         params = rospy.get_param(pattern_to_use + "/" + instance_id + "_param/")
 
-        s = SequentialPattern(pattern_to_use, script)
+        # The position in the script can be written to disk, so that the
+        # pattern resumes from it if it is restarted after its node was killed
+        checkpoint_dir = None
+        if params.get("checkpoint", False):
+            checkpoint_dir = os.path.join(get_cache_dir(), "checkpoints")
+        session_args = dict(
+            connect_timeout=params.get("connect_timeout", 30),
+            detection_buffer_size=params.get("detection_buffer_size", 10),
+            detection_max_age=params.get("detection_max_age", 60),
+        )
+        if params.get("sessions"):
+            # session id -> services of the script mapped to those of the session
+            s = PatternSessionManager(
+                pattern_to_use,
+                script,
+                params["sessions"],
+                max_workers=params.get("max_workers"),
+                checkpoint_dir=checkpoint_dir,
+                **session_args,
+            )
+        else:
+            s = SequentialPattern(
+                pattern_to_use,
+                script,
+                checkpoint_path=checkpoint_dir
+                and os.path.join(checkpoint_dir, f"{service_id}.json"),
+                **session_args,
+            )
         if call_start:
             s.start()
         else:
@@ -0,0 +1 @@
+#!/usr/bin/env python3
\ No newline at end of file
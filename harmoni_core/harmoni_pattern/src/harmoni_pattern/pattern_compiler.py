@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sys
+from harmoni_pattern import pattern_graph
+from harmoni_pattern.pattern_graph import compile_steps
+
+SET_TYPES = ("setup", "sequence", "loop")
+WAIT_FOR = ("", "new")
+
+logger = logging.getLogger(__name__)
+
+
+def _get_source_hash():
+    """Hash of the sources of the compiler and of the graphs it builds
+
+    It is part of the key of the cached plans, so the plans pickled by another
+    version of the code are compiled again instead of being loaded.
+    """
+    source_hash = hashlib.sha256()
+    for module_path in [__file__, pattern_graph.__file__]:
+        with open(module_path, "rb") as read_file:
+            source_hash.update(read_file.read())
+    return source_hash.hexdigest()
+
+
+SOURCE_HASH = _get_source_hash()
+
+
+def get_pattern_path():
+    """Returns the pattern_scripting directory of harmoni_pattern
+
+    The directory is looked up next to this package in the source tree, then
+    through rospkg.
+    """
+    package = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../..")
+    path = os.path.normpath(os.path.join(package, "pattern_scripting"))
+    if not os.path.isdir(path):
+        import rospkg
+
+        path = os.path.join(
+            rospkg.RosPack().get_path("harmoni_pattern"), "pattern_scripting"
+        )
+    return path
+
+
+def get_cache_dir():
+    """Returns the directory of the compiled plans (in ROS_HOME)"""
+    ros_home = os.environ.get("ROS_HOME", os.path.join(os.path.expanduser("~"), ".ros"))
+    return os.path.join(ros_home, "harmoni_pattern")
+
+
+class PatternError(ValueError):
+    """A pattern script which cannot be run, with the list of its errors"""
+
+    def __init__(self, name, errors):
+        super().__init__(f"Pattern {name} is invalid: " + "; ".join(errors))
+        self.errors = errors
+
+
+class PatternSet(object):
+    """A set of a pattern script, with its steps compiled"""
+
+    def __init__(self, index, kind, graph, max_iterations=None, duration=None):
+        """
+        Args:
+            index (int): position of the set in the script
+            kind (str): 'setup', 'sequence' or 'loop'
+            graph (PatternGraph): the compiled steps
+            max_iterations (int, optional): passes of a loop. Defaults to None.
+            duration (float, optional): seconds a loop runs. Defaults to None.
+        """
+        self.index = index
+        self.kind = kind
+        self.graph = graph
+        self.max_iterations = max_iterations
+        self.duration = duration
+
+
+class PatternPlan(object):
+    """A pattern script compiled and checked, ready to be run
+
+    Built by compile_pattern(), or loaded from the cache by load_pattern().
+    """
+
+    def __init__(self, name, script, sets, file_hash=None):
+        """
+        Args:
+            name (str): name of the pattern
+            script (list): sets of the pattern script
+            sets (list): the PatternSets compiled from the script
+            file_hash (str, optional): sha256 of the script file. Defaults to None.
+        """
+        self.name = name
+        self.script = script
+        self.sets = sets
+        self.file_hash = file_hash
+        self.services = set()  # services called by the steps
+        self.detector_topics = {}  # detector service -> topic of its detections
+        for pattern_set in sets:
+            for step in pattern_set.graph.steps:
+                self.services.add(step.service)
+                if step.topic:
+                    self.detector_topics[step.service] = step.topic
+
+
+def lint_pattern(script, configured_services=None):
+    """Checks a pattern script
+
+    Args:
+        script (list): sets of the pattern script
+        configured_services (set, optional): services of the configuration
+            (see ConfigRegistry.get_configured_services), None to not check
+            the services. Defaults to None.
+
+    Returns:
+        tuple: the list of errors, which keep the script from running, and the
+            list of warnings
+    """
+    errors = []
+    warnings = []
+    if not isinstance(script, list):
+        return [f"Script must be a list of sets, not {type(script).__name__}"], []
+    for index, script_set in enumerate(script):
+        where = f"Set {index}"
+        if not isinstance(script_set, dict) or "steps" not in script_set:
+            errors.append(f"{where} must be a dict with steps")
+            continue
+        kind = script_set.get("set")
+        if kind not in SET_TYPES:
+            errors.append(f"{where} has an unknown set type {kind}")
+        try:
+            graph = compile_steps(script_set["steps"], script_set.get("stream_from"))
+        except ValueError as e:
+            errors.append(f"{where}: {e}")
+            continue
+        for step in graph.steps:
+            if kind == "setup" and step.resource_type not in ("sensor", "detector"):
+                errors.append(f"{where}: {step.id} is not a sensor or detector to set up")
+            elif kind != "setup" and step.resource_type == "sensor":
+                warnings.append(f"{where}: sensor {step.service} is not set up")
+            if step.details.get("wait_for", "") not in WAIT_FOR:
+                warnings.append(
+                    f"{where}: {step.id} waits for {step.details['wait_for']!r}, "
+                    "which is read as not waiting"
+                )
+            if configured_services is not None:
+                if step.service not in configured_services:
+                    errors.append(f"{where}: {step.service} is not configured")
+    return errors, warnings
+
+
+def compile_pattern(script, name="pattern", configured_services=None):
+    """Compiles a pattern script into a PatternPlan
+
+    Args:
+        script (list): sets of the pattern script
+        name (str, optional): name of the pattern. Defaults to "pattern".
+        configured_services (set, optional): services of the configuration,
+            None to not check the services. Defaults to None.
+
+    Raises:
+        PatternError: if the script has errors
+
+    Returns:
+        PatternPlan: the compiled script
+    """
+    errors, _ = lint_pattern(script, configured_services)
+    if errors:
+        raise PatternError(name, errors)
+    sets = [
+        PatternSet(
+            index,
+            script_set["set"],
+            compile_steps(script_set["steps"], script_set.get("stream_from")),
+            script_set.get("max_iterations"),
+            script_set.get("duration"),
+        )
+        for index, script_set in enumerate(script)
+    ]
+    return PatternPlan(name, script, sets)
+
+
+def _get_plan_key(file_hash, configured_services):
+    """Hash of the script file, the configuration and the compiler sources"""
+    key = hashlib.sha256(file_hash.encode())
+    key.update(SOURCE_HASH.encode())
+    if configured_services is not None:
+        key.update(json.dumps(sorted(configured_services)).encode())
+    return key.hexdigest()
+
+
+def load_pattern(path, configured_services=None, cache_dir=None):
+    """Returns the plan of a pattern script file, compiling it if needed
+
+    Plans are cached on disk by hash of the file (and of the configured
+    services and of the compiler sources), so a script is only checked and
+    compiled again once it changes. A cached plan which cannot be loaded is
+    removed and compiled again.
+
+    Args:
+        path (str): the json file of the script
+        configured_services (set, optional): services of the configuration,
+            None to not check the services. Defaults to None.
+        cache_dir (str, optional): directory of the cached plans, "" to not
+            cache. Defaults to get_cache_dir().
+
+    Raises:
+        PatternError: if the script has errors
+
+    Returns:
+        PatternPlan: the compiled script
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path, "rb") as read_file:
+        data = read_file.read()
+    file_hash = hashlib.sha256(data).hexdigest()
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    cache_path = ""
+    if cache_dir:
+        key = _get_plan_key(file_hash, configured_services)
+        cache_path = os.path.join(cache_dir, f"{name}-{key}.pickle")
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except (
+            OSError,
+            pickle.UnpicklingError,
+            EOFError,
+            AttributeError,
+            ImportError,
+        ) as e:
+            logger.warning(f"Compiling {path} again, its cached plan is bad: {e!r}")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass  # replaced once compiled, if it can be
+
+    plan = compile_pattern(json.loads(data), name, configured_services)
+    plan.file_hash = file_hash
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + f".{os.getpid()}"
+            with open(tmp_path, "wb") as cache_file:
+                pickle.dump(plan, cache_file)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # the plan is still usable
+    return plan
+
+
+def main(argv=None):
+    """Compiles and lints pattern scripts, by default all of pattern_scripting/"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("paths", nargs="*", help="json scripts or directories")
+    parser.add_argument(
+        "--no-config",
+        action="store_true",
+        help="do not check the services against the configuration",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="do not write the compiled plans"
+    )
+    args = parser.parse_args(argv)
+
+    paths = []
+    for path in args.paths or [get_pattern_path()]:
+        if os.path.isdir(path):
+            paths.extend(
+                os.path.join(path, f)
+                for f in sorted(os.listdir(path))
+                if f.endswith(".json")
+            )
+        else:
+            paths.append(path)
+
+    configured_services = None
+    if not args.no_config:
+        from harmoni_common_lib.config_registry import get_registry
+
+        configured_services = get_registry().get_configured_services()
+
+    failed = 0
+    for path in paths:
+        try:
+            with open(path) as read_file:
+                script = json.load(read_file)
+        except (OSError, ValueError) as e:
+            print(f"{path}: ERROR {e}")
+            failed += 1
+            continue
+        errors, warnings = lint_pattern(script, configured_services)
+        for message in errors:
+            print(f"{path}: ERROR {message}")
+        for message in warnings:
+            print(f"{path}: WARNING {message}")
+        if errors:
+            failed += 1
+            continue
+        load_pattern(path, configured_services, "" if args.no_cache else None)
+        print(f"{path}: OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
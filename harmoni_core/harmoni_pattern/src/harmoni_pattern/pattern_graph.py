@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+from concurrent import futures
+from harmoni_common_lib.constants import ActionType
+
+RESOURCE_TYPES = ("sensor", "detector", "actuator", "service")
+
+
+class PatternStep(object):
+    """A step of a pattern set: one call to a service and the steps it follows
+
+    The details of the step are checked and resolved once: the ActionType of
+    the goal, whether to wait for a new result and the topic of a detector.
+    """
+
+    def __init__(self, index, step_id, service, details, after):
+        """
+        Args:
+            index (int): position of the step in the set, in execution order
+            step_id (str): name of the step, used by the 'after' of other steps
+            service (str): the service called (e.g. tts_default)
+            details (dict): the details of the step from the script
+            after (list): ids of the steps whose results are passed to this one
+
+        Raises:
+            ValueError: if the resource_type or action_goal is missing or unknown
+        """
+        self.index = index
+        self.id = step_id
+        self.service = service
+        self.details = details
+        self.after = after
+        self.before = []  # ids of the steps that follow this one
+
+        self.resource_type = details.get("resource_type")
+        if self.resource_type not in RESOURCE_TYPES:
+            raise ValueError(
+                f"Step {step_id} must have a resource_type among {RESOURCE_TYPES}"
+            )
+        self.action_type = None  # ActionType value of the goal
+        if "action_goal" in details:
+            action_goal = details["action_goal"]
+            if action_goal not in ActionType.__members__:
+                raise ValueError(f"Step {step_id} has an unknown action_goal {action_goal}")
+            self.action_type = ActionType[action_goal].value
+        elif self.resource_type != "detector":
+            raise ValueError(f"Step {step_id} must have an action_goal")
+        self.wait_for_new = details.get("wait_for") == "new"
+        self.timeout = details.get("timeout")
+        self.topic = None  # topic of the detections of a detector
+        if self.resource_type == "detector":
+            # Split off the instance id to get the topic (e.g. stt_default -> stt)
+            service_list = service.split("_")
+            service_id = "_".join(service_list[0:-1])
+            self.topic = f"/harmoni/detecting/{service_id}/{service_list[-1]}"
+
+    def __repr__(self):
+        return f"PatternStep({self.id}, after={self.after})"
+
+
+class PatternGraph(object):
+    """The steps of a pattern set compiled into a dependency graph.
+
+    A step runs once all the steps of its 'after' list are done, and receives
+    their results. By default a step follows the step before it, and each
+    step of a parallel block (a list of steps) follows the step before the
+    block; the step after a block follows every step of the block, so it
+    receives their merged results. This gives the same order as running the
+    script step by step.
+
+    A step can be named with an 'id' and list the steps it follows in
+    'after', to make independent steps run at the same time, e.g.:
+
+        {"web_default": {"action_goal": "DO", "after": [], ...}}
+
+    starts along with the first step of the set. The 'after' list can only
+    name steps written before, so the graph has no cycles.
+
+    A set streamed from a step (see split_stream()) is split in two: the steps
+    before it (head) run once, then the text they return is split in
+    sentences which go one by one through the following steps (stages).
+    """
+
+    def __init__(self, steps, stream_from=None):
+        self.steps = steps  # in script order, which is a topological order
+        self.by_id = {step.id: step for step in steps}
+        for step in steps:
+            for step_id in step.after:
+                self.by_id[step_id].before.append(step.id)
+        self.roots = [step for step in steps if not step.after]
+        self.sinks = [step for step in steps if not step.before]
+        self.stream_from = stream_from
+        self.head = None
+        self.stages = None
+        if stream_from is not None:
+            self.head, self.stages = self.split_stream(stream_from)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def get_services(self):
+        """Returns the names of the services called by the steps"""
+        return {step.service for step in self.steps}
+
+    def split_stream(self, step_id):
+        """Splits the graph into the steps before a step and the stages from it
+
+        The steps from step_id on must form a chain of steps or parallel
+        blocks, each following the one before, e.g. tts then [speaker, face].
+
+        Args:
+            step_id (str): id of the first step streamed
+
+        Raises:
+            ValueError: if the step is unknown or the steps from it are not a chain
+
+        Returns:
+            tuple: the PatternGraph of the steps before step_id, and the stages
+                as lists of the PatternSteps run in parallel
+        """
+        if step_id not in self.by_id:
+            raise ValueError(f"Cannot stream from unknown step {step_id}")
+        start = self.by_id[step_id].index
+        if start > 0 and self.steps[start - 1].after == self.steps[start].after:
+            raise ValueError(f"Cannot stream from {step_id}, inside a parallel block")
+        head = PatternGraph(
+            [
+                PatternStep(s.index, s.id, s.service, s.details, list(s.after))
+                for s in self.steps[:start]
+            ]
+        )
+        stages = []
+        for step in self.steps[start:]:
+            if stages and step.after == stages[-1][0].after:
+                stages[-1].append(step)
+                continue
+            if stages and step.after != [s.id for s in stages[-1]]:
+                raise ValueError(
+                    f"Cannot stream {step.id}, it does not follow the steps before it"
+                )
+            stages.append([step])
+        return head, stages
+
+
+def compile_steps(steps, stream_from=None):
+    """Compiles the steps of a pattern set into a PatternGraph
+
+    Args:
+        steps (list): steps of the set, each a dict {service: details} or a
+            list of such dicts run in parallel
+        stream_from (str, optional): id of the step from which the set is
+            streamed sentence by sentence. Defaults to None.
+
+    Raises:
+        ValueError: if a step is malformed, has unknown details or names an
+            unknown step
+
+    Returns:
+        PatternGraph: the compiled steps
+    """
+    compiled = []
+    ids = set()
+    previous = []  # the ids of the step (or parallel block) before
+    for position, step in enumerate(steps, start=1):
+        block = step if isinstance(step, list) else [step]
+        if not block:
+            raise ValueError(f"Step {position} is an empty parallel block")
+        block_ids = []
+        for action in block:
+            if not isinstance(action, dict) or len(action) != 1:
+                raise ValueError(
+                    f"Step {position} must be a dict with one service: {action}"
+                )
+            service, details = next(iter(action.items()))
+            step_id = details.get("id", service)
+            if step_id in ids:
+                if "id" in details:
+                    raise ValueError(f"Step id {step_id} is used twice")
+                count = 2
+                while f"{service}:{count}" in ids:
+                    count += 1
+                step_id = f"{service}:{count}"
+            after = details.get("after", previous)
+            if isinstance(after, str):
+                after = [after]
+            for before_id in after:
+                if before_id not in ids:
+                    raise ValueError(
+                        f"Step {step_id} is after unknown step {before_id}"
+                    )
+            compiled.append(
+                PatternStep(len(compiled), step_id, service, details, list(after))
+            )
+            block_ids.append(step_id)
+        ids.update(block_ids)
+        previous = block_ids
+    return PatternGraph(compiled, stream_from)
+
+
+def merge_results(results):
+    """Merges the results of the steps a step follows into its input
+
+    Args:
+        results (list): (step id, result) of the steps, in script order
+
+    Returns:
+        the single result if only one step returned data, otherwise the string
+        of a dict of the results by step id, None if no step returned data
+    """
+    results = [(step_id, result) for step_id, result in results if result]
+    if not results:
+        return None
+    if len(results) == 1:
+        return results[0][1]
+    return str(dict(results))
+
+
+def run_graph(
+    graph, handle_step, optional_data=None, executor=None, stop=None, results=None
+):
+    """Runs the steps of a graph, each as soon as the steps it follows are done
+
+    A run can be stopped and resumed: the steps running when stop() becomes
+    True finish, and their results are kept in results, which can be given to
+    a later run so that it only runs the steps left.
+
+    Args:
+        graph (PatternGraph): the steps to run
+        handle_step (func): called as handle_step(step, optional_data) to run a
+            step; returns the result of the step
+        optional_data (str, optional): input of the steps that follow no other
+            step. Defaults to None.
+        executor (Executor, optional): runs the steps. Defaults to a thread
+            pool created for the call.
+        stop (func, optional): returns True to stop starting new steps.
+        results (dict, optional): results of the steps already done, by step
+            id; these steps are not run again. It is filled in with the results
+            of the steps as they finish. Defaults to None.
+
+    Raises:
+        Exception: the first exception raised by a step, once the running steps
+            are done
+
+    Returns:
+        the merged results of the steps no other step follows
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = futures.ThreadPoolExecutor(
+            max_workers=max(1, len(graph)), thread_name_prefix="pattern_step"
+        )
+    if results is None:
+        results = {}
+    waiting = {step.id: len(step.after) for step in graph.steps}
+    for step_id in results:
+        for next_id in graph.by_id[step_id].before:
+            waiting[next_id] -= 1
+    running = {}  # future -> step
+    error = None
+
+    def submit(step):
+        if step.after:
+            data = merge_results([(i, results[i]) for i in step.after])
+        else:
+            data = optional_data
+        running[executor.submit(handle_step, step, data)] = step
+
+    try:
+        for step in graph.steps:
+            if step.id not in results and waiting[step.id] == 0:
+                submit(step)
+        while running:
+            done, _ = futures.wait(list(running), return_when=futures.FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: running[f].index):
+                step = running.pop(future)
+                try:
+                    results[step.id] = future.result()
+                except Exception as e:
+                    error = error or e
+                    continue
+                if error or (stop and stop()):
+                    continue
+                for next_id in step.before:
+                    waiting[next_id] -= 1
+                    if waiting[next_id] == 0:
+                        submit(graph.by_id[next_id])
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+    if error:
+        raise error
+    return merge_results([(step.id, results.get(step.id)) for step in graph.sinks])
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import copy
+import json
+import threading
+from collections import deque
+from concurrent import futures
+
+
+def remap_script(script, service_map, user_ids=None):
+    """Returns a copy of a pattern script calling other instances of its services
+
+    Used to run the same pattern for several sessions, e.g. with
+    {"web_default": "web_kiosk1", "speaker_default": "speaker_kiosk1"}. The
+    'after' and 'stream_from' references to the steps of a renamed service are
+    renamed with it; explicit step ids are kept.
+
+    The steps of the services in user_ids (e.g. a bot shared by the sessions)
+    get the 'user_id' of the session, so that each session has its own
+    conversation: their trigger is sent as {"text": ..., "user_id": ...},
+    and so is the prior result they are sent when they have no trigger.
+
+    Args:
+        script (list): sets of the pattern script
+        service_map (dict): service of the script -> service of the session
+        user_ids (dict, optional): service of the session -> user id of the
+            session on that service. Defaults to None.
+
+    Returns:
+        list: the sets of the remapped script
+    """
+    script = copy.deepcopy(script)
+    if not service_map and not user_ids:
+        return script
+    user_ids = user_ids or {}
+
+    def remap_step(step):
+        service, details = next(iter(step.items()))
+        service = service_map.get(service, service)
+        if service in user_ids:
+            details["user_id"] = user_ids[service]
+            if "trigger" in details:
+                details["trigger"] = json.dumps(
+                    {"text": details["trigger"], "user_id": user_ids[service]}
+                )
+        return {service: details}
+
+    def remap_reference(ref, ids):
+        # Steps without an id are referred to as "service" or "service:2"
+        service, sep, count = ref.partition(":")
+        if ref in ids or service not in service_map:
+            return ref
+        return service_map[service] + sep + count
+
+    for script_set in script:
+        steps = [s if isinstance(s, list) else [s] for s in script_set["steps"]]
+        ids = {
+            details["id"]
+            for block in steps
+            for step in block
+            for details in step.values()
+            if "id" in details
+        }
+        for block in steps:
+            for step in block:
+                details = next(iter(step.values()))
+                after = details.get("after")
+                if isinstance(after, str):
+                    details["after"] = remap_reference(after, ids)
+                elif isinstance(after, list):
+                    details["after"] = [remap_reference(a, ids) for a in after]
+        if script_set.get("stream_from"):
+            script_set["stream_from"] = remap_reference(script_set["stream_from"], ids)
+        script_set["steps"] = [
+            [remap_step(s) for s in step] if isinstance(step, list) else remap_step(step)
+            for step in script_set["steps"]
+        ]
+    return script
+
+
+class FairExecutor(object):
+    """A pool of workers shared by sessions, which take turns to use it
+
+    Each session submits its tasks to its own lane (see lane()). Workers take
+    the next task from the lanes in turn, so a session with many steps queued
+    does not hold up the others.
+    """
+
+    def __init__(self, max_workers, name="sessions"):
+        """
+        Args:
+            max_workers (int): tasks run at once, for all the sessions
+            name (str, optional): prefix of the worker threads. Defaults to "sessions".
+        """
+        self.condition = threading.Condition()
+        self.lanes = {}  # lane id -> deque of (future, fn, args, kwargs)
+        self.order = deque()  # lane ids, the next one to be served first
+        self.closed = False
+        self.workers = [
+            threading.Thread(target=self._work, name=f"{name}_{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+        return
+
+    def lane(self, lane_id):
+        """Returns an executor whose submit() queues tasks in the lane of a session"""
+        with self.condition:
+            if lane_id not in self.lanes:
+                self.lanes[lane_id] = deque()
+                self.order.append(lane_id)
+        return _Lane(self, lane_id)
+
+    def submit(self, lane_id, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) in a lane
+
+        Returns:
+            concurrent.futures.Future: resolves with the result of fn
+        """
+        future = futures.Future()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("cannot submit tasks after shutdown")
+            self.lanes[lane_id].append((future, fn, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def get_pending(self):
+        """Returns the number of tasks waiting for a worker in each lane"""
+        with self.condition:
+            return {lane_id: len(tasks) for lane_id, tasks in self.lanes.items()}
+
+    def _next_task(self):
+        """Takes the task of the next lane with one; called with the condition held"""
+        for _ in range(len(self.order)):
+            lane_id = self.order[0]
+            self.order.rotate(-1)
+            if self.lanes[lane_id]:
+                return self.lanes[lane_id].popleft()
+        return None
+
+    def _work(self):
+        while True:
+            with self.condition:
+                task = self._next_task()
+                while task is None:
+                    if self.closed:
+                        return
+                    self.condition.wait()
+                    task = self._next_task()
+            future, fn, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self, wait=True):
+        """Stops the workers once the queued tasks are done"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        if wait:
+            for worker in self.workers:
+                worker.join()
+        return
+
+
+class _Lane(object):
+    """The tasks of one session in a FairExecutor, submitted as to an executor"""
+
+    def __init__(self, executor, lane_id):
+        self.executor = executor
+        self.lane_id = lane_id
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(self.lane_id, fn, *args, **kwargs)
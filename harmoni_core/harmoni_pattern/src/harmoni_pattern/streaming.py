@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import queue
+import re
+import threading
+import time
+
+# Actions are written between stars in the text said by the robot (e.g. *happy_face*)
+ACTION = re.compile(r"(\*[^\*]*\*)")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_END = object()  # put in a queue after the last item
+
+
+def split_sentences(text):
+    """Splits a text into sentences, keeping the actions in their sentence
+
+    A sentence made only of actions is joined to the next one (or to the last
+    one at the end of the text), so each sentence has words to say.
+
+    Args:
+        text (str): the text, e.g. the reply of a bot
+
+    Returns:
+        list: the sentences, [] if the text is empty
+    """
+    sentences = []
+    current = ""
+    for token in ACTION.split(text):
+        if ACTION.fullmatch(token):
+            current += token
+            continue
+        parts = SENTENCE_END.split(token)
+        for part in parts[:-1]:
+            sentences.append(current + part)
+            current = ""
+        current += parts[-1]
+    sentences.append(current)
+
+    merged = []
+    pending = ""
+    for sentence in sentences:
+        sentence = (pending + " " + sentence).strip()
+        if ACTION.sub("", sentence).strip():
+            merged.append(sentence)
+            pending = ""
+        else:
+            pending = sentence
+    if pending:
+        if merged:
+            merged[-1] = merged[-1] + " " + pending
+        else:
+            merged.append(pending)
+    return merged
+
+
+class StreamingPipeline(object):
+    """Runs a sequence of items through stages that work at the same time.
+
+    Each stage runs on its own thread and handles one item at a time, in order:
+    while the last stage handles item k, the stage before it already handles
+    item k+1. Stages are linked by queues of at most max_queue items, so a fast
+    stage gets at most max_queue items ahead of the next one.
+
+    If a stage fails, the items still queued are dropped and run() raises the
+    error once every stage has stopped.
+    """
+
+    def __init__(self, stages, max_queue=1, name="pipeline"):
+        """
+        Args:
+            stages (list): functions called as stage(item) for each item, the
+                return value being the item of the next stage
+            max_queue (int, optional): items waiting between two stages.
+                Defaults to 1.
+            name (str, optional): name of the threads. Defaults to "pipeline".
+        """
+        self.stages = stages
+        self.max_queue = max_queue
+        self.name = name
+        self.error = None
+        self.stop = threading.Event()
+        self.start_time = None
+        self.first_output_time = None  # the last stage started the first item
+        self.busy_time = [0.0] * len(stages)  # seconds each stage was working
+        return
+
+    def run(self, items, stop=None):
+        """Runs the items through the stages
+
+        Args:
+            items (iterable): the input of the first stage
+            stop (func, optional): returns True to stop feeding new items.
+
+        Raises:
+            Exception: the error of the first stage that failed
+
+        Returns:
+            list: the outputs of the last stage, in the order of the items
+        """
+        self.start_time = time.time()
+        queues = [queue.Queue(self.max_queue) for _ in range(len(self.stages) + 1)]
+        outputs = []
+        threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(index, queues[index], queues[index + 1]),
+                name=f"{self.name}_{index}",
+                daemon=True,
+            )
+            for index in range(len(self.stages))
+        ]
+        for thread in threads:
+            thread.start()
+
+        def collect():
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    return
+                outputs.append(item)
+
+        collector = threading.Thread(target=collect, name=f"{self.name}_out")
+        collector.start()
+        for item in items:
+            if self.stop.is_set() or (stop and stop()):
+                break
+            queues[0].put(item)
+        queues[0].put(_END)
+        collector.join()
+        for thread in threads:
+            thread.join()
+        if self.error:
+            raise self.error
+        return outputs
+
+    def _run_stage(self, index, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _END:
+                outbox.put(_END)
+                return
+            if self.stop.is_set():
+                continue  # drop the item, the pipeline failed
+            start = time.time()
+            if index == len(self.stages) - 1 and self.first_output_time is None:
+                self.first_output_time = start
+            try:
+                item = self.stages[index](item)
+            except Exception as e:
+                self.error = self.error or e
+                self.stop.set()
+                continue
+            finally:
+                self.busy_time[index] += time.time() - start
+            outbox.put(item)
+
+    def get_timing(self):
+        """Returns the time to first output and the busy time of each stage"""
+        first_output = None
+        if self.first_output_time is not None:
+            first_output = self.first_output_time - self.start_time
+        return {"first_output": first_output, "busy_time": list(self.busy_time)}
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+
+"""Load test of a pattern script against stand-in services.
+
+Each service of the script is served by a stand-in HarmoniServiceManager,
+through the HARMONI service server, whose request()/do() take a latency drawn
+from a distribution and return a synthetic or recorded message. Detectors
+publish a detection after each latency (the time until the user speaks, for
+stt). The pattern runs with an increasing number of sessions in one process
+(see PatternSessionManager), all the sessions sharing the stand-ins, and the
+duration of each turn is reported as percentiles (nearest-rank) along with
+the throughput.
+
+A turn is a pass of a loop set of the script, or of all its sets if it has no
+loop. The sequence sets around the loops run once per session, untimed.
+
+Latencies are given per service as "fixed:S" (or "S"), "uniform:MIN,MAX",
+"normal:MEAN,SD", "lognormal:MEDIAN,SIGMA" or "exponential:MEAN" seconds,
+the default depending on the kind of service (see DEFAULT_LATENCIES). They are
+drawn from a generator seeded per service, so a run can be repeated. Recorded
+services are replayed from a json file, e.g.
+
+    {"bot_default": {"latency": [0.42, 0.61], "messages": ["Hi. How are you?"]}}
+
+where latency is a list of recorded seconds or a distribution, and both lists
+are played in a loop.
+
+The benchmark runs against the in-process ROS stand-in, which also stands in
+for rospkg, so no ROS install, roscore, credentials or hardware are needed:
+
+    python3 benchmark_patterns.py dialogue --sessions 1 2 4 8 --turns 5 \\
+        --latency bot_default=lognormal:0.8,0.3 --time-scale 0.1
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "../../harmoni_common_lib/test"))
+import ros_stand_in
+
+ros_stand_in.install(log_level="ERROR")
+sys.path[:0] = [os.path.join(TEST_DIR, "../nodes"), os.path.join(TEST_DIR, "../src")]
+
+import rospy
+from std_msgs.msg import String
+from harmoni_common_lib.constants import State
+from harmoni_common_lib.metrics import nearest_rank
+from harmoni_common_lib.service_manager import HarmoniServiceManager
+from harmoni_common_lib.service_server import HarmoniConcurrentServiceServer
+from harmoni_pattern.pattern_compiler import get_pattern_path, load_pattern
+from sequential_pattern import PatternSessionManager
+
+# Latency of the stand-ins by kind of service (first part of the service name)
+DEFAULT_LATENCIES = {
+    "bot": "lognormal:0.6,0.3",
+    "tts": "lognormal:0.4,0.3",
+    "stt": "exponential:2.0",
+    "speaker": "uniform:1.0,3.0",
+    "face": "uniform:1.0,3.0",
+    "gesture": "uniform:1.0,3.0",
+    "web": "fixed:0.05",
+}
+DEFAULT_LATENCY = "fixed:0.1"
+
+
+def parse_latency(spec):
+    """Returns a function drawing a latency (seconds) from a distribution
+
+    Args:
+        spec (str): the distribution, e.g. "uniform:0.2,0.5"
+
+    Raises:
+        ValueError: if the distribution is unknown
+
+    Returns:
+        func: draws a latency from a random.Random
+    """
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    try:
+        args = [float(a) for a in args.split(",")]
+    except ValueError:
+        raise ValueError(f"Bad latency {spec!r}") from None
+    distributions = {
+        "fixed": lambda rng, s: s,
+        "uniform": lambda rng, a, b: rng.uniform(a, b),
+        "normal": lambda rng, mean, sd: max(0.0, rng.gauss(mean, sd)),
+        "lognormal": lambda rng, median, sigma: rng.lognormvariate(
+            math.log(median), sigma
+        ),
+        "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+    }
+    if kind not in distributions:
+        raise ValueError(f"Unknown latency distribution {kind!r} in {spec!r}")
+    return lambda rng: distributions[kind](rng, *args)
+
+
+class StandInService(HarmoniServiceManager):
+    """A service which answers after a drawn or recorded latency"""
+
+    def __init__(
+        self, name, latency, messages=None, seed=0, time_scale=1.0, topic=None
+    ):
+        """
+        Args:
+            name (str): name of the service
+            latency (str or list): distribution of the latency, or recorded
+                latencies played in a loop
+            messages (list, optional): recorded results played in a loop.
+                Defaults to synthetic results.
+            seed (int, optional): seed of the latencies. Defaults to 0.
+            time_scale (float, optional): factor of all the latencies. Defaults to 1.0.
+            topic (str, optional): topic of the detections, for a detector.
+                Defaults to None.
+        """
+        super().__init__(name)
+        self.rng = random.Random(f"{seed}:{name}")
+        if isinstance(latency, list):
+            recorded = latency
+            self.draw = lambda rng: recorded[self.calls % len(recorded)]
+        else:
+            self.draw = parse_latency(latency)
+        self.messages = messages
+        self.time_scale = time_scale
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.detecting = threading.Event()
+        self.publisher = (
+            rospy.Publisher(topic, String, queue_size=10) if topic else None
+        )
+        self.state = State.INIT
+        return
+
+    def _next(self):
+        """Returns the latency and the message of the next call"""
+        with self.lock:
+            latency = self.draw(self.rng) * self.time_scale
+            if self.messages:
+                message = self.messages[self.calls % len(self.messages)]
+            elif self.name.startswith("bot"):
+                # Several sentences, for the patterns streaming the reply
+                message = f"This is reply {self.calls}. It has two sentences."
+            else:
+                message = f"{self.name} result {self.calls}"
+            self.calls += 1
+        return latency, message
+
+    def request(self, data):
+        self.state = State.REQUEST
+        latency, message = self._next()
+        time.sleep(latency)
+        self.state = State.SUCCESS
+        self.result_msg = message
+        return {"response": self.state, "message": message}
+
+    def do(self, data):
+        self.actuation_completed = False
+        result = self.request(data)
+        self.actuation_completed = True
+        return result
+
+    def start(self):
+        self.state = State.START
+        if self.publisher and not self.detecting.is_set():
+            self.detecting.set()
+            threading.Thread(target=self._detect, daemon=True).start()
+        return
+
+    def _detect(self):
+        while self.detecting.is_set() and not rospy.is_shutdown():
+            latency, message = self._next()
+            time.sleep(latency)
+            self.publisher.publish(String(data=message))
+
+    def stop(self):
+        self.detecting.clear()
+        self.state = State.SUCCESS
+        return
+
+    def pause(self):
+        return self.stop()
+
+
+def start_stand_ins(plan, latencies, replay, seed, time_scale, max_workers):
+    """Serves each service of a plan with a StandInService
+
+    Returns:
+        dict: service -> StandInService
+    """
+    stand_ins = {}
+    for service in sorted(plan.services):
+        repo, instance_id = service.rsplit("_", 1)
+        recorded = replay.get(service, {})
+        latency = latencies.get(
+            service,
+            recorded.get("latency", DEFAULT_LATENCIES.get(repo.split("_")[0])),
+        )
+        stand_ins[service] = StandInService(
+            service,
+            latency or DEFAULT_LATENCY,
+            recorded.get("messages"),
+            seed,
+            time_scale,
+            plan.detector_topics.get(service),
+        )
+        # The sessions share the stand-ins, which serve their goals concurrently
+        rospy.set_param(f"{repo}/{instance_id}_param/max_concurrent_goals", max_workers)
+        HarmoniConcurrentServiceServer(
+            service,
+            stand_ins[service],
+            max_workers=max_workers,
+            max_pending_goals=max_workers,
+        )
+    return stand_ins
+
+
+def run_turns(session, turns):
+    """Runs the sets of a session, returning the durations of its turns"""
+    sets = [s for s in session.plan.sets if s.kind != "setup"]
+    durations = []
+    if not any(s.kind == "loop" for s in sets):
+        for _ in range(turns):
+            start = time.time()
+            for pattern_set in sets:
+                session.do_steps(pattern_set.graph)
+            durations.append(time.time() - start)
+        return durations
+    for pattern_set in sets:
+        if pattern_set.kind != "loop":
+            session.do_steps(pattern_set.graph)
+            continue
+        for _ in range(turns):
+            start = time.time()
+            session.do_steps(pattern_set.graph)
+            durations.append(time.time() - start)
+    return durations
+
+
+def measure(plan, sessions, turns):
+    """Runs the turns of a number of sessions at once
+
+    Returns:
+        dict: the turn durations (seconds) and the wall time of the run
+    """
+    manager = PatternSessionManager(
+        plan.name,
+        plan,
+        {f"session{i}": {} for i in range(sessions)},
+        connect_timeout=5,
+    )
+    durations = []
+    lock = threading.Lock()
+
+    def run(session):
+        session_durations = run_turns(session, turns)
+        with lock:
+            durations.extend(session_durations)
+
+    threads = [
+        threading.Thread(target=run, args=(session,))
+        for session in manager.sessions.values()
+    ]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.time() - start
+    manager.executor.shutdown(wait=False)
+    return {"sessions": sessions, "turns": durations, "wall_time": wall_time}
+
+
+def report(result):
+    ms = sorted(t * 1000 for t in result["turns"])
+    throughput = len(ms) / result["wall_time"] * 60
+    print(
+        f"{result['sessions']:>8} {len(ms):>6}  p50 {nearest_rank(ms, 50):8.1f} ms"
+        f"  p90 {nearest_rank(ms, 90):8.1f} ms  p99 {nearest_rank(ms, 99):8.1f} ms"
+        f"  max {ms[-1]:8.1f} ms  mean {statistics.mean(ms):8.1f} ms"
+        f"  {throughput:8.1f} turns/min"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("pattern", help="name or json file of the pattern script")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument(
+        "--latency",
+        action="append",
+        default=[],
+        metavar="SERVICE=DISTRIBUTION",
+        help="latency of a service, e.g. bot_default=uniform:0.5,1",
+    )
+    parser.add_argument("--replay", help="json file of recorded services")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--time-scale", type=float, default=1.0, help="factor of all the latencies"
+    )
+    parser.add_argument("--output", help="json file to write the turn durations to")
+    args = parser.parse_args()
+
+    path = args.pattern
+    if not path.endswith(".json"):
+        path = os.path.join(get_pattern_path(), f"{path}.json")
+    plan = load_pattern(path, cache_dir="")
+    latencies = dict(spec.split("=", 1) for spec in args.latency)
+    for spec in latencies.values():
+        parse_latency(spec)
+    replay = {}
+    if args.replay:
+        with open(args.replay) as read_file:
+            replay = json.load(read_file)
+
+    stand_ins = start_stand_ins(
+        plan, latencies, replay, args.seed, args.time_scale, 2 * max(args.sessions)
+    )
+    print(f"Pattern {plan.name} against stand-ins of {sorted(stand_ins)}")
+    print(f"{'sessions':>8} {'turns':>6}  (nearest-rank percentiles)")
+    results = []
+    for sessions in args.sessions:
+        results.append(measure(plan, sessions, args.turns))
+        report(results[-1])
+    if args.output:
+        with open(args.output, "w") as write_file:
+            json.dump({"pattern": plan.name, "results": results}, write_file)
+    rospy.signal_shutdown("benchmark done")
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
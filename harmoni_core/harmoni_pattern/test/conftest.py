@@ -0,0 +1,4 @@
+# test_sequential.py and test_sequential_speak.py are rostests, run by
+# sequential.test and sequential_speak.test with the pattern and its services
+# launched; collected by plain pytest they wait for services that never start
+collect_ignore = ["test_sequential.py", "test_sequential_speak.py"]
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+"""Services and setup of the pattern tests run against the ROS stand-in.
+
+The tests call install() in setUpModule, serve the services of their script
+with serve(), and end them with uninstall() in tearDownModule, so that the
+stand-in is only seen by their own module (see ros_stand_in).
+"""
+
+import os
+import sys
+import threading
+import time
+import types
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TEST_DIR, "../../harmoni_common_lib/test"))
+import ros_stand_in
+
+State = None  # harmoni_common_lib.constants.State, once installed
+
+
+class RecordingMixin(object):
+    """Service keeping the data of its goals, which may hold them until released
+
+    Mixed into a HarmoniServiceManager by install().
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.lock = threading.Lock()
+        self.called = threading.Event()
+        self.release = threading.Event()
+        self.clear()
+        self.state = State.INIT
+
+    def clear(self):
+        """Forgets the goals received, and lets the next ones through"""
+        with self.lock:
+            self.calls = 0
+            self.received = []
+        self.latency = 0.0
+        self.called.clear()
+        self.release.set()
+        return
+
+    def _answer(self, data):
+        with self.lock:
+            self.calls += 1
+            self.received.append(data)
+        self.called.set()
+        self.release.wait(5)
+        time.sleep(self.latency)
+        self.state = State.SUCCESS
+        self.result_msg = f"{self.name} reply"
+        return {"response": self.state, "message": self.result_msg}
+
+    def request(self, data):
+        result = self._answer(data)
+        self.response_received = True
+        return result
+
+    def do(self, data):
+        self.actuation_completed = False
+        result = self._answer(data)
+        self.actuation_completed = True
+        return result
+
+
+def step(service, action_goal="REQUEST", resource_type="service", **details):
+    """Returns a step of a pattern script waiting for a new result"""
+    return {
+        service: dict(
+            details,
+            action_goal=action_goal,
+            resource_type=resource_type,
+            wait_for="new",
+        )
+    }
+
+
+def install():
+    """Installs the stand-in and imports the pattern
+
+    Returns:
+        SimpleNamespace: the modules and classes used by the tests
+    """
+    global State
+    ros_stand_in.install(log_level="ERROR")
+    sys.path[:0] = [
+        os.path.join(TEST_DIR, "../nodes"),
+        os.path.join(TEST_DIR, "../src"),
+    ]
+
+    import rospy
+    import sequential_pattern
+    from harmoni_common_lib import config_registry
+    from harmoni_common_lib.constants import State
+    from harmoni_common_lib.metrics import get_metrics
+    from harmoni_common_lib.service_manager import HarmoniServiceManager
+    from harmoni_common_lib.service_server import (
+        HarmoniConcurrentServiceServer,
+        HarmoniServiceServer,
+    )
+
+    class RecordingService(RecordingMixin, HarmoniServiceManager):
+        pass
+
+    return types.SimpleNamespace(
+        rospy=rospy,
+        config_registry=config_registry,
+        get_metrics=get_metrics,
+        State=State,
+        RecordingService=RecordingService,
+        HarmoniServiceServer=HarmoniServiceServer,
+        HarmoniConcurrentServiceServer=HarmoniConcurrentServiceServer,
+        SequentialPattern=sequential_pattern.SequentialPattern,
+        PatternSessionManager=sequential_pattern.PatternSessionManager,
+    )
+
+
+def serve(ros, names, max_concurrent_goals=1):
+    """Serves a RecordingService for each service name
+
+    Args:
+        ros (SimpleNamespace): returned by install()
+        names (list): names of the services
+        max_concurrent_goals (int, optional): goals each service serves at
+            once, with a HarmoniConcurrentServiceServer above 1. Defaults to 1.
+
+    Returns:
+        tuple: the services by name, and their servers
+    """
+    services = {name: ros.RecordingService(name) for name in names}
+    if max_concurrent_goals > 1:
+        servers = [
+            ros.HarmoniConcurrentServiceServer(
+                name, service, max_workers=max_concurrent_goals
+            )
+            for name, service in services.items()
+        ]
+    else:
+        servers = [
+            ros.HarmoniServiceServer(name, service)
+            for name, service in services.items()
+        ]
+    return services, servers
+
+
+def uninstall(servers=()):
+    """Ends the servers and uninstalls the stand-in"""
+    for server in servers:
+        if hasattr(server, "terminate_mutex"):
+            # Ends the execute loop of the server, as when it is deleted
+            with server.terminate_mutex:
+                server.need_to_terminate = True
+            server.wake_execute_loop()
+        server.executor.shutdown(wait=False)
+    ros_stand_in.uninstall()
+    return
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+
+PKG = "harmoni_pattern"
+
+# The goals go through the in-process ROS stand-in, without a roscore
+import stand_in_services
+from stand_in_services import step
+
+
+SCRIPT = [
+    {
+        "set": "sequence",
+        "steps": [
+            step("bot_default"),
+            step("tts_default"),
+            step("web_default", "DO", "actuator"),
+        ],
+    }
+]
+
+
+def setUpModule():
+    global ros, services, servers
+    ros = stand_in_services.install()
+    services, servers = stand_in_services.serve(
+        ros, ["bot_default", "tts_default", "web_default"]
+    )
+
+
+def tearDownModule():
+    stand_in_services.uninstall(servers)
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.name = f"checkpoint_{uuid.uuid4().hex[:8]}"
+        self.checkpoint_dir = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.checkpoint_dir, "pattern.json")
+        for service in services.values():
+            service.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir)
+
+    def _pattern(self, script=SCRIPT):
+        return ros.SequentialPattern(
+            self.name,
+            script,
+            connect_timeout=5,
+            checkpoint_path=self.checkpoint_path,
+        )
+
+    def _start(self, pattern):
+        thread = threading.Thread(target=pattern.start, daemon=True)
+        thread.start()
+        return thread
+
+    def _pause_during_tts(self, pattern):
+        """Starts the pattern and pauses it while the tts runs"""
+        tts = services["tts_default"]
+        tts.release.clear()
+        thread = self._start(pattern)
+        self.assertTrue(tts.called.wait(5))
+        pattern.pause()
+        tts.release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_paused_set_is_resumed_without_the_steps_done(self):
+        pattern = self._pattern()
+        self._pause_during_tts(pattern)
+        self.assertEqual(pattern.state, ros.State.PAUSE)
+        with open(self.checkpoint_path) as read_file:
+            checkpoint = json.load(read_file)
+        self.assertEqual(checkpoint["set"], 0)
+        self.assertEqual(sorted(checkpoint["results"]), ["bot_default", "tts_default"])
+        self.assertEqual(services["web_default"].calls, 0)
+
+        pattern.start()
+        self.assertEqual(
+            [services[s].calls for s in ["bot_default", "tts_default", "web_default"]],
+            [1, 1, 1],
+        )
+        # The script is done, so the next launch starts from the beginning
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_checkpoint_of_another_script_is_ignored(self):
+        pattern = self._pattern()
+        self._pause_during_tts(pattern)
+        with open(self.checkpoint_path) as read_file:
+            checkpoint = json.load(read_file)
+
+        changes = [{"file_hash": "another script"}, {"results": {"stt_default": ""}}]
+        for change in changes:
+            with open(self.checkpoint_path, "w") as write_file:
+                json.dump(dict(checkpoint, **change), write_file)
+            pattern = self._pattern()
+            self.assertEqual(pattern.get_checkpoint()["results"], {})
+
+        with open(self.checkpoint_path, "w") as write_file:
+            json.dump(checkpoint, write_file)
+        pattern = self._pattern()
+        self.assertEqual(
+            sorted(pattern.get_checkpoint()["results"]), ["bot_default", "tts_default"]
+        )
+
+    def test_stop_removes_the_checkpoint(self):
+        pattern = self._pattern()
+        tts = services["tts_default"]
+        tts.release.clear()
+        thread = self._start(pattern)
+        self.assertTrue(tts.called.wait(5))
+        self.assertTrue(os.path.exists(self.checkpoint_path))
+        pattern.stop()
+        # The step finishing after the stop does not write it again
+        tts.release.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        self.assertEqual(services["web_default"].calls, 0)
+
+    def test_resumed_loop_runs_for_the_rest_of_its_duration(self):
+        services["web_default"].latency = 0.1
+        web = step("web_default", "DO", "actuator")
+        script = [{"set": "loop", "duration": 1.0, "steps": [web]}]
+        pattern = self._pattern(script)
+        thread = self._start(pattern)
+        time.sleep(0.6)
+        pattern.pause()
+        thread.join(5)
+        self.assertGreater(pattern.get_checkpoint()["elapsed"], 0.5)
+
+        # About 4 passes of 0.1 s are left, not the 10 of the full duration
+        calls = services["web_default"].calls
+        pattern.start()
+        self.assertLess(services["web_default"].calls - calls, 7)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_checkpoint", TestCheckpoint)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import sys
+import time
+import traceback
+import unittest
+import uuid
+
+PKG = "harmoni_pattern"
+
+# The clients connect through the in-process ROS stand-in, without a roscore
+import stand_in_services
+from stand_in_services import step
+
+SCRIPT = [{"set": "loop", "steps": [step("web_default", "DO", "actuator")]}]
+
+
+def setUpModule():
+    global ros, servers
+    ros = stand_in_services.install()
+    _, servers = stand_in_services.serve(ros, ["web_default"])
+
+
+def tearDownModule():
+    stand_in_services.uninstall(servers)
+
+
+class TestLoops(unittest.TestCase):
+    """The loop of do_steps, with the steps stubbed out"""
+
+    def setUp(self):
+        self.name = f"loop_{uuid.uuid4().hex[:8]}"
+        self.pattern = ros.SequentialPattern(self.name, SCRIPT, connect_timeout=5)
+        self.graph = self.pattern.plan.sets[0].graph
+        self.passes = 0
+        self.step_latency = 0.0
+        self.pattern._run_checkpointed_step = self._run_step
+
+    def _run_step(self, step, passthrough_result):
+        self.passes += 1
+        time.sleep(self.step_latency)
+        return "done"
+
+    def test_loop_stops_after_max_iterations(self):
+        result = self.pattern.do_steps(self.graph, looping=True, max_iterations=7)
+        self.assertEqual(result, "done")
+        self.assertEqual(self.passes, 7)
+        self.assertEqual(self.pattern.loop_iteration, 7)
+        self.assertTrue(self.pattern.set_done)
+
+    def test_loop_stops_at_its_deadline(self):
+        self.step_latency = 0.02
+        start = time.time()
+        self.pattern.do_steps(self.graph, looping=True, deadline=start + 0.3)
+        elapsed = time.time() - start
+        self.assertTrue(self.pattern.set_done)
+        # No pass starts after the deadline
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 0.3 + 10 * self.step_latency)
+        self.assertGreater(self.passes, 1)
+
+    def test_iterations_are_recorded_in_the_metrics(self):
+        self.step_latency = 0.01
+        self.pattern.do_steps(self.graph, looping=True, max_iterations=5)
+        histogram = ros.get_metrics().get_histogram(self.name, "loop", "iteration")
+        self.assertEqual(histogram.count, 5)
+        self.assertGreaterEqual(histogram.mean(), 0.01)
+
+    def test_long_loop_does_not_grow_the_stack(self):
+        depths = set()
+        save_checkpoint = self.pattern._save_checkpoint
+
+        def record_depth():
+            # Called by the loop after each pass
+            depths.add(len(traceback.extract_stack()))
+            save_checkpoint()
+
+        self.pattern._save_checkpoint = record_depth
+        limit = sys.getrecursionlimit()
+        self.pattern.do_steps(self.graph, looping=True, max_iterations=5000)
+        self.assertEqual(self.passes, 5000)
+        self.assertEqual(len(depths), 1)
+        self.assertEqual(sys.getrecursionlimit(), limit)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_loops", TestLoops)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+PKG = "harmoni_pattern"
+
+from harmoni_common_lib.constants import ActionType
+from harmoni_pattern import pattern_compiler
+from harmoni_pattern.pattern_compiler import (
+    PatternError,
+    compile_pattern,
+    get_pattern_path,
+    lint_pattern,
+    load_pattern,
+)
+
+CONFIGURED = {"microphone_default", "stt_default", "bot_default", "tts_default"}
+
+
+class TestPatternCompiler(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_shipped_patterns_compile(self):
+        path = get_pattern_path()
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".json"):
+                plan = load_pattern(os.path.join(path, file_name), cache_dir="")
+                self.assertEqual(plan.name, file_name[:-5])
+
+    def test_plan_is_typed(self):
+        with open(os.path.join(get_pattern_path(), "dialogue.json")) as read_file:
+            plan = compile_pattern(json.load(read_file), "dialogue")
+        self.assertEqual([s.kind for s in plan.sets], ["setup", "sequence", "loop"])
+        bot = plan.sets[1].graph.by_id["bot_default"]
+        self.assertEqual(bot.action_type, ActionType.REQUEST.value)
+        self.assertTrue(bot.wait_for_new)
+        self.assertEqual(
+            plan.detector_topics, {"stt_default": "/harmoni/detecting/stt/default"}
+        )
+
+    def test_errors_and_warnings(self):
+        script = [
+            {
+                "set": "setup",
+                "steps": [
+                    {"tts_default": {"action_goal": "ON", "resource_type": "service"}}
+                ],
+            },
+            {
+                "set": "sequence",
+                "steps": [
+                    {"bot_default": {"action_goal": "ASK", "resource_type": "service"}}
+                ],
+            },
+            {
+                "set": "sequence",
+                "steps": [
+                    {
+                        "face_default": {
+                            "action_goal": "DO",
+                            "resource_type": "actuator",
+                            "wait_for": "v",
+                        }
+                    }
+                ],
+            },
+        ]
+        errors, warnings = lint_pattern(script, CONFIGURED)
+        self.assertEqual(len(errors), 3)
+        self.assertIn("not a sensor or detector", errors[0])
+        self.assertIn("unknown action_goal ASK", errors[1])
+        self.assertIn("face_default is not configured", errors[2])
+        self.assertEqual(len(warnings), 1)
+        with self.assertRaises(PatternError) as raised:
+            compile_pattern(script, "broken", CONFIGURED)
+        self.assertEqual(raised.exception.errors, errors)
+
+    def test_plans_are_cached_by_file_hash(self):
+        path = os.path.join(self.cache_dir, "listening.json")
+        shutil.copy(os.path.join(get_pattern_path(), "listening.json"), path)
+        plan = load_pattern(path, CONFIGURED, self.cache_dir)
+        cached = [f for f in os.listdir(self.cache_dir) if f.endswith(".pickle")]
+        self.assertEqual(len(cached), 1)
+        self.assertEqual(
+            load_pattern(path, CONFIGURED, self.cache_dir).file_hash, plan.file_hash
+        )
+
+        with open(path) as read_file:
+            script = json.load(read_file)
+        script[1]["max_iterations"] = 3
+        with open(path, "w") as write_file:
+            json.dump(script, write_file)
+        plan = load_pattern(path, CONFIGURED, self.cache_dir)
+        self.assertEqual(plan.sets[1].max_iterations, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+    def test_bad_cached_plan_is_compiled_again(self):
+        path = os.path.join(self.cache_dir, "listening.json")
+        shutil.copy(os.path.join(get_pattern_path(), "listening.json"), path)
+        load_pattern(path, CONFIGURED, self.cache_dir)
+        [cached] = [f for f in os.listdir(self.cache_dir) if f.endswith(".pickle")]
+        with open(os.path.join(self.cache_dir, cached), "wb") as write_file:
+            write_file.write(b"not a plan")
+        with self.assertLogs(pattern_compiler.logger, "WARNING"):
+            plan = load_pattern(path, CONFIGURED, self.cache_dir)
+        self.assertEqual(plan.name, "listening")
+        # The bad plan was replaced
+        with open(os.path.join(self.cache_dir, cached), "rb") as read_file:
+            self.assertEqual(pickle.load(read_file).name, "listening")
+
+    def test_plans_of_other_compiler_sources_are_not_loaded(self):
+        path = os.path.join(self.cache_dir, "listening.json")
+        shutil.copy(os.path.join(get_pattern_path(), "listening.json"), path)
+        load_pattern(path, CONFIGURED, self.cache_dir)
+        with mock.patch.object(pattern_compiler, "SOURCE_HASH", "other sources"):
+            load_pattern(path, CONFIGURED, self.cache_dir)
+        cached = [f for f in os.listdir(self.cache_dir) if f.endswith(".pickle")]
+        self.assertEqual(len(cached), 2)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_pattern_compiler", TestPatternCompiler)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import threading
+import time
+import unittest
+
+PKG = "harmoni_pattern"
+
+from harmoni_pattern.pattern_graph import compile_steps, run_graph
+
+PATTERN_PATH = os.path.join(os.path.dirname(__file__), "..", "pattern_scripting")
+
+
+def action(service, **details):
+    details.setdefault("action_goal", "DO")
+    details.setdefault("resource_type", "actuator")
+    details.setdefault("wait_for", "new")
+    return {service: details}
+
+
+class TestPatternGraph(unittest.TestCase):
+    def test_dialogue_keeps_script_order(self):
+        with open(os.path.join(PATTERN_PATH, "dialogue.json")) as read_file:
+            script = json.load(read_file)
+        graph = compile_steps(script[2]["steps"])
+        after = {step.id: step.after for step in graph.steps}
+        self.assertEqual(after["stt_default"], [])
+        self.assertEqual(after["bot_default"], ["stt_default"])
+        self.assertEqual(after["speaker_default"], ["tts_default"])
+        self.assertEqual(after["face_mouth_default"], ["tts_default"])
+        self.assertEqual(
+            [step.id for step in graph.sinks], ["speaker_default", "face_mouth_default"]
+        )
+
+    def test_parallel_results_are_merged(self):
+        graph = compile_steps(
+            [
+                action("tts_default"),
+                [action("speaker_default"), action("face_mouth_default")],
+                action("web_default"),
+            ]
+        )
+        running = set()
+        overlapped = threading.Event()
+        inputs = {}
+
+        def handle_step(step, optional_data):
+            inputs[step.id] = optional_data
+            running.add(step.id)
+            if {"speaker_default", "face_mouth_default"} <= running:
+                overlapped.set()
+            if step.id != "tts_default":
+                overlapped.wait(0.5)
+            time.sleep(0.01)
+            running.discard(step.id)
+            return step.id + "_result"
+
+        result = run_graph(graph, handle_step, optional_data="hello")
+        self.assertTrue(overlapped.is_set())
+        self.assertEqual(inputs["tts_default"], "hello")
+        self.assertEqual(inputs["speaker_default"], "tts_default_result")
+        self.assertEqual(
+            inputs["web_default"],
+            str(
+                {
+                    "speaker_default": "speaker_default_result",
+                    "face_mouth_default": "face_mouth_default_result",
+                }
+            ),
+        )
+        self.assertEqual(result, "web_default_result")
+
+    def test_explicit_edges(self):
+        graph = compile_steps(
+            [
+                action("bot_default", id="bot"),
+                action("web_default", after=[]),
+                action("tts_default", after=["bot"]),
+                action("web_default", after="web_default"),
+            ]
+        )
+        self.assertEqual([step.id for step in graph.roots], ["bot", "web_default"])
+        self.assertEqual(graph.steps[3].id, "web_default:2")
+        with self.assertRaises(ValueError):
+            compile_steps([action("tts_default", after=["bot"])])
+
+        def handle_step(step, optional_data):
+            if step.service == "tts_default":
+                raise RuntimeError("tts failed")
+            return step.id
+
+        with self.assertRaises(RuntimeError):
+            run_graph(graph, handle_step)
+
+    def test_stopped_run_is_resumed(self):
+        graph = compile_steps(
+            [action("stt_default"), action("bot_default"), action("tts_default")]
+        )
+        calls = []
+
+        def handle_step(step, optional_data):
+            calls.append(step.id)
+            return f"{step.id}({optional_data})"
+
+        results = {}
+        run_graph(
+            graph, handle_step, "hi", stop=lambda: len(calls) == 2, results=results
+        )
+        self.assertEqual(list(results), ["stt_default", "bot_default"])
+        result = run_graph(graph, handle_step, "hi", results=results)
+        self.assertEqual(calls, ["stt_default", "bot_default", "tts_default"])
+        self.assertEqual(result, "tts_default(bot_default(stt_default(hi)))")
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_pattern_graph", TestPatternGraph)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import tempfile
+import unittest
+
+PKG = "harmoni_pattern"
+
+# The goals go through the in-process ROS stand-in, without a roscore
+import stand_in_services
+from stand_in_services import step
+
+
+SCRIPT = [
+    {
+        "set": "sequence",
+        "steps": [
+            step("bot_default", trigger="hey"),
+            step("bot_default"),
+            step("web_default", "DO", "actuator"),
+        ],
+    }
+]
+
+CONFIG = """
+harmoni:
+  bot: ["default"]
+  web: ["kiosk1", "kiosk2"]
+"""
+
+SESSIONS = {
+    "kiosk1": {"web_default": "web_kiosk1"},
+    "kiosk2": {"web_default": "web_kiosk2"},
+}
+
+
+def setUpModule():
+    global ros, services, servers, config_path
+    ros = stand_in_services.install()
+
+    # The kiosks are configured in a configuration file of the test
+    fd, config_path = tempfile.mkstemp(suffix=".yaml")
+    with os.fdopen(fd, "w") as file:
+        file.write(CONFIG)
+    ros.config_registry._registry = ros.config_registry.ConfigRegistry(config_path)
+
+    ros.rospy.set_param("bot/default_param/user_id", "harmoni")
+    ros.rospy.set_param("bot/default_param/max_concurrent_goals", 2)
+    services, servers = stand_in_services.serve(
+        ros, ["bot_default", "web_kiosk1", "web_kiosk2"], max_concurrent_goals=2
+    )
+
+
+def tearDownModule():
+    os.remove(config_path)
+    stand_in_services.uninstall(servers)
+
+
+class TestPatternSessionManager(unittest.TestCase):
+    def test_each_session_talks_to_the_bot_as_its_own_user(self):
+        manager = ros.PatternSessionManager(
+            "sessions_test", SCRIPT, SESSIONS, connect_timeout=5
+        )
+        self.assertEqual(list(manager.shared_clients), ["bot_default"])
+        manager.start()
+
+        requests = [json.loads(data) for data in services["bot_default"].received]
+        self.assertEqual(
+            sorted((r["user_id"], r["text"]) for r in requests),
+            [
+                ("harmoni_kiosk1", "bot_default reply"),
+                ("harmoni_kiosk1", "hey"),
+                ("harmoni_kiosk2", "bot_default reply"),
+                ("harmoni_kiosk2", "hey"),
+            ],
+        )
+        # The services of a single session get the plain result
+        self.assertEqual(services["web_kiosk1"].received, ["bot_default reply"])
+        manager.executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_session_manager", TestPatternSessionManager)
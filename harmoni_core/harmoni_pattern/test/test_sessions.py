@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+import json
+import threading
+import time
+import unittest
+
+PKG = "harmoni_pattern"
+
+from harmoni_pattern.pattern_graph import compile_steps
+from harmoni_pattern.sessions import FairExecutor, remap_script
+
+
+def step(service, **details):
+    return {service: dict(details, action_goal="DO", resource_type="actuator")}
+
+
+class TestSessions(unittest.TestCase):
+    def test_remap_script(self):
+        script = [
+            {
+                "set": "sequence",
+                "stream_from": "web_default",
+                "steps": [
+                    step("bot_default"),
+                    step("tts_default"),
+                    [step("web_default"), step("speaker_default", id="say")],
+                    step("web_default", after=["say", "web_default"]),
+                ],
+            }
+        ]
+        service_map = {"web_default": "web_kiosk1", "speaker_default": "speaker_kiosk1"}
+        remapped = remap_script(script, service_map)
+        self.assertIn("web_default", script[0]["steps"][2][0])
+        self.assertEqual(remapped[0]["stream_from"], "web_kiosk1")
+        graph = compile_steps(remapped[0]["steps"])
+        self.assertEqual(
+            graph.get_services(),
+            {"bot_default", "tts_default", "web_kiosk1", "speaker_kiosk1"},
+        )
+        self.assertEqual(graph.by_id["web_kiosk1:2"].after, ["say", "web_kiosk1"])
+
+    def test_remap_script_with_user_ids(self):
+        script = [
+            {
+                "set": "sequence",
+                "steps": [
+                    step("bot_default", trigger="hey"),
+                    step("bot_default"),
+                    step("web_default"),
+                ],
+            }
+        ]
+        user_ids = {"bot_default": "harmoni_kiosk1"}
+        remapped = remap_script(script, {"web_default": "web_kiosk1"}, user_ids)
+        greeting, reply, web = [next(iter(s.values())) for s in remapped[0]["steps"]]
+        self.assertEqual(
+            json.loads(greeting["trigger"]), {"text": "hey", "user_id": "harmoni_kiosk1"}
+        )
+        # The step without a trigger sends its prior result with the user id
+        self.assertEqual(reply["user_id"], "harmoni_kiosk1")
+        self.assertNotIn("trigger", reply)
+        self.assertNotIn("user_id", web)
+        self.assertEqual(script[0]["steps"][0]["bot_default"]["trigger"], "hey")
+
+    def test_sessions_take_turns(self):
+        executor = FairExecutor(1, name="test")
+        busy = executor.lane("busy")
+        other = executor.lane("other")
+        order = []
+        lock = threading.Lock()
+
+        def task(name):
+            time.sleep(0.01)
+            with lock:
+                order.append(name)
+
+        submitted = [busy.submit(task, "busy") for _ in range(5)]
+        submitted.append(other.submit(task, "other"))
+        for future in submitted:
+            future.result(timeout=5)
+        # The task of the other session does not wait for all the busy ones
+        self.assertLess(order.index("other"), 3)
+        executor.shutdown()
+
+    def test_errors_are_raised_by_the_future(self):
+        executor = FairExecutor(2, name="test")
+        future = executor.lane("session").submit(lambda: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            future.result(timeout=5)
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_sessions", TestSessions)
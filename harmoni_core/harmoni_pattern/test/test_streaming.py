@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+import unittest
+
+PKG = "harmoni_pattern"
+
+from harmoni_pattern.pattern_graph import compile_steps
+from harmoni_pattern.streaming import StreamingPipeline, split_sentences
+
+
+class TestStreaming(unittest.TestCase):
+    def test_split_sentences(self):
+        self.assertEqual(
+            split_sentences("*happy_face* Hello there! How are you? Fine. *nod*"),
+            ["*happy_face* Hello there!", "How are you?", "Fine. *nod*"],
+        )
+        self.assertEqual(
+            split_sentences("Wait. *raise_arm 1 2.5* Look."),
+            ["Wait.", "*raise_arm 1 2.5* Look."],
+        )
+        self.assertEqual(split_sentences("No stop at the end"), ["No stop at the end"])
+        self.assertEqual(split_sentences(""), [])
+
+    def test_stages_overlap(self):
+        playing = threading.Event()
+        overlapped = []
+
+        def tts(sentence):
+            overlapped.append(playing.is_set())
+            time.sleep(0.05)
+            return sentence.upper()
+
+        def speaker(audio):
+            playing.set()
+            time.sleep(0.05)
+            playing.clear()
+            return audio + "!"
+
+        pipeline = StreamingPipeline([tts, speaker])
+        outputs = pipeline.run(["a.", "b.", "c.", "d."])
+        self.assertEqual(outputs, ["A.!", "B.!", "C.!", "D.!"])
+        # The tts worked on later sentences while the speaker played
+        self.assertTrue(any(overlapped[1:]))
+        timing = pipeline.get_timing()
+        self.assertLess(timing["first_output"], 0.1)
+        self.assertEqual(len(timing["busy_time"]), 2)
+
+    def test_failure_stops_the_pipeline(self):
+        def tts(sentence):
+            if sentence == "b":
+                raise RuntimeError("tts failed")
+            return sentence
+
+        played = []
+        pipeline = StreamingPipeline([tts, played.append])
+        with self.assertRaises(RuntimeError):
+            pipeline.run(["a", "b", "c", "d"])
+        self.assertNotIn("c", played)
+
+    def test_split_stream(self):
+        def step(service):
+            return {service: {"action_goal": "DO", "resource_type": "actuator"}}
+
+        graph = compile_steps(
+            [
+                step("bot_default"),
+                step("tts_default"),
+                [step("speaker_default"), step("face_mouth_default")],
+            ],
+            stream_from="tts_default",
+        )
+        self.assertEqual([s.id for s in graph.head.steps], ["bot_default"])
+        self.assertEqual(
+            [[s.id for s in stage] for stage in graph.stages],
+            [["tts_default"], ["speaker_default", "face_mouth_default"]],
+        )
+        with self.assertRaises(ValueError):
+            compile_steps([step("tts_default")], stream_from="bot_default")
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_streaming", TestStreaming)
@@ -9,6 +9,10 @@ import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
 from harmoni_common_lib.constants import State, DetectorNameSpace, SensorNameSpace
+from harmoni_common_lib.shared_audio import (
+    SharedAudioSubscriber,
+    check_audio_format,
+)
 from harmoni_stt.deepspeech_client import DeepSpeechClient
 from audio_common_msgs.msg import AudioData
 from std_msgs.msg import String
@@ -44,11 +48,12 @@ class SpeechToTextService(HarmoniServiceManager):
 
         """Set up publishers and subscribers"""
         rospy.Subscriber("/audio/audio", AudioData, self.playing_sound_pause_callback)
-        rospy.Subscriber(
+        SharedAudioSubscriber(
             SensorNameSpace.microphone.value + self.subscriber_id,
             AudioData,
             self.sound_data_callback,
         )
+        check_audio_format(SensorNameSpace.microphone.value + self.subscriber_id, 16000)
         self.text_pub = rospy.Publisher(
             DetectorNameSpace.stt.value + self.service_id, String, queue_size=10
         )
@@ -98,7 +103,7 @@ class SpeechToTextService(HarmoniServiceManager):
         """Callback function subscribing to the microphone topic.
         Passes audio data to the DeepSpeech client.
         """
-        data = np.fromstring(data.data, np.uint8)
+        data = np.frombuffer(data.data, np.uint8)
         if self.state == State.START and self.ds_client.is_streaming:
             self.transcribe_stream(data, self.is_transcribe_once)
 
@@ -11,6 +11,10 @@ import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
 from harmoni_common_lib.constants import State, DetectorNameSpace, SensorNameSpace
+from harmoni_common_lib.shared_audio import (
+    SharedAudioSubscriber,
+    check_audio_format,
+)
 from audio_common_msgs.msg import AudioData
 from google.cloud import speech
 from std_msgs.msg import String
@@ -44,11 +48,16 @@ class SpeechToTextService(HarmoniServiceManager):
 
         """Setup publishers and subscribers"""
         rospy.Subscriber("/audio/audio", AudioData, self.playing_sound_pause_callback)
-        rospy.Subscriber(
+        SharedAudioSubscriber(
             SensorNameSpace.microphone.value + self.subscriber_id,
             AudioData,
             self.sound_data_callback,
         )
+        check_audio_format(
+            SensorNameSpace.microphone.value + self.subscriber_id,
+            self.sample_rate,
+            self.audio_channel,
+        )
         self.text_pub = rospy.Publisher(
             DetectorNameSpace.stt.value + self.service_id, String, queue_size=10
         )
@@ -102,7 +111,7 @@ class SpeechToTextService(HarmoniServiceManager):
 
     def sound_data_callback(self, data):
         """ Callback function subscribing to the microphone topic"""
-        data = np.fromstring(data.data, np.uint8)
+        data = np.frombuffer(data.data, np.uint8)
         # self.data = self.data.join(data)
         # self.data = data.data
         if self.state == State.START:
@@ -164,8 +173,8 @@ class SpeechToTextService(HarmoniServiceManager):
         except rospy.ServiceException:
             self.start = State.FAILED
             rospy.loginfo("Service call failed")
-            self.response_received = True
             self.result_msg = ""
+            self.response_received = True
         return
 
     def request(self, input_data):
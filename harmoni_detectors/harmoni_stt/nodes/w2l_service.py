@@ -11,6 +11,10 @@ import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
 from harmoni_common_lib.constants import DetectorNameSpace, SensorNameSpace
+from harmoni_common_lib.shared_audio import (
+    SharedAudioSubscriber,
+    check_audio_format,
+)
 from audio_common_msgs.msg import AudioData
 from std_msgs.msg import String
 from subprocess import Popen, PIPE
@@ -43,11 +47,12 @@ class SpeechToTextService(HarmoniServiceManager):
 
         """Setup publishers and subscribers"""
         rospy.Subscriber("/audio/audio", AudioData, self.playing_sound_pause_callback)
-        rospy.Subscriber(
+        SharedAudioSubscriber(
             SensorNameSpace.microphone.value + self.subscriber_id,
             AudioData,
             self.sound_data_callback,
         )
+        check_audio_format(SensorNameSpace.microphone.value + self.subscriber_id, 16000)
         self.text_pub = rospy.Publisher(
             DetectorNameSpace.stt.value + self.service_id, String, queue_size=10
         )
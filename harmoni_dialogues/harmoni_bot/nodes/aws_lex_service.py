@@ -5,13 +5,17 @@ import rospy
 import roslib
 
 from harmoni_common_lib.constants import State
-from harmoni_common_lib.service_server import HarmoniServiceServer
+from harmoni_common_lib.service_server import (
+    HarmoniServiceServer,
+    HarmoniConcurrentServiceServer,
+)
 from harmoni_common_lib.service_manager import HarmoniServiceManager
 import harmoni_common_lib.helper_functions as hf
 
 # Specific Imports
 from harmoni_common_lib.constants import DialogueNameSpace
 import boto3
+import json
 
 
 class AWSLexService(HarmoniServiceManager):
@@ -46,7 +50,9 @@ class AWSLexService(HarmoniServiceManager):
         """[summary]
 
         Args:
-            input_text (str): User request (or input text) for triggering Lex Intent
+            input_text (str): User request (or input text) for triggering Lex Intent,
+                or a json object with the "text" and the "user_id" of the
+                conversation, for clients sharing the service
 
         Returns:
             object: It containes information about the response received (bool) and response message (str)
@@ -54,40 +60,47 @@ class AWSLexService(HarmoniServiceManager):
                 message: str
         """
         rospy.loginfo("Start the %s request" % self.name)
-        self.state = State.REQUEST
-        textdata = input_text
-        result = {"response": False, "message": None}
+        if not self.concurrent_goals:
+            self.state = State.REQUEST
+        textdata, user_id = self._get_text_and_user(input_text)
+        state, message = State.FAILED, ""
         try:
             lex_response = self.lex_client.post_content(
                 botName=self.bot_name,
                 botAlias=self.bot_alias,
-                userId=self.user_id,
+                userId=user_id,
                 contentType="text/plain; charset=utf-8",
                 accept="text/plain; charset=utf-8",
                 inputStream=textdata,
             )
             rospy.loginfo(f"The lex response is {lex_response}")
             if lex_response["ResponseMetadata"]["HTTPStatusCode"] == 200:
-                self.state = State.SUCCESS
                 if "intentName" in lex_response:
                     if lex_response["dialogState"] == "Fulfilled":
                         rospy.loginfo(
                             "The dialogue is fulfilled, end the conversation."
                         )
                 rospy.loginfo("The response is %s" % (lex_response["message"]))
-                self.response_received = True
-                self.result_msg = lex_response["message"]
+                state, message = State.SUCCESS, lex_response["message"]
             else:
-                self.start = State.FAILED
                 rospy.loginfo("Service call failed")
-                self.response_received = True
-                self.result_msg = ""
         except rospy.ServiceException:
-            self.start = State.FAILED
             rospy.loginfo("Service call failed")
+        if not self.concurrent_goals:
+            self.state = state
+            self.result_msg = message
             self.response_received = True
-            self.result_msg = ""
-        return {"response": self.state, "message": self.result_msg}
+        return {"response": state, "message": message}
+
+    def _get_text_and_user(self, input_text):
+        """Returns the text of a request and the user id of its conversation"""
+        try:
+            data = json.loads(input_text)
+        except (TypeError, ValueError):
+            return input_text, self.user_id
+        if not isinstance(data, dict) or "text" not in data:
+            return input_text, self.user_id
+        return data["text"], data.get("user_id", self.user_id)
 
 
 def main():
@@ -101,7 +114,13 @@ def main():
         rospy.init_node(service_name, log_level=rospy.DEBUG)
         params = rospy.get_param(service_name + "/" + instance_id + "_param/")
         s = AWSLexService(service_id, params)
-        service_server = HarmoniServiceServer(service_id, s)
+        if params.get("max_concurrent_goals", 1) > 1:
+            # Serve several patterns at once instead of preempting
+            service_server = HarmoniConcurrentServiceServer(
+                service_id, s, max_workers=params["max_concurrent_goals"]
+            )
+        else:
+            service_server = HarmoniServiceServer(service_id, s)
         service_server.start_sending_feedback()
         rospy.spin()
     except rospy.ROSInterruptException:
@@ -71,8 +71,8 @@ class GoogleService(HarmoniServiceManager):
             rospy.loginfo(
                 "The response is %s" % (google_response.query_result.fulfillment_text)
             )
-            self.response_received = True
             self.result_msg = google_response.query_result.fulfillment_text
+            self.response_received = True
         except rospy.ServiceException:
             self.start = State.FAILED
             rospy.loginfo("Service call failed")
@@ -11,10 +11,26 @@ import harmoni_common_lib.helper_functions as hf
 
 # Other Imports
 from harmoni_common_lib.constants import SensorNameSpace
+from harmoni_common_lib.result_queue import ResultQueue
+from harmoni_common_lib.shared_audio import (
+    SharedAudioPublisher,
+    SharedAudioSubscriber,
+    set_audio_format,
+)
+from harmoni_microphone.channels import (
+    LAYOUTS,
+    mixdown,
+    split_channels,
+    to_interleaved,
+    to_planar,
+)
+from harmoni_microphone.resample import FormatNormalizer
+from harmoni_microphone.vad import EnergyVAD, SpeechGate
 from audio_common_msgs.msg import AudioData
+import math
 import pyaudio
+import threading
 import wave
-import numpy as np
 
 
 class MicrophoneService(HarmoniServiceManager):
@@ -26,6 +42,23 @@ class MicrophoneService(HarmoniServiceManager):
 
     The microphone has many parameters which are set in the configuration.yaml
 
+    The audio device pushes each chunk it records to a bounded buffer (PyAudio
+    callback mode), and a publishing thread sends the raw bytes of the chunks as
+    soon as they arrive. Reads are thus paced by the device, at audio_rate /
+    chunk_size chunks per second, and no chunk is converted before publishing.
+
+    With the vad parameter, only the chunks of speech are published (see
+    SpeechGate), and the audio of each utterance is published once it ends on
+    the utterance topic, so that the detectors only process speech.
+
+    The chunks of a multi-channel microphone are interleaved, or planar with
+    the channel_layout parameter. Each channel can also be published on its
+    own topic, and a mono mix of some channels on the mono topic, so that the
+    subscribers do not convert each chunk themselves. For the same reason, the
+    mono mix is converted once to the rate and sample format of each kind of
+    detector in normalized_outputs, e.g. 16 kHz int16 for DeepSpeech, and
+    published on a topic shared by all of them.
+
     The public functions exposed by the microphone include start(), stop(), and pause()
     """
 
@@ -39,6 +72,20 @@ class MicrophoneService(HarmoniServiceManager):
         self.audio_rate = param["audio_rate"]
         self.device_name = param["device_name"]
         self.file_path = param["test_outdir"]
+        # Chunks held while the publisher is behind; the oldest are dropped
+        self.buffer_size = param.get("buffer_size", 32)
+        self.vad = param.get("vad", False)
+        self.shared_memory = param.get("shared_memory", False)
+        self.shared_memory_slots = param.get("shared_memory_slots", 64)
+        self.channel_layout = param.get("channel_layout", "interleaved")
+        if self.channel_layout not in LAYOUTS:
+            raise ValueError(f"channel_layout {self.channel_layout} not in {LAYOUTS}")
+        self.channel_topics = param.get("channel_topics", False)
+        self.mixdown = param.get("mixdown", False)
+        # Channels averaged in the mono mix, None for all
+        self.mixdown_channels = param.get("mixdown_channels")
+        # e.g. [{"rate": 16000, "format": "int16"}]
+        self.normalized_outputs = param.get("normalized_outputs", [])
 
         self.first_audio_frame = True  # When recording, the first frame is special
 
@@ -50,19 +97,89 @@ class MicrophoneService(HarmoniServiceManager):
         # TODO: How can we trasform audio_format as an a input parameter?/should we?
         self.audio_format = pyaudio.paInt16
         self.stream = None
+        self.audio_buffer = ResultQueue(maxlen=self.buffer_size)
+        self.overflows = 0  # chunks lost by the device before reaching the buffer
+        self.publish_thread = None
         self.setup_microphone()
 
         """ Init the publishers """
         self.microphone_topic = SensorNameSpace.microphone.value + self.service_id
-        self.raw_mic_pub = rospy.Publisher(
-            self.microphone_topic, AudioData, queue_size=1
+        chunk_bytes = self.chunk_size * self.audio_format_width
+        self.raw_mic_pub = self._get_audio_publisher(
+            self.microphone_topic, chunk_bytes * self.total_channels
         )
+        set_audio_format(
+            self.microphone_topic,
+            self.audio_rate,
+            self.total_channels,
+            layout=self.channel_layout,
+        )
+        self.channel_pubs = []
+        if self.channel_topics:
+            for i in range(self.total_channels):
+                topic = self.microphone_topic + f"/channel_{i}"
+                self.channel_pubs.append(self._get_audio_publisher(topic, chunk_bytes))
+                set_audio_format(topic, self.audio_rate)
+        self.mono_pub = None
+        if self.mixdown:
+            self.mono_pub = self._get_audio_publisher(
+                self.microphone_topic + "/mono", chunk_bytes
+            )
+            set_audio_format(self.microphone_topic + "/mono", self.audio_rate)
+        self.normalized_pubs = []
+        for output in self.normalized_outputs:
+            sample_format = output.get("format", "int16")
+            topic = self.microphone_topic + f"/{sample_format}_{output['rate']}"
+            normalizer = FormatNormalizer(
+                self.audio_rate, output["rate"], sample_format
+            )
+            # A sample more than the ratio, depending on the phase of the chunk
+            samples = math.ceil(self.chunk_size * output["rate"] / self.audio_rate) + 1
+            width = 4 if sample_format == "float32" else 2
+            pub = self._get_audio_publisher(topic, samples * width)
+            self.normalized_pubs.append((normalizer, pub))
+            set_audio_format(topic, output["rate"], sample_format=sample_format)
+        self.speech_gate = None
+        if self.vad:
+            chunk_duration = self.chunk_size / self.audio_rate
+            self.speech_gate = SpeechGate(
+                EnergyVAD(
+                    param.get("vad_threshold", 10.0),
+                    param.get("vad_min_level", -55.0),
+                    math.ceil(param.get("vad_noise_window", 5.0) / chunk_duration),
+                ),
+                chunk_duration,
+                pre_roll=param.get("vad_pre_roll", 0.3),
+                hangover=param.get("vad_hangover", 0.8),
+                min_speech=param.get("vad_min_speech", 0.1),
+                max_utterance=param.get("vad_max_utterance", 15.0),
+            )
+            self.utterance_pub = rospy.Publisher(
+                self.microphone_topic + "/utterance", AudioData, queue_size=10
+            )
 
         self.state = State.INIT
         return
 
+    def _get_audio_publisher(self, topic, chunk_bytes):
+        """Returns the publisher of a topic of audio chunks of up to chunk_bytes"""
+        if not self.shared_memory:
+            return rospy.Publisher(topic, AudioData, queue_size=1)
+        # Local subscribers read the chunks from shared memory
+        return SharedAudioPublisher(
+            topic,
+            AudioData,
+            chunk_bytes,
+            slots=self.shared_memory_slots,
+            queue_size=1,
+        )
+
     def start(self):
-        """Start the microphone stream and publish audio"""
+        """Start the microphone stream and publish audio
+
+        Returns once the publishing thread is started, so that a stop or pause
+        goal can be handled while the microphone publishes.
+        """
         rospy.loginfo("Start the %s service" % self.name)
         if (
             self.state == State.INIT
@@ -71,10 +188,15 @@ class MicrophoneService(HarmoniServiceManager):
         ):
             self.state = State.START
             self._open_stream()  # TODO handle possible exception from this
-            self._read_stream_and_publish()
+            self._start_publishing()
         elif self.state == State.PAUSE:
             self.state = State.START
-            self._read_stream_and_publish()
+            if self.stream is None:
+                self._open_stream()  # paused before it was ever started
+            else:
+                self.audio_buffer.drain()  # Audio of before the pause is stale
+                self.stream.start_stream()
+            self._start_publishing()
         else:
             rospy.loginfo("Trying to start stream when already started")
             self.state = State.START
@@ -84,18 +206,27 @@ class MicrophoneService(HarmoniServiceManager):
         """Stop the service and close the stream"""
         rospy.loginfo("Stop the %s service" % self.name)
         try:
-            self._close_stream()
             self.state = State.SUCCESS
+            self._stop_publishing()
+            self._close_stream()
         except Exception:
             self.state = State.FAILED
         return
 
     def pause(self):
-        """Set the service to success to stop publishing"""
+        """Stop publishing and recording, keeping the stream open"""
         rospy.loginfo("Pause the %s service" % self.name)
         self.state = State.PAUSE
+        self._stop_publishing()
+        if self.stream:
+            self.stream.stop_stream()
         return
 
+    def get_stats(self):
+        """Returns the chunks buffered, and dropped by the device (overflows)
+        or by the buffer when publishing fell behind"""
+        return dict(self.audio_buffer.get_stats(), overflows=self.overflows)
+
     def setup_microphone(self):
         """ Setup the microphone """
         rospy.loginfo("Setting up the %s" % self.name)
@@ -106,6 +237,7 @@ class MicrophoneService(HarmoniServiceManager):
         """Open the microphone audio stream with configured params """
         rospy.loginfo("Opening the audio input stream")
 
+        self.audio_buffer.drain()
         self.stream = self.p.open(
             format=self.audio_format,
             channels=self.total_channels,
@@ -113,43 +245,102 @@ class MicrophoneService(HarmoniServiceManager):
             input=True,
             input_device_index=self.input_device_index,
             frames_per_buffer=self.chunk_size,
+            stream_callback=self._stream_callback,
         )
         return
 
     def _close_stream(self):
         """ When possibly, the pyaudio stream object should be closed """
+        if self.stream is None:
+            return
         self.stream.stop_stream()
         self.stream.close()
+        self.stream = None
+        rospy.loginfo(f"Closed the audio input stream: {self.get_stats()}")
+        return
+
+    def _stream_callback(self, in_data, frame_count, time_info, status):
+        """Called by PyAudio on its own thread with each chunk recorded"""
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        self.audio_buffer.put(in_data)
+        return None, pyaudio.paContinue
+
+    def _start_publishing(self):
+        """Start the thread publishing the buffered audio"""
+        if self.publish_thread and self.publish_thread.is_alive():
+            return
+        for normalizer, _ in self.normalized_pubs:
+            normalizer.reset()  # The audio before does not follow on
+        if self.speech_gate:
+            self.speech_gate.reset()  # Nor starts the next utterance
+        self.publish_thread = threading.Thread(
+            target=self._read_stream_and_publish, daemon=True
+        )
+        self.publish_thread.start()
+        return
+
+    def _stop_publishing(self):
+        """Wait for the publishing thread to end, once the state is not START"""
+        self.audio_buffer.wake()
+        if self.publish_thread:
+            self.publish_thread.join()
+        self.publish_thread = None
         return
 
     def _read_stream_and_publish(self):
         """Continously publish audio data from the microphone
 
-        While state is START publish audio
+        While state is START publish each chunk as it is recorded, as raw bytes
         """
-        r = rospy.Rate(10)
         rospy.loginfo("The %s is listening" % self.name)
-        while not rospy.is_shutdown():
-            if self.state == State.INIT:
-                r.sleep()
-            elif self.state == State.START:
-                latest_audio_data = self.stream.read(
-                    self.chunk_size, exception_on_overflow=False
-                )
-                raw_audio_bitstream = np.fromstring(latest_audio_data, np.uint8)
-                raw_audio = raw_audio_bitstream.tolist()
-                self.raw_mic_pub.publish(raw_audio)  # Publishing raw AudioData
-            elif (
-                self.state == State.SUCCESS
-                or self.state == State.FAILED
-                or self.state == State.PAUSE
-            ):
-                break
-            r.sleep()
-
+        stopped = lambda: self.state != State.START or rospy.is_shutdown()
+        while not stopped():
+            # The timeout lets the thread notice a rospy shutdown
+            chunk = self.audio_buffer.get_new(0, timeout=1, stop=stopped)
+            if chunk is None:
+                continue
+            if self.speech_gate is None:
+                self._publish_chunk(chunk["data"])
+                continue
+            speech, utterance = self.speech_gate.process(chunk["data"])
+            for speech_chunk in speech:
+                self._publish_chunk(speech_chunk)
+            if utterance:
+                self._publish_utterance(utterance)
+
+        if self.speech_gate and self.speech_gate.in_utterance:
+            self._publish_utterance(self.speech_gate.flush())
         rospy.loginfo("Shutting down")
         return
 
+    def _publish_chunk(self, data):
+        """Publish an interleaved chunk in the channel layout, and on the
+        channel and mono topics"""
+        if self.channel_layout == "planar":
+            self.raw_mic_pub.publish(
+                AudioData(data=to_planar(data, self.total_channels))
+            )
+        else:
+            self.raw_mic_pub.publish(AudioData(data=data))
+        if self.channel_pubs:
+            channels = split_channels(data, self.total_channels)
+            for pub, channel in zip(self.channel_pubs, channels):
+                pub.publish(AudioData(data=channel))
+        if self.mono_pub or self.normalized_pubs:
+            mono = mixdown(data, self.total_channels, self.mixdown_channels)
+        if self.mono_pub:
+            self.mono_pub.publish(AudioData(data=mono))
+        for normalizer, pub in self.normalized_pubs:
+            pub.publish(AudioData(data=normalizer.process(mono)))
+        return
+
+    def _publish_utterance(self, data):
+        if self.channel_layout == "planar":
+            data = to_planar(data, self.total_channels)
+        self.utterance_pub.publish(AudioData(data=data))
+        return
+
     def _get_device_index(self):
         """
         Find the input audio devices configured in ~/.asoundrc.
@@ -172,7 +363,7 @@ class MicrophoneService(HarmoniServiceManager):
         """
         rospy.loginfo(f"Start recording to {self.file_path}")
 
-        self.mic_sub = rospy.Subscriber(
+        self.mic_sub = SharedAudioSubscriber(
             self.microphone_topic,
             AudioData,
             self._record_audio_data_callback,
@@ -182,17 +373,19 @@ class MicrophoneService(HarmoniServiceManager):
 
     def _record_audio_data_callback(self, data):
         """Callback function to write data"""
-        data = np.fromstring(data.data, np.uint8)
+        data = data.data
+        if self.channel_layout == "planar":
+            data = to_interleaved(data, self.total_channels)
         if self.first_audio_frame:
             self.wf = wave.open(self.file_path, "wb")
             self.wf.setnchannels(self.total_channels)
             self.wf.setsampwidth(self.p.get_sample_size(self.audio_format))
             self.wf.setframerate(self.audio_rate)
             self.wf.setnframes(self.chunk_size)
-            self.wf.writeframes(b"".join(data))
+            self.wf.writeframes(data)
             self.first_audio_frame = False
         else:
-            self.wf.writeframes(b"".join(data))
+            self.wf.writeframes(data)
         return
 
 
@@ -6,8 +6,8 @@ from catkin_pkg.python_setup import generate_distutils_setup
 # fetch values from package.xml
 setup_args = generate_distutils_setup(
     # scripts=[''],
-    # packages=['harmoni_microphone'],
-    # package_dir={'': 'src'},
+    packages=['harmoni_microphone'],
+    package_dir={'': 'src'},
 )
 
 setup(**setup_args)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import numpy as np
+
+LAYOUTS = ("interleaved", "planar")
+
+
+def _frames(chunk, channels):
+    """Returns the samples of a chunk of interleaved int16 audio, one row per frame"""
+    return np.frombuffer(chunk, np.int16).reshape(-1, channels)
+
+
+def to_planar(chunk, channels):
+    """Returns a chunk with the samples of each channel one after the other
+
+    The planar chunk of channels c0, c1 is c0 c0 c0 ... c1 c1 c1 ..., which
+    np.frombuffer(chunk, np.int16).reshape(channels, -1) reads as one row per
+    channel, without de-interleaving.
+
+    Args:
+        chunk (bytes): interleaved int16 audio
+        channels (int): number of channels
+
+    Returns:
+        bytes: the planar chunk
+    """
+    if channels == 1:
+        return chunk
+    return _frames(chunk, channels).T.tobytes()
+
+
+def to_interleaved(chunk, channels):
+    """Returns the interleaved chunk of a planar one (see to_planar())"""
+    if channels == 1:
+        return chunk
+    return np.frombuffer(chunk, np.int16).reshape(channels, -1).T.tobytes()
+
+
+def split_channels(chunk, channels):
+    """Returns the int16 audio of each channel of an interleaved chunk
+
+    Returns:
+        list: a chunk (bytes) per channel
+    """
+    if channels == 1:
+        return [chunk]
+    # One copy for all the channels, then each is a contiguous row
+    planar = np.ascontiguousarray(_frames(chunk, channels).T)
+    return [row.tobytes() for row in planar]
+
+
+def mixdown(chunk, channels, select=None):
+    """Returns the mono average of some channels of an interleaved chunk
+
+    Args:
+        chunk (bytes): interleaved int16 audio
+        channels (int): number of channels
+        select (list, optional): indexes of the channels mixed, e.g. [2] to
+            pick a single channel. Defaults to all the channels.
+
+    Returns:
+        bytes: the mono int16 audio
+    """
+    frames = _frames(chunk, channels)
+    if select is not None:
+        frames = frames[:, select]
+    if frames.shape[1] == 1:
+        return frames[:, 0].tobytes()
+    mixed = frames.sum(axis=1, dtype=np.int32) // frames.shape[1]
+    return mixed.astype(np.int16).tobytes()
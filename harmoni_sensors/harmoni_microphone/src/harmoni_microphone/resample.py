@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+FORMATS = ("int16", "float32")
+
+
+class Resampler(object):
+    """Converts mono audio from one rate to another, chunk by chunk
+
+    A polyphase filter resamples by up / down, the rates divided by their
+    greatest common divisor (160 / 441 from 44.1 kHz to 16 kHz). The filter is
+    a Kaiser-windowed sinc, cut below the lower Nyquist frequency so that the
+    frequencies above it do not alias. Each chunk is filtered at once: the
+    input window of every output sample is gathered and multiplied with the
+    coefficients of its phase. The last input samples are kept for the next
+    chunk, so the output does not depend on how the input is split in chunks.
+    """
+
+    def __init__(self, in_rate, out_rate, taps=16, cutoff=0.9):
+        """
+        Args:
+            in_rate (int): rate of the input, in Hz
+            out_rate (int): rate of the output, in Hz
+            taps (int, optional): input samples per output sample, when
+                upsampling; more when downsampling. Defaults to 16.
+            cutoff (float, optional): cutoff, as a fraction of the lower Nyquist
+                frequency. Defaults to 0.9.
+        """
+        gcd = math.gcd(in_rate, out_rate)
+        self.up = out_rate // gcd
+        self.down = in_rate // gcd
+        self.taps = math.ceil(taps * max(1.0, self.down / self.up))
+        length = self.up * self.taps
+        band = cutoff / max(self.up, self.down)
+        t = np.arange(length) - (length - 1) / 2
+        h = band * np.sinc(band * t) * np.kaiser(length, 8.0)
+        h *= self.up / h.sum()
+        # phases[p] multiplies x[n - taps + 1] ... x[n] for the outputs of phase p
+        self.phases = h.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32)
+        self.reset()
+        return
+
+    def reset(self):
+        """Forgets the audio before, e.g. when the stream is restarted"""
+        self.history = np.zeros(self.taps - 1, np.float32)
+        self.position = 0  # next output, in upsampled samples from the chunk start
+        return
+
+    def process(self, samples):
+        """Resamples a chunk
+
+        Args:
+            samples (np.ndarray): mono samples at the input rate
+
+        Returns:
+            np.ndarray: float32 samples at the output rate
+        """
+        if self.up == self.down:
+            return samples.astype(np.float32)
+        buffer = np.concatenate((self.history, samples.astype(np.float32)))
+        end = len(samples) * self.up
+        positions = np.arange(self.position, end, self.down)
+        inputs, phases = np.divmod(positions, self.up)
+        windows = sliding_window_view(buffer, self.taps)[inputs]
+        output = np.einsum("ij,ij->i", windows, self.phases[phases])
+        if len(positions):
+            self.position = positions[-1] + self.down - end
+        else:
+            self.position -= end
+        self.history = buffer[len(buffer) - self.taps + 1 :]
+        return output
+
+
+class FormatNormalizer(object):
+    """Converts mono int16 chunks to the rate and sample format of a consumer"""
+
+    def __init__(self, in_rate, out_rate, sample_format="int16"):
+        """
+        Args:
+            in_rate (int): rate of the input, in Hz
+            out_rate (int): rate of the output, in Hz
+            sample_format (str, optional): "int16", or "float32" between -1
+                and 1. Defaults to "int16".
+        """
+        if sample_format not in FORMATS:
+            raise ValueError(f"Sample format {sample_format} not in {FORMATS}")
+        self.sample_format = sample_format
+        self.resampler = Resampler(in_rate, out_rate)
+        return
+
+    def reset(self):
+        self.resampler.reset()
+        return
+
+    def process(self, chunk):
+        """Converts a chunk of mono int16 audio
+
+        Returns:
+            bytes: the audio in the output rate and format
+        """
+        output = self.resampler.process(np.frombuffer(chunk, np.int16))
+        if self.sample_format == "float32":
+            return (output / 32768).astype(np.float32).tobytes()
+        return np.clip(np.rint(output), -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+# Importing the libraries
+import math
+from collections import deque
+
+import numpy as np
+
+
+class EnergyVAD(object):
+    """Tells the chunks of speech from silence by their energy
+
+    A chunk is speech when its level (dBFS) is threshold dB above the noise
+    floor. The floor is the lowest level of the last window chunks, as speech
+    has pauses but noise does not: it falls at once when the room gets quieter,
+    and a fan turned on is taken for noise once it ran for a window.
+    """
+
+    def __init__(self, threshold=10.0, min_level=-55.0, window=80):
+        """
+        Args:
+            threshold (float, optional): dB above the noise floor for speech.
+                Defaults to 10.0.
+            min_level (float, optional): lowest noise floor (dBFS), which keeps
+                a digitally silent input from making any sound speech.
+                Defaults to -55.0.
+            window (int, optional): chunks over which the floor is the lowest
+                level. Defaults to 80.
+        """
+        self.threshold = threshold
+        self.min_level = min_level
+        self.levels = deque(maxlen=window)
+        return
+
+    @property
+    def noise_floor(self):
+        return min(self.levels, default=self.min_level)
+
+    @staticmethod
+    def get_level(chunk):
+        """Returns the RMS level of a chunk of int16 audio, in dBFS"""
+        samples = np.frombuffer(chunk, np.int16).astype(np.float32)
+        if not samples.size:
+            return -math.inf
+        rms = math.sqrt(float(np.dot(samples, samples)) / samples.size)
+        return 20 * math.log10(max(rms, 1.0) / 32768)
+
+    def is_speech(self, chunk):
+        """Returns whether a chunk is speech, updating the noise floor"""
+        level = max(self.get_level(chunk), self.min_level)
+        speech = level > self.noise_floor + self.threshold
+        self.levels.append(level)
+        return speech
+
+
+class SpeechGate(object):
+    """Passes the chunks of speech of an audio stream and splits them into utterances
+
+    An utterance starts after min_speech seconds of speech, preceded by the
+    pre_roll seconds of audio before it so that its first syllable is not cut.
+    It ends after hangover seconds of silence, which are passed too, or once it
+    lasts max_utterance seconds.
+    """
+
+    def __init__(
+        self,
+        vad,
+        chunk_duration,
+        pre_roll=0.3,
+        hangover=0.8,
+        min_speech=0.1,
+        max_utterance=15.0,
+    ):
+        """
+        Args:
+            vad (EnergyVAD): tells whether a chunk is speech
+            chunk_duration (float): seconds of audio in a chunk
+            pre_roll (float, optional): seconds passed before the speech.
+                Defaults to 0.3.
+            hangover (float, optional): seconds of silence ending an utterance.
+                Defaults to 0.8.
+            min_speech (float, optional): seconds of speech starting an utterance.
+                Defaults to 0.1.
+            max_utterance (float, optional): seconds after which an utterance is
+                ended. Defaults to 15.0.
+        """
+        self.vad = vad
+        self.onset_chunks = max(1, math.ceil(min_speech / chunk_duration))
+        self.hangover_chunks = max(1, math.ceil(hangover / chunk_duration))
+        self.max_chunks = max(1, math.ceil(max_utterance / chunk_duration))
+        # Chunks before the utterance: the pre-roll and the speech starting it
+        self.pending = deque(
+            maxlen=math.ceil(pre_roll / chunk_duration) + self.onset_chunks
+        )
+        self.reset()
+        return
+
+    @property
+    def in_utterance(self):
+        return self.utterance is not None
+
+    def reset(self):
+        """Drops the audio held, e.g. when the stream is restarted"""
+        self.pending.clear()
+        self.speech_count = 0  # speech chunks in a row, before an utterance
+        self.silence_count = 0  # silent chunks in a row, in an utterance
+        self.utterance = None  # chunks of the current utterance
+        return
+
+    def process(self, chunk):
+        """Passes a chunk of audio through the gate
+
+        Args:
+            chunk (bytes): int16 audio
+
+        Returns:
+            tuple: the chunks of speech to publish (list of bytes), and the
+                audio of the utterance ended by this chunk (bytes) or None
+        """
+        speech = self.vad.is_speech(chunk)
+        if self.utterance is None:
+            self.pending.append(chunk)
+            self.speech_count = self.speech_count + 1 if speech else 0
+            if self.speech_count < self.onset_chunks:
+                return [], None
+            self.utterance = list(self.pending)
+            self.pending.clear()
+            self.silence_count = 0
+            return list(self.utterance), None
+
+        self.utterance.append(chunk)
+        self.silence_count = 0 if speech else self.silence_count + 1
+        if (
+            self.silence_count >= self.hangover_chunks
+            or len(self.utterance) >= self.max_chunks
+        ):
+            return [chunk], self.flush()
+        return [chunk], None
+
+    def flush(self):
+        """Ends the current utterance
+
+        Returns:
+            bytes: the audio of the utterance, None if there is none
+        """
+        utterance = self.utterance
+        self.reset()
+        return b"".join(utterance) if utterance else None
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the CPU use and the dropped audio of the microphone service.
+
+The microphone records from a simulated device, which produces a chunk of
+chunk_size frames every chunk_size / audio_rate seconds, in real time, and
+holds a few chunks (--device-buffer) before overflowing, as a sound card does.
+Two ways of publishing are compared at each rate:
+
+- legacy: a blocking read at most every 0.1 s (rospy.Rate(10)), each chunk
+  converted to a list of ints before publishing, as the service used to do
+- device-paced: MicrophoneService, whose PyAudio callback buffers the chunks
+  as the device records them and whose thread publishes their raw bytes
+
+A subscriber receives the audio and turns it into bytes, as the serialization
+of the message would. The CPU use is the CPU time of the whole process over the
+wall time (100% is one core), including the simulated device and subscriber,
+which are the same for both. Dropped chunks are the chunks recorded by the
+device that the subscriber never received.
+
+The benchmark runs against the in-process ROS stand-in, so no roscore or
+sound card are needed:
+
+    python3 benchmark_microphone.py --rates 16000 44100 --duration 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+import numpy as np
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    0, os.path.join(TEST_DIR, "../../../harmoni_core/harmoni_common_lib/test")
+)
+import ros_stand_in
+
+ros_stand_in.install(log_level="ERROR")
+
+SAMPLE_WIDTH = 2  # paInt16
+PA_CONTINUE = 0
+PA_INPUT_OVERFLOW = 2
+
+
+class SimulatedStream(object):
+    """An input stream of PyAudio recording in real time"""
+
+    def __init__(
+        self,
+        rate,
+        channels,
+        frames_per_buffer,
+        stream_callback=None,
+        device_buffer=4,
+        **kwargs,
+    ):
+        self.chunk = os.urandom(frames_per_buffer * channels * SAMPLE_WIDTH)
+        self.frame_count = frames_per_buffer
+        self.period = frames_per_buffer / rate
+        self.callback = stream_callback
+        self.device_buffer = device_buffer
+        self.buffered = deque()  # chunks waiting for read(), in blocking mode
+        self.condition = threading.Condition()
+        self.recorded = 0
+        self.overflowed = 0
+        self.active = threading.Event()
+        self.thread = None
+        self.start_stream()
+
+    def start_stream(self):
+        if self.active.is_set():
+            return
+        self.active.set()
+        self.thread = threading.Thread(target=self._record, daemon=True)
+        self.thread.start()
+
+    def stop_stream(self):
+        self.active.clear()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join()
+        self.thread = None
+
+    def close(self):
+        self.stop_stream()
+
+    def read(self, num_frames, exception_on_overflow=True):
+        with self.condition:
+            while not self.buffered and self.active.is_set():
+                self.condition.wait()
+            return self.buffered.popleft() if self.buffered else self.chunk
+
+    def _record(self):
+        due = time.perf_counter()
+        while self.active.is_set():
+            due += self.period
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.recorded += 1
+            if self.callback is None:
+                with self.condition:
+                    self.buffered.append(self.chunk)
+                    if len(self.buffered) > self.device_buffer:
+                        self.buffered.popleft()
+                        self.overflowed += 1
+                    self.condition.notify()
+                continue
+            # The chunks recorded while the callback was late beyond the
+            # device buffer are lost
+            status = 0
+            late = int((time.perf_counter() - due) / self.period)
+            if late >= self.device_buffer:
+                self.recorded += late
+                self.overflowed += late
+                due += late * self.period
+                status = PA_INPUT_OVERFLOW
+            self.callback(self.chunk, self.frame_count, {}, status)
+
+
+class SimulatedPyAudio(object):
+    """The PyAudio object of a single simulated input device"""
+
+    device_buffer = 4
+
+    def __init__(self):
+        self.streams = []
+
+    def get_device_count(self):
+        return 1
+
+    def get_device_info_by_index(self, index):
+        return {"index": index, "name": "default", "maxInputChannels": 8}
+
+    def get_sample_size(self, audio_format):
+        return SAMPLE_WIDTH
+
+    def open(self, **kwargs):
+        stream = SimulatedStream(device_buffer=self.device_buffer, **kwargs)
+        self.streams.append(stream)
+        return stream
+
+
+sys.modules["pyaudio"] = types.ModuleType("pyaudio")
+sys.modules["pyaudio"].__dict__.update(
+    PyAudio=SimulatedPyAudio,
+    paInt16=8,
+    paContinue=PA_CONTINUE,
+    paInputOverflow=PA_INPUT_OVERFLOW,
+)
+sys.path[:0] = [os.path.join(TEST_DIR, "../nodes"), os.path.join(TEST_DIR, "../src")]
+
+import rospy
+from audio_common_msgs.msg import AudioData
+from harmoni_common_lib.constants import State
+from microphone_service import MicrophoneService
+
+
+class LegacyMicrophone(MicrophoneService):
+    """The microphone publishing as it did before it was paced by the device"""
+
+    def _open_stream(self):
+        self.stream = self.p.open(
+            format=self.audio_format,
+            channels=self.total_channels,
+            rate=self.audio_rate,
+            input=True,
+            input_device_index=self.input_device_index,
+            frames_per_buffer=self.chunk_size,
+        )
+        return
+
+    def _read_stream_and_publish(self):
+        r = rospy.Rate(10)
+        while self.state == State.START and not rospy.is_shutdown():
+            latest_audio_data = self.stream.read(
+                self.chunk_size, exception_on_overflow=False
+            )
+            # np.fromstring is gone from NumPy 2; frombuffer only saves its copy
+            raw_audio = np.frombuffer(latest_audio_data, np.uint8).tolist()
+            self.raw_mic_pub.publish(AudioData(data=raw_audio))
+            r.sleep()
+        return
+
+
+def measure(microphone_class, rate, chunk_size, channels, duration):
+    """Publishes the audio of the simulated device for a duration
+
+    Returns:
+        dict: the chunks recorded, received and dropped, and the CPU use
+    """
+    topic_id = f"{microphone_class.__name__.lower()}_{rate}"
+    param = {
+        "audio_format_width": SAMPLE_WIDTH,
+        "chunk_size": chunk_size,
+        "total_channels": channels,
+        "audio_rate": rate,
+        "device_name": "default",
+        "test_outdir": "",
+    }
+    microphone = microphone_class(f"microphone_{topic_id}", param)
+    received = []
+
+    def receive(msg):
+        received.append(len(bytes(msg.data)))
+
+    rospy.Subscriber(microphone.microphone_topic, AudioData, receive)
+    wall, cpu = time.time(), time.process_time()
+    microphone.start()
+    time.sleep(duration)
+    device = microphone.stream
+    stats = microphone.get_stats()
+    microphone.stop()
+    wall, cpu = time.time() - wall, time.process_time() - cpu
+    time.sleep(0.2)  # The subscriber gets the last chunks published
+    return {
+        "publishing": "legacy" if microphone_class is LegacyMicrophone else "device",
+        "rate": rate,
+        "recorded": device.recorded,
+        "received": len(received),
+        "dropped": device.recorded - len(received),
+        "overflows": device.overflowed,
+        "buffer_dropped": stats["dropped"],
+        "cpu": 100 * cpu / wall,
+        "cpu_per_chunk": cpu / max(len(received), 1),
+        "chunks_per_second": len(received) / wall,
+    }
+
+
+def report(result):
+    print(
+        f"{result['publishing']:>8} {result['rate']:>6} Hz"
+        f"  {result['chunks_per_second']:6.1f} chunks/s"
+        f"  received {result['received']:>5}/{result['recorded']:<5}"
+        f"  dropped {100 * result['dropped'] / result['recorded']:5.1f}%"
+        f" (overflows {result['overflows']}, buffer {result['buffer_dropped']})"
+        f"  cpu {result['cpu']:5.1f}% ({1e6 * result['cpu_per_chunk']:6.0f} us/chunk)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rates", type=int, nargs="+", default=[16000, 44100])
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--channels", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument(
+        "--device-buffer",
+        type=int,
+        default=SimulatedPyAudio.device_buffer,
+        help="chunks the device holds before overflowing",
+    )
+    parser.add_argument("--output", help="json file to write the results to")
+    args = parser.parse_args()
+    SimulatedPyAudio.device_buffer = args.device_buffer
+
+    print(f"{args.chunk_size} frames per chunk, {args.channels} channel(s)")
+    results = []
+    for rate in args.rates:
+        for microphone_class in (LegacyMicrophone, MicrophoneService):
+            results.append(
+                measure(
+                    microphone_class,
+                    rate,
+                    args.chunk_size,
+                    args.channels,
+                    args.duration,
+                )
+            )
+            report(results[-1])
+    if args.output:
+        with open(args.output, "w") as write_file:
+            json.dump({"results": results}, write_file)
+    rospy.signal_shutdown("benchmark done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import numpy as np
+
+PKG = "harmoni_microphone"
+
+from harmoni_microphone.channels import (
+    mixdown,
+    split_channels,
+    to_interleaved,
+    to_planar,
+)
+
+
+class TestChannels(unittest.TestCase):
+    def setUp(self):
+        # 3 frames of 4 channels: channel c of frame f is 10 * c + f
+        self.frames = np.array(
+            [[10 * c + f for c in range(4)] for f in range(3)], np.int16
+        )
+        self.chunk = self.frames.tobytes()
+
+    def samples(self, data):
+        return np.frombuffer(data, np.int16).tolist()
+
+    def test_planar_layout(self):
+        planar = to_planar(self.chunk, 4)
+        self.assertEqual(
+            np.frombuffer(planar, np.int16).reshape(4, -1).tolist(),
+            self.frames.T.tolist(),
+        )
+        self.assertEqual(to_interleaved(planar, 4), self.chunk)
+        self.assertIs(to_planar(self.chunk, 1), self.chunk)
+
+    def test_split_channels(self):
+        channels = split_channels(self.chunk, 4)
+        self.assertEqual(len(channels), 4)
+        self.assertEqual(self.samples(channels[2]), [20, 21, 22])
+
+    def test_mixdown(self):
+        self.assertEqual(self.samples(mixdown(self.chunk, 4)), [15, 16, 17])
+        self.assertEqual(self.samples(mixdown(self.chunk, 4, [1, 3])), [20, 21, 22])
+        self.assertEqual(self.samples(mixdown(self.chunk, 4, [3])), [30, 31, 32])
+        # The sum does not overflow int16
+        loud = np.full((2, 2), 30000, np.int16).tobytes()
+        self.assertEqual(self.samples(mixdown(loud, 2)), [30000, 30000])
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_channels", TestChannels)
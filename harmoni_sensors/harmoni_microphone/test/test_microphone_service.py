@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+import types
+import unittest
+import uuid
+
+PKG = "harmoni_microphone"
+
+# The audio goes through the in-process ROS stand-in, without a roscore
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    0, os.path.join(TEST_DIR, "../../../harmoni_core/harmoni_common_lib/test")
+)
+import ros_stand_in
+
+PA_CONTINUE = 0
+PA_INPUT_OVERFLOW = 2
+
+
+class FakeStream(object):
+    """An input stream of PyAudio whose chunks are recorded by the test"""
+
+    def __init__(self, stream_callback=None, **kwargs):
+        self.callback = stream_callback
+        self.active = True
+        self.closed = False
+
+    def record(self, chunk, status=0):
+        """Hands a chunk to the callback, as PyAudio does from its own thread"""
+        return self.callback(chunk, len(chunk) // 2, {}, status)
+
+    def start_stream(self):
+        self.active = True
+
+    def stop_stream(self):
+        self.active = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakePyAudio(object):
+    """The PyAudio object of a single input device"""
+
+    def get_device_count(self):
+        return 1
+
+    def get_device_info_by_index(self, index):
+        return {"index": index, "name": "default", "maxInputChannels": 1}
+
+    def get_sample_size(self, audio_format):
+        return 2
+
+    def open(self, **kwargs):
+        return FakeStream(**kwargs)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def chunk(i):
+    return bytes([i]) * 8
+
+
+def setUpModule():
+    global rospy, AudioData, State, MicrophoneService
+    ros_stand_in.install(log_level="ERROR")
+    pyaudio = types.ModuleType("pyaudio")
+    pyaudio.__dict__.update(
+        PyAudio=FakePyAudio,
+        paInt16=8,
+        paContinue=PA_CONTINUE,
+        paInputOverflow=PA_INPUT_OVERFLOW,
+    )
+    sys.modules["pyaudio"] = pyaudio
+    sys.path[:0] = [
+        os.path.join(TEST_DIR, "../nodes"),
+        os.path.join(TEST_DIR, "../src"),
+    ]
+
+    import rospy
+    from audio_common_msgs.msg import AudioData
+    from harmoni_common_lib.constants import State
+    from microphone_service import MicrophoneService
+
+
+def tearDownModule():
+    ros_stand_in.uninstall()
+    sys.modules.pop("pyaudio", None)
+
+
+class TestMicrophoneService(unittest.TestCase):
+    def setUp(self):
+        self.param = param = {
+            "audio_format_width": 2,
+            "chunk_size": 4,
+            "total_channels": 1,
+            "audio_rate": 16000,
+            "device_name": "default",
+            "test_outdir": "",
+            "buffer_size": 16,
+        }
+        self.microphone = MicrophoneService(
+            f"microphone_{uuid.uuid4().hex[:8]}", param
+        )
+        self.lock = threading.Lock()
+        self.received = []
+        rospy.Subscriber(self.microphone.microphone_topic, AudioData, self._receive)
+
+    def tearDown(self):
+        self.microphone.stop()
+
+    def _receive(self, msg):
+        with self.lock:
+            self.received.append(msg.data)
+
+    def _microphone(self, **param):
+        """Replaces the microphone of the test by one with other params"""
+        self.microphone.stop()
+        self.microphone = MicrophoneService(
+            f"microphone_{uuid.uuid4().hex[:8]}", dict(self.param, **param)
+        )
+        return self.microphone
+
+    def _received(self):
+        with self.lock:
+            return list(self.received)
+
+    def test_chunks_are_published_as_raw_bytes_in_order(self):
+        self.microphone.start()
+        stream = self.microphone.stream
+        for i in range(10):
+            self.assertEqual(stream.record(chunk(i)), (None, PA_CONTINUE))
+        self.assertTrue(wait_for(lambda: len(self._received()) == 10))
+        self.assertEqual(self._received(), [chunk(i) for i in range(10)])
+        self.assertTrue(all(type(data) is bytes for data in self._received()))
+
+    def test_overflows_and_dropped_chunks_are_in_the_stats(self):
+        self.microphone._open_stream()  # recording, but not publishing
+        stream = self.microphone.stream
+        stream.record(chunk(0), PA_INPUT_OVERFLOW)
+        for i in range(1, 19):
+            stream.record(chunk(i))
+        stream.record(chunk(19), PA_INPUT_OVERFLOW)
+        stats = self.microphone.get_stats()
+        self.assertEqual(stats["overflows"], 2)
+        # The buffer holds the 16 newest chunks
+        self.assertEqual(stats["size"], 16)
+        self.assertEqual(stats["dropped"], 4)
+
+    def test_pause_joins_the_thread_and_start_drops_stale_audio(self):
+        self.microphone.start()
+        stream = self.microphone.stream
+        thread = self.microphone.publish_thread
+        stream.record(chunk(1))
+        self.assertTrue(wait_for(lambda: len(self._received()) == 1))
+
+        self.microphone.pause()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.microphone.publish_thread)
+        self.assertFalse(stream.active)
+        self.assertEqual(self.microphone.state, State.PAUSE)
+        # Audio the device hands over late, before the stream stopped
+        stream.record(chunk(2))
+        stream.record(chunk(3))
+
+        self.microphone.start()
+        self.assertIs(self.microphone.stream, stream)
+        self.assertTrue(stream.active)
+        stream.record(chunk(4))
+        self.assertTrue(wait_for(lambda: len(self._received()) == 2))
+        time.sleep(0.1)
+        self.assertEqual(self._received(), [chunk(1), chunk(4)])
+
+    def test_stop_returns_while_publishing(self):
+        started = time.time()
+        self.microphone.start()
+        # start() returns once the thread publishes, which waits for audio
+        self.assertLess(time.time() - started, 0.5)
+        stream = self.microphone.stream
+        thread = self.microphone.publish_thread
+        self.assertTrue(thread.is_alive())
+
+        stopping = threading.Thread(target=self.microphone.stop, daemon=True)
+        stopped = time.time()
+        stopping.start()
+        stopping.join(2)
+        self.assertFalse(stopping.is_alive())
+        # The thread is woken, not left to its 1 s timeout
+        self.assertLess(time.time() - stopped, 0.5)
+        self.assertFalse(thread.is_alive())
+        self.assertTrue(stream.closed)
+        self.assertIsNone(self.microphone.stream)
+        self.assertEqual(self.microphone.state, State.SUCCESS)
+
+    def test_start_drops_the_audio_held_by_the_speech_gate(self):
+        microphone = self._microphone(vad=True)
+        gate = microphone.speech_gate
+        microphone.start()
+        for i in range(3):
+            microphone.stream.record(chunk(i))
+        self.assertTrue(wait_for(lambda: len(gate.pending) == 3))
+        microphone.pause()
+        microphone.start()
+        # The pre-roll of before the pause does not start the next utterance
+        self.assertEqual(len(gate.pending), 0)
+        self.assertEqual(gate.speech_count, 0)
+
+    def test_start_after_a_pause_before_any_start_opens_the_stream(self):
+        self.microphone.pause()
+        self.assertIsNone(self.microphone.stream)
+        self.microphone.start()
+        self.assertEqual(self.microphone.state, State.START)
+        self.microphone.stream.record(chunk(1))
+        self.assertTrue(wait_for(lambda: self._received() == [chunk(1)]))
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_microphone_service", TestMicrophoneService)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import numpy as np
+
+PKG = "harmoni_microphone"
+
+from harmoni_microphone.resample import FormatNormalizer, Resampler
+
+
+def tone(frequency, rate, seconds=1.0, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+def level(samples):
+    """Returns the RMS of the samples, without the edges of the filter"""
+    samples = np.asarray(samples, np.float64)[200:-200]
+    return np.sqrt(np.mean(samples**2))
+
+
+class TestResample(unittest.TestCase):
+    def test_downsampling_keeps_speech_and_removes_aliases(self):
+        resampler = Resampler(44100, 16000)
+        speech = resampler.process(tone(1000, 44100))
+        self.assertAlmostEqual(len(speech), 16000, delta=1)
+        self.assertAlmostEqual(level(speech), 10000 / np.sqrt(2), delta=150)
+        spectrum = np.abs(np.fft.rfft(speech[:16000]))
+        self.assertEqual(np.argmax(spectrum), 1000)  # 1 Hz bins
+        # 10 kHz is above the new Nyquist frequency, and would alias to 6 kHz
+        resampler.reset()
+        alias = resampler.process(tone(10000, 44100))
+        self.assertLess(level(alias), level(speech) / 100)
+
+    def test_upsampling(self):
+        output = Resampler(16000, 48000).process(tone(440, 16000))
+        self.assertEqual(len(output), 48000)
+        self.assertAlmostEqual(level(output), 10000 / np.sqrt(2), delta=150)
+
+    def test_chunks_give_the_same_output_as_a_whole(self):
+        audio = tone(300, 44100, seconds=0.5)
+        whole = Resampler(44100, 16000).process(audio)
+        resampler = Resampler(44100, 16000)
+        chunked = np.concatenate(
+            [resampler.process(audio[i : i + 1000]) for i in range(0, len(audio), 1000)]
+        )
+        np.testing.assert_allclose(chunked, whole, atol=0.05)
+
+    def test_format_normalizer(self):
+        audio = tone(1000, 16000, seconds=0.1).tobytes()
+        self.assertEqual(FormatNormalizer(16000, 16000).process(audio), audio)
+        floats = FormatNormalizer(16000, 16000, "float32").process(audio)
+        self.assertAlmostEqual(
+            float(np.frombuffer(floats, np.float32).max()), 10000 / 32768, places=3
+        )
+        with self.assertRaises(ValueError):
+            FormatNormalizer(16000, 8000, "mulaw")
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_resample", TestResample)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import numpy as np
+
+PKG = "harmoni_microphone"
+
+from harmoni_microphone.vad import EnergyVAD, SpeechGate
+
+RATE = 16000
+CHUNK = 1024  # 64 ms
+
+
+def chunks(seconds, amplitude, seed=0):
+    """Returns chunks of noise (silence) or of a tone (speech) at an amplitude"""
+    n = int(seconds * RATE / CHUNK)
+    t = np.arange(n * CHUNK) / RATE
+    if amplitude > 100:
+        audio = amplitude * np.sin(2 * np.pi * 220 * t)
+    else:
+        audio = np.random.default_rng(seed).normal(0, amplitude, n * CHUNK)
+    audio = audio.astype(np.int16).tobytes()
+    return [audio[i : i + 2 * CHUNK] for i in range(0, len(audio), 2 * CHUNK)]
+
+
+class TestVAD(unittest.TestCase):
+    def setUp(self):
+        self.gate = SpeechGate(
+            EnergyVAD(), CHUNK / RATE, pre_roll=0.2, hangover=0.5, min_speech=0.1
+        )
+
+    def run_gate(self, audio):
+        passed, utterances = [], []
+        for chunk in audio:
+            speech, utterance = self.gate.process(chunk)
+            passed.extend(speech)
+            if utterance:
+                utterances.append(utterance)
+        return passed, utterances
+
+    def test_silence_is_not_passed(self):
+        passed, utterances = self.run_gate(chunks(3, 20))
+        self.assertEqual(passed, [])
+        self.assertEqual(utterances, [])
+
+    def test_utterance_with_pre_roll_and_hangover(self):
+        silence, speech = chunks(2, 20), chunks(1, 3000)
+        passed, utterances = self.run_gate(silence + speech + chunks(2, 20, seed=1))
+        pre_roll, hangover = 4, 8  # 0.2 s and 0.5 s of 64 ms chunks
+        self.assertEqual(len(utterances), 1)
+        self.assertEqual(len(passed), pre_roll + len(speech) + hangover)
+        self.assertEqual(passed[: pre_roll + 2], silence[-pre_roll:] + speech[:2])
+        self.assertEqual(utterances[0], b"".join(passed))
+        self.assertFalse(self.gate.in_utterance)
+
+    def test_click_does_not_start_an_utterance(self):
+        passed, _ = self.run_gate(chunks(1, 20) + chunks(0.07, 3000) + chunks(1, 20))
+        self.assertEqual(passed, [])
+
+    def test_noise_floor_follows_the_room(self):
+        vad = EnergyVAD(window=40)
+        fan = chunks(3, 400, seed=2)
+        self.assertTrue(vad.is_speech(fan[0]))
+        for chunk in fan[1:]:
+            vad.is_speech(chunk)
+        # Steady noise is not speech once it ran for a window, louder sound is
+        self.assertFalse(vad.is_speech(chunks(0.1, 400, seed=3)[0]))
+        self.assertTrue(vad.is_speech(chunks(0.1, 5000)[0]))
+
+    def test_flush_ends_the_utterance(self):
+        self.run_gate(chunks(1, 20) + chunks(1, 3000))
+        self.assertTrue(self.gate.in_utterance)
+        self.assertTrue(self.gate.flush())
+        self.assertIsNone(self.gate.flush())
+
+
+if __name__ == "__main__":
+    import rosunit
+
+    rosunit.unitrun(PKG, "test_vad", TestVAD)